@@ -4,12 +4,11 @@ Handles AI-powered entity and relationship extraction using server-side OpenAI k
 """
 
 from flask import request, jsonify
-import os
 import json
-from openai import OpenAI
+from llm_client import LLMError, get_llm_client
 
-# Initialize OpenAI client with server-side API key
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Shared, rate-limited model client (the same instance api_server uses)
+client = get_llm_client()
 
 def extract_network(text, model='gpt-4.1-mini'):
     """
@@ -56,7 +55,7 @@ Return ONLY the JSON object, no additional text."""
 
     try:
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = client.create_chat_completion(
             model=model,
             messages=[
                 {"role": "system", "content": "You are an expert at analyzing documents and extracting network relationships. Always return valid JSON."},
@@ -79,6 +78,8 @@ Return ONLY the JSON object, no additional text."""
         
         return result
         
+    except LLMError:
+        raise
     except Exception as e:
         raise Exception(f"OpenAI API error: {str(e)}")
 
@@ -142,7 +143,7 @@ Return a JSON object:
 Return ONLY the JSON object."""
 
     try:
-        response = client.chat.completions.create(
+        response = client.create_chat_completion(
             model=model,
             messages=[
                 {"role": "system", "content": "You are an expert at network analysis and finding implicit connections. Always return valid JSON."},
@@ -164,6 +165,8 @@ Return ONLY the JSON object."""
         
         return result
         
+    except LLMError:
+        raise
     except Exception as e:
         raise Exception(f"OpenAI API error: {str(e)}")
 
@@ -209,6 +212,11 @@ def register_extraction_routes(app):
             
             return jsonify(result), 200
             
+        except LLMError as e:
+            response = jsonify({'error': str(e)})
+            if e.retry_after:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response, e.status_code
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -235,5 +243,10 @@ def register_extraction_routes(app):
             
             return jsonify(result), 200
             
+        except LLMError as e:
+            response = jsonify({'error': str(e)})
+            if e.retry_after:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response, e.status_code
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -4,18 +4,43 @@ Silent Partners API Server
 Provides REST API for programmatic network data submission
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.http import is_resource_modified
+from werkzeug.utils import secure_filename
+import base64
+import hashlib
 import json
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 import os
-from openai import OpenAI
+import time
+import numpy as np
+from network_store import MemoryNetworkStore, create_store, name_key, page_query
+from extraction_cache import create_extraction_cache, make_cache_key, normalize_text
+from chunked_extraction import DEFAULT_CHUNK_CHARS, extract_chunked
+from incremental_extraction import DEFAULT_INCREMENTAL_CHUNK_CHARS, create_manifest_store, extract_incremental
+from streaming_json import ArrayItemParser, format_event
+from extraction_jobs import QueueFullError, create_job_queue
+from batch_extraction import DEFAULT_PACK_TOKEN_BUDGET, extract_batch, merge_batch_results
+from graph_analysis import METHODS as CANDIDATE_METHODS, analyze_missing_connections
+from mention_index import MentionIndexCache, with_aliases
+from llm_client import LLMError, get_llm_client
+from serialization import DEFAULT_STREAM_THRESHOLD, BodyCache, dumps, iter_json_object, json_response, materialize
+from single_flight import create_single_flight, make_request_key
+from bulk_import import DEFAULT_IMPORT_BATCH_SIZE, import_records, iter_csv_records, iter_ndjson_records, text_lines
+from candidate_inference import DEFAULT_BATCH_TOKENS, DEFAULT_TOP_K, infer_from_candidates
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, create_metrics_registry, family
+from entity_resolution import CONTAINMENT_SCORE, DEFAULT_MAX_BLOCK_SIZE, DEFAULT_THRESHOLD as DEFAULT_RESOLUTION_THRESHOLD, ResolverCache, find_duplicates
+from network_analytics import ALGORITHMS as COMMUNITY_ALGORITHMS, DEFAULT_BETWEENNESS_SAMPLES, GraphCache, analyze_network, detect_communities
+from network_layout import ALGORITHMS as LAYOUT_ALGORITHMS, LayoutHistory, compute_layout, entity_years
+from network_paths import PathIndex, ego_network, k_shortest_paths, simple_paths
+from network_formats import FORMATS as EXPORT_FORMATS, TABLES as EXPORT_TABLES, available as export_format_available, iter_export
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -27,30 +52,125 @@ app = Flask(__name__, static_folder='.')
 import os
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Prometheus metrics served at /api/metrics
+metrics = create_metrics_registry()
+REQUEST_SECONDS = metrics.histogram(
+    'silent_partners_request_duration_seconds',
+    'Time from request start until the response body was sent',
+    ('method', 'route', 'status')
+)
+EXTRACTION_STAGE_SECONDS = metrics.histogram(
+    'silent_partners_model_stage_duration_seconds',
+    'Time spent per stage of extraction and inference calls',
+    ('operation', 'stage')
+)
+MODEL_TOKENS = metrics.counter(
+    'silent_partners_model_tokens_total',
+    'Tokens billed by the model provider',
+    ('model', 'operation')
+)
+MODEL_CALLS = metrics.counter(
+    'silent_partners_model_calls_total',
+    'Completed model calls',
+    ('model', 'operation')
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Observed on close so streamed bodies count until their last byte
+    started = g.get('request_started')
+    if started is not None:
+        labels = (request.method, request.url_rule.rule if request.url_rule else 'unmatched', response.status_code)
+        
+        def observe():
+            REQUEST_SECONDS.labels(*labels).observe(time.perf_counter() - started)
+            metrics.maybe_flush()
+        
+        response.call_on_close(observe)
+    return response
+
 # Add explicit CORS headers to all responses
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match,If-Modified-Since')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'ETag,Last-Modified')
     return response
 
-# Store for network data (in-memory, can be replaced with database)
-networks = {}
-
-# Initialize OpenAI client
-openai_client = None
-try:
-    api_key = os.getenv('OPENAI_API_KEY')
-    logger.info(f'Checking for OPENAI_API_KEY: {"Found" if api_key else "Not found"}')
-    if api_key:
-        logger.info(f'API key starts with: {api_key[:10]}...')
-        openai_client = OpenAI(api_key=api_key)
-        logger.info('OpenAI client initialized successfully')
-    else:
-        logger.warning('OPENAI_API_KEY not found in environment')
-except Exception as e:
-    logger.error(f'Failed to initialize OpenAI client: {e}', exc_info=True)
+# Store for network data (in-memory or SQLite, see network_store.py)
+store = create_store()
+
+# Networks with more entities + relationships than this are streamed
+JSON_STREAM_THRESHOLD = int(os.getenv('JSON_STREAM_THRESHOLD', str(DEFAULT_STREAM_THRESHOLD)))
+
+# Encoded GET/export bodies keyed on network version, shared by repeated polls
+network_bodies = BodyCache(int(os.getenv('NETWORK_BODY_CACHE_MB', '64')) * 1024 * 1024)
+
+# Items committed per transaction by POST /api/network/<id>/import
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', str(DEFAULT_IMPORT_BATCH_SIZE)))
+
+# Page sizes for GET /api/network/<id> with pagination or filters
+NETWORK_PAGE_SIZE = 1000
+NETWORK_MAX_PAGE_SIZE = 10000
+
+# Query parameters that switch GET /api/network/<id> to a paged response
+NETWORK_PAGE_PARAMS = (
+    'cursor', 'limit', 'include', 'fields', 'relationship_fields', 'type', 'min_importance',
+    'relationship_type', 'status', 'date_from', 'date_to'
+)
+
+# Fuzzy entity resolution: near-duplicates scoring at least the threshold are
+# found on ingest (POST /api/network, opt-in) and on demand through /resolve.
+# Both only merge scores above CONTAINMENT_SCORE by themselves; containment
+# and acronym matches ("Goldman Sachs Asia" for "Goldman Sachs") are returned
+# as suggestions to confirm through the "aliases" of /resolve
+ENTITY_RESOLUTION_THRESHOLD = float(os.getenv('ENTITY_RESOLUTION_THRESHOLD', str(DEFAULT_RESOLUTION_THRESHOLD)))
+ENTITY_RESOLUTION_ON_INGEST = os.getenv('ENTITY_RESOLUTION_ON_INGEST', 'false').lower() in ('1', 'true', 'yes')
+ENTITY_RESOLUTION_MAX_BLOCK = int(os.getenv('ENTITY_RESOLUTION_MAX_BLOCK', str(DEFAULT_MAX_BLOCK_SIZE)))
+entity_resolvers = ResolverCache(max_block_size=ENTITY_RESOLUTION_MAX_BLOCK)
+
+# CSR graphs and analytics of the latest version of recently used networks
+network_graphs = GraphCache(int(os.getenv('ANALYTICS_CACHE_NETWORKS', '8')))
+ANALYTICS_BETWEENNESS_SAMPLES = int(os.getenv('ANALYTICS_BETWEENNESS_SAMPLES', str(DEFAULT_BETWEENNESS_SAMPLES)))
+ANALYTICS_MAX_BETWEENNESS_SAMPLES = 1000
+
+# Last layout per network and algorithm, the warm start for the next version
+layout_history = LayoutHistory(int(os.getenv('LAYOUT_HISTORY_ENTRIES', '16')))
+LAYOUT_MAX_ITERATIONS = 1000
+
+# Limits of the neighborhood and path queries
+NEIGHBORHOOD_MAX_HOPS = 6
+NEIGHBORHOOD_MAX_NODES = 1000
+PATHS_MAX_K = 20
+PATHS_MAX_LENGTH = 8
+PATHS_LIMIT = 100
+PATHS_MAX_LIMIT = 1000
+
+# Cache of extraction results keyed on (text, model, prompt version)
+extraction_cache = create_extraction_cache()
+
+# Per-document chunk fingerprints and results for incremental re-extraction
+chunk_manifests = create_manifest_store()
+
+# Entity mention indexes per (network version, document)
+mention_indexes = MentionIndexCache()
+
+# Limits of the candidate relationship analysis
+CANDIDATES_LIMIT = 500
+CANDIDATES_MAX_LIMIT = 5000
+
+# Identical concurrent extract/infer requests share one model call
+single_flight = create_single_flight()
+
+# Shared, rate-limited model client (see llm_client.py); None without an API key
+openai_client = get_llm_client()
 
 @app.route('/')
 def index():
@@ -100,6 +220,13 @@ def add_network_data():
         ]
     }
     
+    With "resolve": true (default: ENTITY_RESOLUTION_ON_INGEST), entities
+    that are near-certain duplicates of one already stored (same words in
+    another order, small spelling differences) are recorded as aliases of
+    it and listed in "resolved". Weaker matches, such as one name contained
+    in the other, are stored as given and listed in "suggestions" to be
+    confirmed through /resolve.
+    
     Returns:
     {
         "success": true,
@@ -107,7 +234,9 @@ def add_network_data():
         "added": {
             "entities": 5,
             "relationships": 3
-        }
+        },
+        "resolved": [{"name": "Jho Low Taek", "canonical": "Low Taek Jho", "score": 1.0}],
+        "suggestions": [{"name": "Goldman Sachs Asia", "canonical": "Goldman Sachs", "score": 0.9}]
     }
     """
     try:
@@ -123,121 +252,271 @@ def add_network_data():
         # Get or create network ID
         network_id = data.get('network_id', f'network_{datetime.utcnow().timestamp()}')
         
-        # Initialize network if it doesn't exist
-        if network_id not in networks:
-            networks[network_id] = {
-                'entities': [],
-                'relationships': [],
-                'created_at': datetime.utcnow().isoformat(),
-                'updated_at': datetime.utcnow().isoformat()
-            }
-        
-        network = networks[network_id]
-        added_entities = 0
-        added_relationships = 0
+        entities = data.get('entities', [])
+        if not isinstance(entities, list):
+            return jsonify({'error': 'entities must be an array'}), 400
         
-        # Add entities
-        if 'entities' in data:
-            entities = data['entities']
-            if not isinstance(entities, list):
-                return jsonify({'error': 'entities must be an array'}), 400
-            
-            for entity in entities:
-                # Validate entity
-                if not isinstance(entity, dict) or 'name' not in entity:
-                    logger.warning(f'Invalid entity: {entity}')
-                    continue
-                
-                # Check for duplicates
-                if any(e['name'].lower() == entity['name'].lower() for e in network['entities']):
-                    logger.info(f'Entity already exists: {entity["name"]}')
-                    continue
-                
-                # Normalize entity
-                normalized_entity = {
-                    'name': entity['name'],
-                    'type': entity.get('type', 'person'),
-                    'importance': min(5, max(1, entity.get('importance', 3))),
-                    'description': entity.get('description', '')
-                }
-                
-                network['entities'].append(normalized_entity)
-                added_entities += 1
-                logger.info(f'Added entity: {normalized_entity["name"]}')
-        
-        # Add relationships
-        if 'relationships' in data:
-            relationships = data['relationships']
-            if not isinstance(relationships, list):
-                return jsonify({'error': 'relationships must be an array'}), 400
-            
-            # Create entity name lookup
-            entity_names = {e['name'].lower() for e in network['entities']}
-            
-            for rel in relationships:
-                # Validate relationship
-                if not isinstance(rel, dict) or 'source' not in rel or 'target' not in rel:
-                    logger.warning(f'Invalid relationship: {rel}')
-                    continue
-                
-                # Check if entities exist
-                source_lower = rel['source'].lower()
-                target_lower = rel['target'].lower()
-                
-                if source_lower not in entity_names:
-                    logger.warning(f'Source entity not found: {rel["source"]}')
-                    continue
-                
-                if target_lower not in entity_names:
-                    logger.warning(f'Target entity not found: {rel["target"]}')
-                    continue
-                
-                # Check for duplicates
-                exists = any(
-                    (r['source'].lower() == source_lower and r['target'].lower() == target_lower) or
-                    (r['source'].lower() == target_lower and r['target'].lower() == source_lower)
-                    for r in network['relationships']
-                )
-                
-                if exists:
-                    logger.info(f'Relationship already exists: {rel["source"]} -> {rel["target"]}')
-                    continue
-                
-                # Normalize relationship
-                normalized_rel = {
-                    'source': rel['source'],
-                    'target': rel['target'],
-                    'type': rel.get('type', 'business'),
-                    'description': rel.get('description', ''),
-                    'status': rel.get('status', 'confirmed'),
-                    'value': rel.get('value', ''),
-                    'date': rel.get('date', '')
-                }
-                
-                network['relationships'].append(normalized_rel)
-                added_relationships += 1
-                logger.info(f'Added relationship: {normalized_rel["source"]} -> {normalized_rel["target"]}')
+        relationships = data.get('relationships', [])
+        if not isinstance(relationships, list):
+            return jsonify({'error': 'relationships must be an array'}), 400
         
-        # Update timestamp
-        network['updated_at'] = datetime.utcnow().isoformat()
+        # Add entities and relationships in a single transaction
+        resolve = bool(data.get('resolve', ENTITY_RESOLUTION_ON_INGEST))
+        result, resolved, suggestions = add_resolved(network_id, entities, relationships, resolve)
         
         return jsonify({
             'success': True,
             'network_id': network_id,
-            'added': {
-                'entities': added_entities,
-                'relationships': added_relationships
-            },
-            'total': {
-                'entities': len(network['entities']),
-                'relationships': len(network['relationships'])
-            }
+            'added': result['added'],
+            'resolved': resolved,
+            'suggestions': suggestions,
+            'total': result['total'],
+            'version': result['version']
         })
     
     except Exception as e:
         logger.error(f'Error adding network data: {str(e)}', exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+
+def add_resolved(network_id, entities, relationships, resolve=ENTITY_RESOLUTION_ON_INGEST):
+    """
+    store.add_data with incoming entities resolved against the stored ones
+    
+    Only matches scoring above CONTAINMENT_SCORE are merged; containment
+    and acronym matches could be distinct entities ("Goldman Sachs Asia"
+    and "Goldman Sachs"), so they are stored as given and reported.
+    
+    Returns:
+        (add_data result, [{'name', 'canonical', 'score'}] for merged entities,
+        the same for suggested merges)
+    """
+    matches = {}
+    if resolve and entities:
+        matches = entity_resolvers.resolve(store, network_id, entities, ENTITY_RESOLUTION_THRESHOLD)
+    aliases = {name: canonical for name, (canonical, score) in matches.items() if score > CONTAINMENT_SCORE}
+    result = store.add_data(network_id, entities, relationships, aliases=aliases)
+    resolved = []
+    suggestions = []
+    for name, (canonical, score) in matches.items():
+        match = {'name': name, 'canonical': canonical, 'score': round(score, 3)}
+        (resolved if name in aliases else suggestions).append(match)
+    return result, resolved, suggestions
+
+
+def network_etag(version_info):
+    """Entity tag of a network version; created_at tells re-created networks apart"""
+    created = hashlib.sha1(version_info['created_at'].encode('utf-8')).hexdigest()[:8]
+    return f'{created}-{version_info["version"]}'
+
+
+def network_last_modified(version_info):
+    """updated_at as an aware datetime, truncated to HTTP-date precision"""
+    updated = datetime.fromisoformat(version_info['updated_at'])
+    return updated.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def with_validators(response, version_info):
+    """Attach ETag and Last-Modified; clients must revalidate before reuse"""
+    response.set_etag(network_etag(version_info))
+    response.last_modified = network_last_modified(version_info)
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified_response(version_info):
+    """304 response if the request's validators match this version, else None"""
+    if is_resource_modified(
+        request.environ,
+        etag=network_etag(version_info),
+        last_modified=network_last_modified(version_info)
+    ):
+        return None
+    return with_validators(Response(status=304), version_info)
+
+
+def network_body_response(network_id, kind, encode_fn, stream_fn, mimetype, headers=None, empty=b''):
+    """
+    Serialize a network read from a store snapshot
+    
+    encode_fn maps the snapshot to the whole body; stream_fn maps it to an
+    iterator of bytes chunks. Networks up to JSON_STREAM_THRESHOLD items
+    are encoded in one piece; larger ones are streamed from a fresh
+    snapshot so neither the lists nor the encoded body are held in
+    memory (empty is sent if the network is deleted in between).
+    
+    Requests whose If-None-Match / If-Modified-Since match the current
+    version get a 304, and encoded bodies are cached per (kind, version).
+    """
+    version_info = store.network_version(network_id)
+    if version_info is None:
+        return jsonify({'error': 'Network not found'}), 404
+    
+    response = not_modified_response(version_info)
+    if response is not None:
+        return response
+    
+    with store.snapshot(network_id) as network:
+        if network is None:
+            return jsonify({'error': 'Network not found'}), 404
+        
+        version_info = {key: network[key] for key in ('created_at', 'updated_at', 'version')}
+        cache_key = (kind, network_id, network['created_at'], network['version'])
+        body = network_bodies.get(cache_key)
+        if body is None and network['entity_count'] + network['relationship_count'] <= JSON_STREAM_THRESHOLD:
+            body = encode_fn(network)
+            network_bodies.put(cache_key, body)
+        if body is not None:
+            return with_validators(Response(body, mimetype=mimetype, headers=headers), version_info)
+    
+    def generate():
+        with store.snapshot(network_id) as network:
+            if network is None:
+                # Deleted between the size check and the stream
+                yield empty
+                return
+            chunks = stream_fn(network)
+            if (network['created_at'], network['version']) == cache_key[2:]:
+                chunks = network_bodies.tee(cache_key, chunks)
+            yield from chunks
+    
+    response = Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+    return with_validators(response, version_info)
+
+
+def network_json_response(network_id, kind, fields_fn):
+    """
+    Serialize a network as JSON (see network_body_response)
+    
+    fields_fn maps the snapshot to (key, value) pairs whose values may be
+    iterators; streamed responses write them item by item.
+    """
+    return network_body_response(
+        network_id, kind,
+        lambda network: dumps(materialize(fields_fn(network))),
+        lambda network: iter_json_object(fields_fn(network)),
+        'application/json', empty=b'{}'
+    )
+
+
+def export_nodes(entities, node_lookup, positions=None):
+    """
+    Yield Silent Partners nodes, recording each node id in node_lookup by name key
+    
+    positions optionally maps name keys to (x, y) layout coordinates
+    """
+    for idx, entity in enumerate(entities):
+        node = {
+            'id': f'node_{idx}',
+            'name': entity['name'],
+            'type': entity['type'],
+            'importance': entity['importance'] / 5.0  # Normalize to 0-1
+        }
+        key = name_key(entity['name'])
+        if positions is not None and key in positions:
+            node['x'], node['y'] = positions[key]
+        node_lookup[key] = node['id']
+        yield node
+
+
+def export_links(relationships, node_lookup):
+    """Yield Silent Partners links between nodes already in node_lookup"""
+    for rel in relationships:
+        source_id = node_lookup.get(name_key(rel['source']))
+        target_id = node_lookup.get(name_key(rel['target']))
+        
+        if source_id and target_id:
+            link = {
+                'source': source_id,
+                'target': target_id,
+                'type': rel['type'],
+                'status': rel['status']
+            }
+            
+            if rel.get('date'):
+                link['date'] = rel['date']
+            if rel.get('value'):
+                link['value'] = rel['value']
+            
+            yield link
+
+
+def encode_cursor(next_entity, next_relationship, id_epoch=0):
+    """Opaque continuation token for a paged network read, or None when done"""
+    if next_entity is None and next_relationship is None:
+        return None
+    raw = json.dumps([next_entity, next_relationship, id_epoch], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (after_entity, after_relationship, id_epoch) from a cursor; raises ValueError"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    values = json.loads(raw)
+    if len(values) == 2:
+        # Cursors issued before id epochs were added
+        values.append(0)
+    after_entity, after_relationship, id_epoch = values
+    for value in (after_entity, after_relationship):
+        if value is not None and not isinstance(value, int):
+            raise ValueError('Invalid cursor')
+    if not isinstance(id_epoch, int):
+        raise ValueError('Invalid cursor')
+    return after_entity, after_relationship, id_epoch
+
+
+def split_param(args, name):
+    """Comma-separated query parameter as a list, or None when absent"""
+    value = args.get(name)
+    return [part.strip() for part in value.split(',') if part.strip()] if value else None
+
+
+def parse_network_page_request(args):
+    """
+    Validate paging, projection and filter query parameters
+    
+    Returns:
+        (query for store.page_network, error message for a 400 response)
+    """
+    try:
+        limit = min(NETWORK_MAX_PAGE_SIZE, max(1, int(args.get('limit', NETWORK_PAGE_SIZE))))
+        min_importance = int(args['min_importance']) if 'min_importance' in args else None
+    except ValueError:
+        return None, 'limit and min_importance must be integers'
+    
+    include = split_param(args, 'include') or ['entities', 'relationships']
+    if not set(include) <= {'entities', 'relationships'}:
+        return None, 'include must list entities and/or relationships'
+    
+    after_entity = after_relationship = -1
+    id_epoch = None
+    if args.get('cursor'):
+        try:
+            after_entity, after_relationship, id_epoch = decode_cursor(args['cursor'])
+        except (ValueError, TypeError):
+            return None, 'Invalid cursor'
+    
+    try:
+        query = page_query(
+            include=include,
+            entity_fields=split_param(args, 'fields'),
+            relationship_fields=split_param(args, 'relationship_fields'),
+            entity_types=split_param(args, 'type'),
+            min_importance=min_importance,
+            relationship_types=split_param(args, 'relationship_type'),
+            statuses=split_param(args, 'status'),
+            date_from=args.get('date_from') or None,
+            date_to=args.get('date_to') or None,
+            after_entity=after_entity,
+            after_relationship=after_relationship,
+            limit=limit,
+            id_epoch=id_epoch
+        )
+    except ValueError as e:
+        return None, str(e)
+    return query, None
+
+
 @app.route('/api/network/<network_id>', methods=['GET'])
 def get_network(network_id):
     """
@@ -249,16 +528,60 @@ def get_network(network_id):
         "entities": [...],
         "relationships": [...],
         "created_at": "...",
-        "updated_at": "..."
+        "updated_at": "...",
+        "version": 3
     }
+    
+    Responses carry ETag and Last-Modified; conditional requests for an
+    unchanged network get 304 Not Modified.
+    
+    With any of the NETWORK_PAGE_PARAMS query parameters, returns one
+    page of filtered, projected items plus a next_cursor to pass back as
+    ?cursor= (null on the last page). A cursor issued before a merge that
+    renumbered the network's items gets 410 Gone.
     """
-    if network_id not in networks:
-        return jsonify({'error': 'Network not found'}), 404
+    if any(param in request.args for param in NETWORK_PAGE_PARAMS):
+        query, error = parse_network_page_request(request.args)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        version_info = store.network_version(network_id)
+        if version_info is None:
+            return jsonify({'error': 'Network not found'}), 404
+        response = not_modified_response(version_info)
+        if response is not None:
+            return response
+        
+        page = store.page_network(network_id, query)
+        if page is None:
+            return jsonify({'error': 'Network not found'}), 404
+        if query['id_epoch'] is not None and query['id_epoch'] != page['id_epoch']:
+            return jsonify({
+                'error': 'Cursor expired: entities were merged since it was issued; restart from the first page',
+                'version': page['version']
+            }), 410
+        
+        body = {'network_id': network_id}
+        for key in ('entities', 'relationships'):
+            if key in page:
+                body[key] = page[key]
+        body['next_cursor'] = encode_cursor(page['next_entity'], page['next_relationship'], page['id_epoch'])
+        body['created_at'] = page['created_at']
+        body['updated_at'] = page['updated_at']
+        body['version'] = page['version']
+        return with_validators(json_response(body), page)
     
-    return jsonify({
-        'network_id': network_id,
-        **networks[network_id]
-    })
+    def fields(network):
+        return [
+            ('network_id', network_id),
+            ('entities', network['entities']),
+            ('relationships', network['relationships']),
+            ('created_at', network['created_at']),
+            ('updated_at', network['updated_at']),
+            ('version', network['version'])
+        ]
+    
+    return network_json_response(network_id, 'network', fields)
 
 @app.route('/api/networks', methods=['GET'])
 def list_networks():
@@ -273,129 +596,845 @@ def list_networks():
                 "entity_count": 5,
                 "relationship_count": 3,
                 "created_at": "...",
-                "updated_at": "..."
+                "updated_at": "...",
+                "version": 3
             }
         ]
     }
     """
-    network_list = [
-        {
-            'network_id': network_id,
-            'entity_count': len(data['entities']),
-            'relationship_count': len(data['relationships']),
-            'created_at': data['created_at'],
-            'updated_at': data['updated_at']
-        }
-        for network_id, data in networks.items()
-    ]
+    network_list = store.list_networks()
     
     return jsonify({'networks': network_list})
 
 @app.route('/api/network/<network_id>', methods=['DELETE'])
 def delete_network(network_id):
     """Delete a network"""
-    if network_id not in networks:
+    if not store.delete_network(network_id):
         return jsonify({'error': 'Network not found'}), 404
+    network_bodies.discard(lambda key: key[1] == network_id)
+    entity_resolvers.discard(network_id)
+    network_graphs.discard(network_id)
+    layout_history.discard(network_id)
     
-    del networks[network_id]
     logger.info(f'Deleted network: {network_id}')
     
     return jsonify({'success': True, 'message': f'Network {network_id} deleted'})
 
+
+@app.route('/api/network/<network_id>/import', methods=['POST'])
+def import_network(network_id):
+    """
+    Stream a large NDJSON or CSV upload into a network (see bulk_import.py)
+
+    The body is read line by line and committed in batches of
+    IMPORT_BATCH_SIZE items, so uploads of any size use bounded memory.
+    Content-Type text/csv selects CSV; anything else is read as NDJSON.
+
+    Returns:
+    {
+        "success": true,
+        "network_id": "network-id",
+        "lines": 120000,
+        "added": {"entities": 20000, "relationships": 99000},
+        "duplicates": 0,
+        "error_count": 1000,
+        "errors": [{"line": 17, "error": "invalid JSON: ..."}],
+        "total": {...},
+        "version": 24
+    }
+
+    With Accept: application/x-ndjson or text/event-stream (or ?format=),
+    'progress' events follow every batch and 'line_error' events every
+    rejected line, ending with a 'done' event carrying the summary.
+    """
+    lines = text_lines(request.stream)
+    if request.mimetype in ('text/csv', 'application/csv'):
+        records = iter_csv_records(lines)
+    else:
+        records = iter_ndjson_records(lines)
+    events = import_records(store, network_id, records, IMPORT_BATCH_SIZE)
+
+    accept = request.headers.get('Accept', '')
+    if 'format' in request.args or 'application/x-ndjson' in accept or 'text/event-stream' in accept:
+        stream_format = stream_format_from_request()
+
+        def generate():
+            try:
+                for event, data in events:
+                    yield format_event(event, data, stream_format)
+            except Exception as e:
+                logger.error(f'Import error: {str(e)}', exc_info=True)
+                yield format_event('error', {'error': str(e)}, stream_format)
+
+        return streaming_response(generate(), stream_format)
+
+    try:
+        for event, data in events:
+            if event == 'done':
+                return jsonify({'success': True, 'network_id': network_id, **data})
+    except Exception as e:
+        logger.error(f'Import error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/network/<network_id>/export', methods=['GET'])
 def export_network(network_id):
     """
     Export network in Silent Partners format
     
-    Returns JSON compatible with Silent Partners import
+    Returns JSON compatible with Silent Partners import. Supports
+    conditional requests like GET /api/network/<id>.
+    
+    Query parameters:
+        format: json (default), graphml, gexf, csv, parquet or arrow
+        table: nodes (default) or edges, for csv, parquet and arrow
+        layout: optional layout algorithm (force, community or temporal);
+            JSON nodes then carry the x/y of GET /api/network/<id>/layout
     """
-    if network_id not in networks:
-        return jsonify({'error': 'Network not found'}), 404
+    export_format = request.args.get('format', 'json')
+    if export_format != 'json':
+        if request.args.get('layout') is not None:
+            return jsonify({'error': 'layout is only supported with format=json'}), 400
+        return export_network_file(network_id, export_format, request.args.get('table', 'nodes'))
     
-    network = networks[network_id]
+    algorithm = request.args.get('layout')
+    positions = None
+    if algorithm is not None:
+        if algorithm not in LAYOUT_ALGORITHMS:
+            return jsonify({'error': f'layout must be one of: {", ".join(LAYOUT_ALGORITHMS)}'}), 400
+        try:
+            entry = network_graphs.get(store, network_id)
+            if entry is None:
+                return jsonify({'error': 'Network not found'}), 404
+            layout = cached_layout(network_id, entry, algorithm)
+        except Exception as e:
+            logger.error(f'Export layout error: {str(e)}', exc_info=True)
+            return jsonify({'error': str(e)}), 500
+        positions = dict(zip(layout['keys'], np.round(layout['positions'], 2).tolist()))
     
-    # Convert to Silent Partners format
-    nodes = []
-    for idx, entity in enumerate(network['entities']):
-        nodes.append({
-            'id': f'node_{idx}',
-            'name': entity['name'],
-            'type': entity['type'],
-            'importance': entity['importance'] / 5.0  # Normalize to 0-1
-        })
+    def fields(network):
+        # Nodes are written before links, so the lookup is complete when links are
+        node_lookup = {}
+        return [
+            ('nodes', export_nodes(network['entities'], node_lookup, positions)),
+            ('links', export_links(network['relationships'], node_lookup)),
+            ('metadata', {
+                'title': f'Network {network_id}',
+                'created_at': network['created_at'],
+                'updated_at': network['updated_at'],
+                'version': network['version']
+            })
+        ]
     
-    # Create node ID lookup
-    node_lookup = {node['name'].lower(): node['id'] for node in nodes}
+    kind = 'export' if algorithm is None else f'export:{algorithm}'
+    return network_json_response(network_id, kind, fields)
+
+
+def export_network_file(network_id, export_format, table):
+    """Export in a graph-native or tabular format, streamed and cached per version"""
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of: json, {", ".join(EXPORT_FORMATS)}'}), 400
+    if not export_format_available(export_format):
+        return jsonify({'error': f'{export_format} export requires pyarrow on the server'}), 501
     
-    links = []
-    for rel in network['relationships']:
-        source_id = node_lookup.get(rel['source'].lower())
-        target_id = node_lookup.get(rel['target'].lower())
-        
-        if source_id and target_id:
-            link = {
-                'source': source_id,
-                'target': target_id,
-                'type': rel['type'],
-                'status': rel['status']
-            }
-            
-            if rel.get('date'):
-                link['date'] = rel['date']
-            if rel.get('value'):
-                link['value'] = rel['value']
-            
-            links.append(link)
+    mimetype, extension, tabular = EXPORT_FORMATS[export_format]
+    if tabular:
+        if table not in EXPORT_TABLES:
+            return jsonify({'error': f'table must be one of: {", ".join(EXPORT_TABLES)}'}), 400
+        kind = f'export:{export_format}:{table}'
+        filename = f'{network_id}-{table}.{extension}'
+    else:
+        kind = f'export:{export_format}'
+        filename = f'{network_id}.{extension}'
+    headers = {'Content-Disposition': f'attachment; filename="{secure_filename(filename) or "network." + extension}"'}
     
-    return jsonify({
-        'nodes': nodes,
-        'links': links,
-        'metadata': {
-            'title': f'Network {network_id}',
-            'created_at': network['created_at'],
-            'updated_at': network['updated_at']
-        }
-    })
+    def stream(network):
+        return iter_export(export_format, network_id, network, table)
+    
+    return network_body_response(
+        network_id, kind, lambda network: b''.join(stream(network)), stream, mimetype, headers
+    )
 
-@app.route('/api/extract', methods=['POST'])
-def api_extract():
-    """Extract entities and relationships from text using AI"""
+
+@app.route('/api/network/<network_id>/changes', methods=['GET'])
+def network_changes(network_id):
+    """
+    Get the entities and relationships added since a network version
+
+    Query parameters:
+        since: version the client already holds (required)
+
+    Returns:
+    {
+        "network_id": "network-id",
+        "since": 3,
+        "version": 5,
+        "entities": [...],
+        "relationships": [...],
+        "created_at": "...",
+        "updated_at": "..."
+    }
+
+    Answers 410 when the change log no longer reaches back to since (or
+    since is newer than the network); the client should reload the full
+    network and continue from its version.
+    """
     try:
-        if not openai_client:
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
+        since = int(request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'since must be an integer version'}), 400
+
+    version_info = store.network_version(network_id)
+    if version_info is None:
+        return jsonify({'error': 'Network not found'}), 404
+    response = not_modified_response(version_info)
+    if response is not None:
+        return response
+
+    changes = store.changes_since(network_id, since)
+    if changes is None:
+        return jsonify({'error': 'Network not found'}), 404
+    if 'entities' not in changes:
+        return jsonify({
+            'error': f'Changes since version {since} are not available; reload the network',
+            'version': changes['version'],
+            'log_start': changes['log_start']
+        }), 410
+
+    return with_validators(json_response({
+        'network_id': network_id,
+        'since': since,
+        'version': changes['version'],
+        'entities': changes['entities'],
+        'relationships': changes['relationships'],
+        'created_at': changes['created_at'],
+        'updated_at': changes['updated_at']
+    }), changes)
+
+
+@app.route('/api/network/<network_id>/resolve', methods=['POST'])
+def resolve_network_entities(network_id):
+    """
+    Find and merge near-duplicate entities across a whole network
+    
+    Expected JSON format (all optional):
+    {
+        "threshold": 0.9,
+        "max_block_size": 100,
+        "aliases": {"Low Taek Jho": "Jho Low"},
+        "dry_run": false
+    }
+    
+    Groups scoring above CONTAINMENT_SCORE are merged. Containment and
+    acronym matches could be distinct entities, so they are only listed
+    in "suggestions"; "aliases" are merged as given, which is how a
+    suggestion is confirmed. With dry_run the groups are reported but
+    nothing is changed.
+    
+    Returns:
+    {
+        "success": true,
+        "network_id": "network-id",
+        "clusters": [{"canonical": "Jho Low", "aliases": [{"name": "Low Taek Jho", "score": 1.0}]}],
+        "suggestions": [{"name": "Goldman Sachs Asia", "canonical": "Goldman Sachs", "score": 0.9}],
+        "merged": {"Low Taek Jho": "Jho Low"},
+        "relationships_removed": 1,
+        "total": {"entities": 27, "relationships": 40},
+        "version": 6,
+        "stats": {"entities": 28, "comparisons": 11, "seconds": 0.001, ...}
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
         
-        data = request.get_json()
+        threshold = float(data.get('threshold', ENTITY_RESOLUTION_THRESHOLD))
+        if not 0 < threshold <= 1:
+            return jsonify({'error': 'threshold must be in (0, 1]'}), 400
+        max_block_size = int(data.get('max_block_size', ENTITY_RESOLUTION_MAX_BLOCK))
+        manual = data.get('aliases') or {}
+        if not isinstance(manual, dict) or not all(
+            isinstance(alias, str) and isinstance(canonical, str) for alias, canonical in manual.items()
+        ):
+            return jsonify({'error': 'aliases must map alias names to entity names'}), 400
         
-        if not data or 'text' not in data:
-            return jsonify({'error': 'Missing text parameter'}), 400
-        
-        text = data['text']
-        # Map frontend model names to OpenAI API model names
-        model_map = {
-            'gpt-5-nano': 'gpt-5-nano',
-            'gpt-5': 'gpt-5',
-            'gpt-5-thinking': 'o1',
-            # Legacy mappings for compatibility
-            'gpt-5-mini': 'gpt-5-nano',
-            'gpt-4o-mini': 'gpt-5-nano',
-            'gpt-4o': 'gpt-5'
-        }
-        requested_model = data.get('model', 'gpt-5-nano')
-        model = model_map.get(requested_model, requested_model)
+        with store.snapshot(network_id) as view:
+            if view is None:
+                return jsonify({'error': 'Network not found'}), 404
+            entities = list(view['entities'])
+            relationships = list(view['relationships'])
         
-        if not text.strip():
-            return jsonify({'error': 'Text cannot be empty'}), 400
+        clusters, suggestions, stats = find_duplicates(
+            entities, relationships, threshold, max_block_size, merge_above=CONTAINMENT_SCORE
+        )
+        merges = {
+            alias['name']: cluster['canonical'] for cluster in clusters for alias in cluster['aliases']
+        }
+        merges.update(manual)
         
-        logger.info(f'Extracting network from {len(text)} characters using {model}')
+        response = {
+            'success': True, 'network_id': network_id, 'clusters': clusters, 'suggestions': suggestions,
+            'stats': stats
+        }
+        if data.get('dry_run'):
+            return json_response(response)
         
-        # Extraction prompt
-        prompt = f"""Analyze the following text and extract all entities (people, organizations, locations, events) and their relationships.
+        result = store.merge_entities(network_id, merges)
+        if result is None:
+            return jsonify({'error': 'Network not found'}), 404
+        entity_resolvers.discard(network_id)
+        return json_response({**response, **result})
+    
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f'Entity resolution error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
-Return a JSON object with this structure:
-{{
-  "entities": [
-    {{
-      "id": "unique_id",
+
+@app.route('/api/network/<network_id>/aliases', methods=['GET'])
+def network_aliases(network_id):
+    """List the names merged into other entities of a network"""
+    aliases = store.aliases(network_id)
+    if aliases is None:
+        return jsonify({'error': 'Network not found'}), 404
+    return jsonify({'network_id': network_id, 'aliases': aliases})
+
+
+@app.route('/api/network/<network_id>/analytics', methods=['GET'])
+def network_analytics(network_id):
+    """
+    Communities and centrality of every entity in a network
+    
+    Query parameters (all optional):
+        algorithm: louvain (default) or label_propagation
+        resolution: Louvain resolution; above 1 gives smaller communities (default 1.0)
+        betweenness_samples: BFS sources for approximate betweenness on
+            larger networks (default ANALYTICS_BETWEENNESS_SAMPLES)
+    
+    Returns:
+    {
+        "network_id": "network-id",
+        "version": 4,
+        "algorithm": "louvain",
+        "modularity": 0.42,
+        "communities": [{"id": 0, "size": 12}],
+        "nodes": [{"name": "Jho Low", "community": 0, "degree": 9, "pagerank": 0.08, "betweenness": 0.31}],
+        "metadata": {"nodes": 33, "edges": 40, "betweenness_exact": true, "seconds": {...}}
+    }
+    
+    Results are computed once per network version and parameters;
+    conditional requests are answered like GET /api/network/<id>.
+    """
+    try:
+        algorithm = request.args.get('algorithm', 'louvain')
+        if algorithm not in COMMUNITY_ALGORITHMS:
+            return jsonify({'error': f'algorithm must be one of: {", ".join(COMMUNITY_ALGORITHMS)}'}), 400
+        resolution = float(request.args.get('resolution', 1.0))
+        samples = int(request.args.get('betweenness_samples', ANALYTICS_BETWEENNESS_SAMPLES))
+        if resolution <= 0:
+            return jsonify({'error': 'resolution must be positive'}), 400
+        if not 1 <= samples <= ANALYTICS_MAX_BETWEENNESS_SAMPLES:
+            return jsonify({'error': f'betweenness_samples must be between 1 and {ANALYTICS_MAX_BETWEENNESS_SAMPLES}'}), 400
+    except ValueError:
+        return jsonify({'error': 'resolution and betweenness_samples must be numbers'}), 400
+    
+    try:
+        version_info = store.network_version(network_id)
+        if version_info is None:
+            return jsonify({'error': 'Network not found'}), 404
+        response = not_modified_response(version_info)
+        if response is not None:
+            return response
+        
+        entry = network_graphs.get(store, network_id)
+        if entry is None:
+            return jsonify({'error': 'Network not found'}), 404
+        membership = network_graphs.memoize(
+            entry, ('communities', algorithm, resolution),
+            lambda graph: detect_communities(graph, algorithm, resolution)
+        )
+        result = network_graphs.memoize(
+            entry, ('analytics', algorithm, resolution, samples),
+            lambda graph: analyze_network(graph, algorithm, resolution, samples, membership)
+        )
+        
+        return with_validators(
+            json_response({'network_id': network_id, 'version': entry['version'], **result}), entry
+        )
+    
+    except Exception as e:
+        logger.error(f'Network analytics error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+def cached_layout(network_id, entry, algorithm, iterations=None):
+    """
+    Layout of the graph in a GraphCache entry, computed once per version
+    
+    Warm-started from the last layout of the same network and algorithm.
+    
+    Returns:
+        {'keys': name key per node, 'positions': (nodes, 2) array, 'metadata': {...}}
+    """
+    def compute(graph):
+        membership = years = None
+        if algorithm == 'community':
+            membership = network_graphs.memoize(
+                entry, ('communities', 'louvain', 1.0),
+                lambda graph: detect_communities(graph, 'louvain', 1.0)
+            )
+        elif algorithm == 'temporal':
+            with store.snapshot(network_id) as view:
+                years = entity_years(graph, view['relationships'] if view is not None else ())
+        
+        previous = layout_history.get(network_id, algorithm, entry['created_at'])
+        positions, metadata = compute_layout(graph, algorithm, previous, membership, years, iterations)
+        keys = [name_key(name) for name in graph.names]
+        layout_history.put(network_id, algorithm, entry['created_at'], entry['version'], keys, positions)
+        return {'keys': keys, 'positions': positions, 'metadata': metadata}
+    
+    return network_graphs.memoize(entry, ('layout', algorithm, iterations), compute)
+
+
+@app.route('/api/network/<network_id>/layout', methods=['GET'])
+def network_layout(network_id):
+    """
+    Node coordinates of a network computed on the server
+    
+    Query parameters (all optional):
+        algo: force (default), community or temporal
+        iterations: simulation steps (default: 150, or 40 when the
+            previous version's layout is reused)
+    
+    Returns:
+    {
+        "network_id": "network-id",
+        "version": 4,
+        "algorithm": "force",
+        "nodes": [{"name": "Jho Low", "x": 12.5, "y": -80.25}],
+        "bounds": {"min_x": -410.2, "min_y": -395.0, "max_x": 402.7, "max_y": 388.1},
+        "metadata": {"nodes": 33, "edges": 40, "iterations": 150, "warm_start": false, ...}
+    }
+    
+    Layouts are computed once per network version; conditional requests
+    are answered like GET /api/network/<id>.
+    """
+    algorithm = request.args.get('algo', 'force')
+    if algorithm not in LAYOUT_ALGORITHMS:
+        return jsonify({'error': f'algo must be one of: {", ".join(LAYOUT_ALGORITHMS)}'}), 400
+    try:
+        iterations = request.args.get('iterations')
+        iterations = int(iterations) if iterations is not None else None
+    except ValueError:
+        return jsonify({'error': 'iterations must be a number'}), 400
+    if iterations is not None and not 1 <= iterations <= LAYOUT_MAX_ITERATIONS:
+        return jsonify({'error': f'iterations must be between 1 and {LAYOUT_MAX_ITERATIONS}'}), 400
+    
+    try:
+        version_info = store.network_version(network_id)
+        if version_info is None:
+            return jsonify({'error': 'Network not found'}), 404
+        response = not_modified_response(version_info)
+        if response is not None:
+            return response
+        
+        entry = network_graphs.get(store, network_id)
+        if entry is None:
+            return jsonify({'error': 'Network not found'}), 404
+        layout = cached_layout(network_id, entry, algorithm, iterations)
+        
+        positions = layout['positions']
+        graph = entry['graph']
+        bounds = None
+        if len(positions):
+            low, high = positions.min(axis=0), positions.max(axis=0)
+            bounds = {
+                'min_x': round(float(low[0]), 2), 'min_y': round(float(low[1]), 2),
+                'max_x': round(float(high[0]), 2), 'max_y': round(float(high[1]), 2)
+            }
+        nodes = [
+            {'name': name, 'x': x, 'y': y}
+            for name, (x, y) in zip(graph.names, np.round(positions, 2).tolist())
+        ]
+        
+        return with_validators(json_response({
+            'network_id': network_id,
+            'version': entry['version'],
+            'algorithm': algorithm,
+            'nodes': nodes,
+            'bounds': bounds,
+            'metadata': layout['metadata']
+        }), entry)
+    
+    except Exception as e:
+        logger.error(f'Network layout error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+def cached_path_index(network_id, entry):
+    """PathIndex of the network version in a GraphCache entry, built once per version"""
+    def build(graph):
+        with store.snapshot(network_id) as view:
+            if view is None:
+                return PathIndex.from_network(graph, (), ())
+            return PathIndex.from_network(graph, view['entities'], view['relationships'])
+    
+    return network_graphs.memoize(entry, ('paths',), build)
+
+
+def find_node(network_id, index, name):
+    """Node id of an entity name or of an alias merged into it, or None"""
+    node = index.node(name)
+    if node is None:
+        key = name_key(name)
+        for alias in store.aliases(network_id) or ():
+            if name_key(alias['alias']) == key:
+                return index.node(alias['canonical'])
+    return node
+
+
+@app.route('/api/network/<network_id>/neighborhood', methods=['GET'])
+def network_neighborhood(network_id):
+    """
+    Entities within a number of hops of one entity, with the relationships among them
+    
+    Query parameters:
+        entity: name of the centre entity (required)
+        hops: maximum distance (default 1)
+        max_nodes: most entities to return, nearest first (default 1000)
+        relationship_type, status: comma-separated relationship filters
+    
+    Returns:
+    {
+        "network_id": "network-id",
+        "version": 4,
+        "entity": "Jho Low",
+        "hops": 2,
+        "entities": [{"name": "Jho Low", ..., "distance": 0}],
+        "relationships": [...],
+        "truncated": false
+    }
+    """
+    name = request.args.get('entity', '').strip()
+    if not name:
+        return jsonify({'error': 'entity is required'}), 400
+    try:
+        hops = int(request.args.get('hops', 1))
+        max_nodes = int(request.args.get('max_nodes', NEIGHBORHOOD_MAX_NODES))
+    except ValueError:
+        return jsonify({'error': 'hops and max_nodes must be integers'}), 400
+    if not 1 <= hops <= NEIGHBORHOOD_MAX_HOPS:
+        return jsonify({'error': f'hops must be between 1 and {NEIGHBORHOOD_MAX_HOPS}'}), 400
+    if not 1 <= max_nodes <= NETWORK_MAX_PAGE_SIZE:
+        return jsonify({'error': f'max_nodes must be between 1 and {NETWORK_MAX_PAGE_SIZE}'}), 400
+    types, statuses = split_param(request.args, 'relationship_type'), split_param(request.args, 'status')
+    
+    try:
+        version_info = store.network_version(network_id)
+        if version_info is None:
+            return jsonify({'error': 'Network not found'}), 404
+        response = not_modified_response(version_info)
+        if response is not None:
+            return response
+        
+        entry = network_graphs.get(store, network_id)
+        if entry is None:
+            return jsonify({'error': 'Network not found'}), 404
+        index = cached_path_index(network_id, entry)
+        center = find_node(network_id, index, name)
+        if center is None:
+            return jsonify({'error': f'Entity not found: {name}'}), 404
+        
+        graph = index.filtered_graph(types, statuses)
+        nodes, distances, truncated = ego_network(graph, center, hops, max_nodes)
+        entities, relationships = index.subgraph(nodes, index.allowed(types, statuses))
+        
+        return with_validators(json_response({
+            'network_id': network_id,
+            'version': entry['version'],
+            'entity': graph.names[center],
+            'hops': hops,
+            'entities': [{**entity, 'distance': distance} for entity, distance in zip(entities, distances)],
+            'relationships': relationships,
+            'truncated': truncated
+        }), entry)
+    
+    except Exception as e:
+        logger.error(f'Network neighborhood error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/network/<network_id>/paths', methods=['GET'])
+def network_paths(network_id):
+    """
+    Paths connecting two entities, with the entities and relationships on them
+    
+    Query parameters:
+        source, target: entity names (required)
+        k: number of shortest paths, in order of length (default 1)
+        max_length: instead of the k shortest, every simple path of at
+            most this many relationships, shortest first
+        limit: most paths returned with max_length (default 100)
+        relationship_type, status: comma-separated relationship filters
+    
+    Returns:
+    {
+        "network_id": "network-id",
+        "version": 4,
+        "source": "Jho Low",
+        "target": "Najib Razak",
+        "paths": [{"length": 2, "entities": ["Jho Low", "1MDB", "Najib Razak"]}],
+        "entities": [...],
+        "relationships": [...],
+        "truncated": false
+    }
+    """
+    source_name = request.args.get('source', '').strip()
+    target_name = request.args.get('target', '').strip()
+    if not source_name or not target_name:
+        return jsonify({'error': 'source and target are required'}), 400
+    try:
+        k = int(request.args.get('k', 1))
+        max_length = int(request.args['max_length']) if request.args.get('max_length') else None
+        limit = int(request.args.get('limit', PATHS_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'k, max_length and limit must be integers'}), 400
+    if not 1 <= k <= PATHS_MAX_K:
+        return jsonify({'error': f'k must be between 1 and {PATHS_MAX_K}'}), 400
+    if max_length is not None and not 1 <= max_length <= PATHS_MAX_LENGTH:
+        return jsonify({'error': f'max_length must be between 1 and {PATHS_MAX_LENGTH}'}), 400
+    if not 1 <= limit <= PATHS_MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {PATHS_MAX_LIMIT}'}), 400
+    types, statuses = split_param(request.args, 'relationship_type'), split_param(request.args, 'status')
+    
+    try:
+        version_info = store.network_version(network_id)
+        if version_info is None:
+            return jsonify({'error': 'Network not found'}), 404
+        response = not_modified_response(version_info)
+        if response is not None:
+            return response
+        
+        entry = network_graphs.get(store, network_id)
+        if entry is None:
+            return jsonify({'error': 'Network not found'}), 404
+        index = cached_path_index(network_id, entry)
+        source = find_node(network_id, index, source_name)
+        target = find_node(network_id, index, target_name)
+        for node, name in ((source, source_name), (target, target_name)):
+            if node is None:
+                return jsonify({'error': f'Entity not found: {name}'}), 404
+        
+        graph = index.filtered_graph(types, statuses)
+        truncated = False
+        if max_length is None:
+            paths = k_shortest_paths(graph, source, target, k)
+        else:
+            paths, truncated = simple_paths(graph, source, target, max_length, limit)
+        
+        nodes = list(dict.fromkeys(node for path in paths for node in path))
+        pairs = {(a, b) for path in paths for a, b in zip(path, path[1:])}
+        entities, relationships = index.subgraph(nodes, index.allowed(types, statuses), pairs)
+        
+        return with_validators(json_response({
+            'network_id': network_id,
+            'version': entry['version'],
+            'source': graph.names[source],
+            'target': graph.names[target],
+            'paths': [
+                {'length': len(path) - 1, 'entities': [graph.names[node] for node in path]}
+                for path in paths
+            ],
+            'entities': entities,
+            'relationships': relationships,
+            'truncated': truncated
+        }), entry)
+    
+    except Exception as e:
+        logger.error(f'Network paths error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/network/<network_id>/candidates', methods=['POST'])
+def network_candidates(network_id):
+    """
+    Find candidate missing relationships in a network
+    
+    Expected JSON format (all optional):
+    {
+        "text": "Source document, enables co-occurrence",
+        "methods": ["co-occurrence", "similar-context", "transitive", "shared-connections"],
+        "min_confidence": 0.6,
+        "limit": 500
+    }
+    
+    Returns:
+    {
+        "network_id": "network-id",
+        "candidates": [{"source", "target", "confidence", "method", "evidence", ...}],
+        "metadata": {...}
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    
+    methods = data.get('methods', list(CANDIDATE_METHODS))
+    if not isinstance(methods, list):
+        return jsonify({'error': 'methods must be a list'}), 400
+    unknown = [m for m in methods if m not in CANDIDATE_METHODS]
+    if unknown:
+        return jsonify({'error': f'Unknown methods: {", ".join(map(str, unknown))}'}), 400
+    text = data.get('text') or ''
+    if not isinstance(text, str):
+        return jsonify({'error': 'text must be a string'}), 400
+    try:
+        min_confidence = float(data.get('min_confidence', 0.0))
+        limit = int(data.get('limit', CANDIDATES_LIMIT))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'min_confidence and limit must be numbers'}), 400
+    if not 0.0 <= min_confidence <= 1.0:
+        return jsonify({'error': 'min_confidence must be between 0 and 1'}), 400
+    if not 1 <= limit <= CANDIDATES_MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {CANDIDATES_MAX_LIMIT}'}), 400
+    
+    try:
+        version_info = store.network_version(network_id)
+        if version_info is None:
+            return jsonify({'error': 'Network not found'}), 404
+        
+        # Results are cached per network version and request, so the
+        # network is only read when the analysis has to run
+        request_digest = hashlib.sha256(dumps([text, sorted(methods), min_confidence, limit])).hexdigest()
+        cache_key = ('candidates', network_id, version_info['created_at'], version_info['version'], request_digest)
+        body = network_bodies.get(cache_key)
+        if body is not None:
+            return Response(body, mimetype='application/json')
+        
+        with store.snapshot(network_id) as view:
+            if view is None:
+                return jsonify({'error': 'Network not found'}), 404
+            network_version = (view['created_at'], view['version'])
+            entities = with_aliases(view['entities'], store.aliases(network_id))
+            relationships = list(view['relationships'])
+        
+        index = mention_indexes.get(network_id, network_version, entities, text) if text else None
+        candidates, metadata = analyze_missing_connections(
+            entities,
+            relationships,
+            document_text=text,
+            methods=methods,
+            min_confidence=min_confidence,
+            limit=limit,
+            mention_index=index
+        )
+        
+        body = dumps({
+            'network_id': network_id,
+            'candidates': candidates,
+            'metadata': metadata
+        })
+        network_bodies.put(('candidates', network_id, *network_version, request_digest), body)
+        return Response(body, mimetype='application/json')
+    
+    except Exception as e:
+        logger.error(f'Candidate analysis error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/network/<network_id>/mentions', methods=['POST'])
+def network_mentions(network_id):
+    """
+    Locate mentions of the network's entities in a document
+    
+    Expected JSON format:
+    {
+        "text": "Source document"
+    }
+    
+    Returns character offsets for highlighting:
+    {
+        "network_id": "network-id",
+        "sentences": [{"start": 0, "end": 42}],
+        "mentions": {
+            "Jho Low": [{"start": 0, "end": 7, "sentence": 0, "match": "name"}]
+        }
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    text = data.get('text')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'error': 'Missing text parameter'}), 400
+    
+    index = mention_indexes.for_network(store, network_id, text)
+    if index is None:
+        return jsonify({'error': 'Network not found'}), 404
+    
+    return jsonify({'network_id': network_id, **index.to_dict()})
+
+
+# Map frontend model names to OpenAI API model names
+MODEL_MAP = {
+    'gpt-5-nano': 'gpt-5-nano',
+    'gpt-5': 'gpt-5',
+    'gpt-5-thinking': 'o1',
+    # Legacy mappings for compatibility
+    'gpt-5-mini': 'gpt-5-nano',
+    'gpt-4o-mini': 'gpt-5-nano',
+    'gpt-4o': 'gpt-5'
+}
+
+EXTRACTION_SYSTEM_PROMPT = "You are an expert at analyzing documents and extracting network relationships. Always return valid JSON."
+INFERENCE_SYSTEM_PROMPT = "You are an expert at network analysis and finding implicit connections. Always return valid JSON."
+
+# Characters of source text included in the inference prompt
+INFERENCE_CONTEXT_CHARS = 2000
+
+# Bounds of pre-filtered inference requests
+INFERENCE_MAX_TOP_K = 500
+INFERENCE_MIN_TOKEN_BUDGET = 500
+INFERENCE_MAX_TOKEN_BUDGET = 16000
+
+# Bump whenever the extraction prompt changes so cached results are not reused
+EXTRACTION_PROMPT_VERSION = '1'
+
+# Results of packed batch prompts are cached apart from single-document
+# ones: a single /api/extract never reuses them, while a batch reuses both
+BATCH_EXTRACTION_PROMPT_VERSION = 'batch-1'
+
+# Chunked (map/reduce) extraction settings for long documents
+EXTRACTION_CHUNK_CHARS = int(os.getenv('EXTRACTION_CHUNK_CHARS', str(DEFAULT_CHUNK_CHARS)))
+EXTRACTION_MAX_WORKERS = int(os.getenv('EXTRACTION_MAX_WORKERS', '4'))
+
+# Bounds of a request's chunk_chars: smaller chunks multiply the model
+# calls per document (and must exceed the chunk overlap), larger ones
+# overflow the model's context
+EXTRACTION_MIN_CHUNK_CHARS = 2000
+EXTRACTION_MAX_CHUNK_CHARS = int(os.getenv('EXTRACTION_MAX_CHUNK_CHARS', '48000'))
+
+# Incremental extraction uses smaller chunks so an edit re-extracts less text
+EXTRACTION_INCREMENTAL_CHUNK_CHARS = int(os.getenv(
+    'EXTRACTION_INCREMENTAL_CHUNK_CHARS', str(DEFAULT_INCREMENTAL_CHUNK_CHARS)
+))
+
+# Batch extraction limits
+EXTRACTION_BATCH_MAX_DOCUMENTS = int(os.getenv('EXTRACTION_BATCH_MAX_DOCUMENTS', '500'))
+EXTRACTION_BATCH_MIN_TOKEN_BUDGET = 1000
+EXTRACTION_BATCH_MAX_TOKEN_BUDGET = int(os.getenv('EXTRACTION_BATCH_MAX_TOKEN_BUDGET', '16000'))
+
+
+def resolve_model(requested_model):
+    """Resolve a frontend model name to an OpenAI API model name"""
+    return MODEL_MAP.get(requested_model, requested_model)
+
+
+def build_extraction_prompt(text):
+    """Build the entity/relationship extraction prompt for a document"""
+    return f"""Analyze the following text and extract all entities (people, organizations, locations, events) and their relationships.
+
+Return a JSON object with this structure:
+{{
+  "entities": [
+    {{
+      "id": "unique_id",
       "name": "Entity Name",
       "type": "person|organization|location|event|financial_institution|government_entity",
       "importance": 1-10,
@@ -418,83 +1457,467 @@ Text to analyze:
 {text}
 
 Return ONLY the JSON object, no additional text."""
-        
-        # Call OpenAI API
-        response = openai_client.chat.completions.create(
+
+
+def record_model_usage(model, operation, tokens):
+    """Count a completed model call and its tokens"""
+    MODEL_CALLS.labels(model, operation).inc()
+    MODEL_TOKENS.labels(model, operation).inc(tokens)
+
+
+def complete_json(model, system_prompt, prompt, operation='extract'):
+    """
+    Call the OpenAI chat API in JSON mode
+    
+    Returns:
+        (parsed JSON object, total tokens used)
+    """
+    with EXTRACTION_STAGE_SECONDS.labels(operation, 'upstream').time():
+        response = openai_client.create_chat_completion(
             model=model,
             messages=[
-                {"role": "system", "content": "You are an expert at analyzing documents and extracting network relationships. Always return valid JSON."},
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
             response_format={"type": "json_object"}
         )
-        
-        # Parse response
-        content = response.choices[0].message.content
+    record_model_usage(model, operation, response.usage.total_tokens)
+    
+    content = response.choices[0].message.content
+    with EXTRACTION_STAGE_SECONDS.labels(operation, 'parse').time():
         result = json.loads(content)
+    return result, response.usage.total_tokens
+
+
+def llm_error_response(error):
+    """Report a model call that failed after retries with its own status code"""
+    logger.warning(f'Model call failed: {error}')
+    response = jsonify({'error': str(error)})
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status_code
+
+
+def run_extraction(text, model):
+    """
+    Extract entities and relationships from text with the OpenAI API
+    
+    Returns:
+        dict with entities, relationships and metadata
+    """
+    with EXTRACTION_STAGE_SECONDS.labels('extract', 'prompt').time():
+        prompt = build_extraction_prompt(text)
+    result, tokens_used = complete_json(model, EXTRACTION_SYSTEM_PROMPT, prompt)
+    
+    # Add metadata
+    result['metadata'] = {
+        'model': model,
+        'tokens_used': tokens_used,
+        'cost_estimate': (tokens_used / 1_000_000) * 0.375,  # Rough estimate
+        'cached': False
+    }
+    
+    return result
+
+
+def get_cached_extraction(text, model, prompt_version=EXTRACTION_PROMPT_VERSION):
+    """Return the cached extraction of text marked as a cache hit, or None"""
+    if extraction_cache is None:
+        return None
+    
+    cached = extraction_cache.get(make_cache_key(text, model, prompt_version))
+    if cached is None:
+        return None
+    
+    result = dict(cached)
+    tokens_saved = cached['metadata']['tokens_used']
+    result['metadata'] = {
+        **cached['metadata'],
+        'tokens_used': 0,
+        'tokens_saved': tokens_saved,
+        'cost_estimate': 0.0,
+        'cached': True
+    }
+    logger.info(f'Extraction cache hit ({tokens_saved} tokens saved)')
+    return result
+
+
+def cache_extraction(text, model, result, prompt_version=EXTRACTION_PROMPT_VERSION):
+    """Store an extraction result for later requests with the same text"""
+    if extraction_cache is not None:
+        extraction_cache.set(make_cache_key(text, model, prompt_version), result)
+
+
+def get_cached_batch_extraction(text, model):
+    """Cached extraction of text from a single-document or a packed batch prompt, or None"""
+    result = get_cached_extraction(text, model)
+    if result is None:
+        result = get_cached_extraction(text, model, BATCH_EXTRACTION_PROMPT_VERSION)
+    return result
+
+
+def cached_extraction(text, model, use_cache=True):
+    """Run extraction, reusing a cached result for identical text/model/prompt"""
+    if use_cache:
+        result = get_cached_extraction(text, model)
+        if result is not None:
+            return result
+    
+    result = run_extraction(text, model)
+    if use_cache:
+        cache_extraction(text, model, result)
+    return result
+
+
+def parse_extract_request(data):
+    """
+    Validate an /api/extract request body
+    
+    Returns:
+        (options, error) where options is a JSON-serializable dict for
+        extract_document and error is a message for a 400 response
+    """
+    if not data or 'text' not in data:
+        return None, 'Missing text parameter'
+    
+    text = data['text']
+    if not text.strip():
+        return None, 'Text cannot be empty'
+    
+    # 'auto' switches to map/reduce extraction once the text exceeds one
+    # chunk, or to incremental extraction when a document_id is given
+    mode = data.get('mode', 'auto')
+    if mode not in ('auto', 'single', 'chunked', 'incremental'):
+        return None, 'mode must be auto, single, chunked or incremental'
+    
+    document_id = data.get('document_id')
+    if document_id is not None:
+        document_id = str(document_id)
+    
+    try:
+        max_workers = int(data.get('max_workers', EXTRACTION_MAX_WORKERS))
+        chunk_chars = int(data.get('chunk_chars', EXTRACTION_CHUNK_CHARS))
+    except (TypeError, ValueError):
+        return None, 'max_workers and chunk_chars must be integers'
+    if max_workers < 1:
+        return None, 'max_workers must be at least 1'
+    if not EXTRACTION_MIN_CHUNK_CHARS <= chunk_chars <= EXTRACTION_MAX_CHUNK_CHARS:
+        return None, f'chunk_chars must be between {EXTRACTION_MIN_CHUNK_CHARS} and {EXTRACTION_MAX_CHUNK_CHARS}'
+    
+    return {
+        'text': text,
+        'model': resolve_model(data.get('model', 'gpt-5-nano')),
+        'mode': mode,
+        'document_id': document_id,
+        'cache': bool(data.get('cache', True)),
+        # Requests may lower the server's concurrency, not raise it
+        'max_workers': min(EXTRACTION_MAX_WORKERS, max_workers),
+        'chunk_chars': chunk_chars
+    }, None
+
+
+def extract_document_incremental(text, model, document_id, options):
+    """
+    Re-extract only the chunks of a document that changed since its last extraction
+    
+    Unchanged chunks come from the document's manifest (or, without a
+    document_id, from the extraction cache by content).
+    """
+    previous = None
+    if document_id is not None and chunk_manifests is not None:
+        previous = chunk_manifests.get(document_id, model)
+    
+    result, manifest = extract_incremental(
+        text,
+        lambda chunk_text: cached_extraction(chunk_text, model, use_cache=options['cache']),
+        lambda chunk_text: make_cache_key(chunk_text, model, EXTRACTION_PROMPT_VERSION),
+        previous=previous,
+        max_workers=options['max_workers'],
+        max_chars=EXTRACTION_INCREMENTAL_CHUNK_CHARS
+    )
+    
+    if document_id is not None and chunk_manifests is not None:
+        chunk_manifests.set(document_id, model, manifest)
+    
+    result['metadata']['model'] = model
+    result['metadata']['document_id'] = document_id
+    result['metadata']['cost_estimate'] = (result['metadata']['tokens_used'] / 1_000_000) * 0.375
+    return result
+
+
+def extract_document(options):
+    """Run a validated extraction request (see parse_extract_request)"""
+    text = options['text']
+    model = options['model']
+    mode = options['mode']
+    document_id = options.get('document_id')
+    if mode == 'auto':
+        if document_id is not None:
+            mode = 'incremental'
+        else:
+            mode = 'chunked' if len(text) > options['chunk_chars'] else 'single'
+    
+    logger.info(f'Extracting network from {len(text)} characters using {model} ({mode})')
+    
+    if mode == 'incremental':
+        result = extract_document_incremental(text, model, document_id, options)
+    elif mode == 'chunked':
+        result = extract_chunked(
+            text,
+            lambda chunk_text: cached_extraction(chunk_text, model, use_cache=options['cache']),
+            max_workers=options['max_workers'],
+            max_chars=options['chunk_chars']
+        )
+        result['metadata']['model'] = model
+        result['metadata']['cost_estimate'] = (result['metadata']['tokens_used'] / 1_000_000) * 0.375
+    else:
+        result = cached_extraction(text, model, use_cache=options['cache'])
+    
+    if 'merge_seconds' in result['metadata']:
+        EXTRACTION_STAGE_SECONDS.labels('extract', 'normalize').observe(result['metadata']['merge_seconds'])
+    
+    logger.info(f'Extracted {len(result.get("entities", []))} entities and {len(result.get("relationships", []))} relationships')
+    
+    return result
+
+
+def coalesced(kind, payload, fn):
+    """Run fn once for concurrent identical requests, marking results shared with other callers"""
+    result, shared = single_flight.do(make_request_key(kind, payload), fn)
+    if shared:
+        result = {**result, 'metadata': {**result.get('metadata', {}), 'coalesced': True}}
+    return result
+
+
+def run_extract_request(options):
+    """extract_document with concurrent identical requests coalesced"""
+    payload = {
+        **options,
+        'text': normalize_text(options['text']),
+        'prompt_version': EXTRACTION_PROMPT_VERSION
+    }
+    return coalesced('extract', payload, lambda: extract_document(options))
+
+
+@app.route('/api/extract', methods=['POST'])
+def api_extract():
+    """Extract entities and relationships from text using AI"""
+    try:
+        if not openai_client:
+            return jsonify({'error': 'OpenAI API key not configured'}), 500
         
-        # Add metadata
-        result['metadata'] = {
-            'model': model,
-            'tokens_used': response.usage.total_tokens,
-            'cost_estimate': (response.usage.total_tokens / 1_000_000) * 0.375  # Rough estimate
-        }
+        options, error = parse_extract_request(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
         
-        logger.info(f'Extracted {len(result.get("entities", []))} entities and {len(result.get("relationships", []))} relationships')
+        result = run_extract_request(options)
         
         return jsonify(result), 200
         
+    except LLMError as e:
+        return llm_error_response(e)
     except Exception as e:
         logger.error(f'Extraction error: {str(e)}', exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/infer', methods=['POST'])
-def api_infer():
-    """Infer missing relationships between entities using AI"""
+@app.route('/api/extract/jobs', methods=['POST'])
+def submit_extraction_job():
+    """
+    Queue an extraction and return immediately
+    
+    Accepts the same body as /api/extract. Returns 202 with a job id to
+    poll at /api/extract/jobs/<job_id>, or 429 when the queue is full.
+    """
+    try:
+        if not openai_client:
+            return jsonify({'error': 'OpenAI API key not configured'}), 500
+        
+        options, error = parse_extract_request(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
+        
+        try:
+            job = job_queue.submit(options)
+        except QueueFullError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+        
+        return jsonify({
+            **job,
+            'status_url': f'/api/extract/jobs/{job["job_id"]}'
+        }), 202
+    
+    except Exception as e:
+        logger.error(f'Error queueing extraction job: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/extract/jobs/<job_id>', methods=['GET'])
+def get_extraction_job(job_id):
+    """
+    Get extraction job status
+    
+    Returns:
+    {
+        "job_id": "...",
+        "status": "queued|running|completed|failed",
+        "result": {...},       (when completed)
+        "error": "..."         (when failed)
+    }
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job)
+
+
+@app.route('/api/extract/batch', methods=['POST'])
+def api_extract_batch():
+    """
+    Extract entities and relationships from many documents at once
+    
+    Expected JSON format:
+    {
+        "documents": [{"id": "optional-id", "text": "..."}],
+        "model": "gpt-5-nano",
+        "merge": true,                  (optional, return a merged network)
+        "network_id": "optional-id",    (optional, add the merged network to this network)
+        "token_budget": 6000            (optional, max estimated tokens per packed prompt)
+    }
+    
+    Returns:
+    {
+        "documents": [{"id": "...", "entities": [...], "relationships": [...], "metadata": {...}}],
+        "merged": {"entities": [...], "relationships": [...]},
+        "metadata": {"documents": 120, "model_calls": 9, "documents_per_minute": 840.0, ...}
+    }
+    """
     try:
         if not openai_client:
             return jsonify({'error': 'OpenAI API key not configured'}), 500
         
         data = request.get_json()
         
-        if not data:
-            return jsonify({'error': 'Missing request data'}), 400
+        if not data or not isinstance(data.get('documents'), list) or not data['documents']:
+            return jsonify({'error': 'documents must be a non-empty array'}), 400
         
-        entities = data.get('entities', [])
-        relationships = data.get('relationships', [])
-        original_text = data.get('text', '')
-        # Map frontend model names to OpenAI API model names
-        model_map = {
-            'gpt-5-nano': 'gpt-5-nano',
-            'gpt-5': 'gpt-5',
-            'gpt-5-thinking': 'o1',
-            # Legacy mappings for compatibility
-            'gpt-5-mini': 'gpt-5-nano',
-            'gpt-4o-mini': 'gpt-5-nano',
-            'gpt-4o': 'gpt-5'
-        }
-        requested_model = data.get('model', 'gpt-5-nano')
-        model = model_map.get(requested_model, requested_model)
+        if len(data['documents']) > EXTRACTION_BATCH_MAX_DOCUMENTS:
+            return jsonify({'error': f'At most {EXTRACTION_BATCH_MAX_DOCUMENTS} documents per batch'}), 400
         
-        if not entities:
-            return jsonify({'error': 'No entities provided'}), 400
+        documents = []
+        for idx, doc in enumerate(data['documents']):
+            if isinstance(doc, str):
+                doc = {'text': doc}
+            if not isinstance(doc, dict) or not str(doc.get('text', '')).strip():
+                return jsonify({'error': f'Document {idx} has no text'}), 400
+            documents.append({'id': str(doc.get('id', idx)), 'text': doc['text']})
         
-        logger.info(f'Inferring relationships for {len(entities)} entities using {model}')
+        if len({doc['id'] for doc in documents}) != len(documents):
+            return jsonify({'error': 'Document ids must be unique'}), 400
         
-        # Create entity summary
-        entity_summary = "\n".join([
-            f"- {e['name']} ({e['type']}): {e.get('description', 'No description')}"
-            for e in entities
-        ])
+        try:
+            token_budget = int(data.get('token_budget', DEFAULT_PACK_TOKEN_BUDGET))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'token_budget must be an integer'}), 400
+        if not EXTRACTION_BATCH_MIN_TOKEN_BUDGET <= token_budget <= EXTRACTION_BATCH_MAX_TOKEN_BUDGET:
+            return jsonify({
+                'error': f'token_budget must be between {EXTRACTION_BATCH_MIN_TOKEN_BUDGET} '
+                         f'and {EXTRACTION_BATCH_MAX_TOKEN_BUDGET}'
+            }), 400
         
-        # Create existing relationships summary
-        rel_summary = "\n".join([
-            f"- {r['source']} → {r['target']}: {r['type']}"
-            for r in relationships
-        ])
+        model = resolve_model(data.get('model', 'gpt-5-nano'))
+        use_cache = data.get('cache', True)
+        logger.info(f'Batch extracting {len(documents)} documents using {model}')
         
-        prompt = f"""Given these entities and their known relationships, identify any MISSING connections that are likely but not explicitly stated.
+        extract_options = {
+            'model': model,
+            'mode': 'auto',
+            'cache': use_cache,
+            'max_workers': EXTRACTION_MAX_WORKERS,
+            'chunk_chars': EXTRACTION_CHUNK_CHARS
+        }
+        results, metadata = extract_batch(
+            documents,
+            extract_fn=lambda text: extract_document({**extract_options, 'text': text}),
+            complete_fn=lambda prompt: complete_json(model, EXTRACTION_SYSTEM_PROMPT, prompt),
+            max_workers=EXTRACTION_MAX_WORKERS,
+            token_budget=token_budget,
+            lookup_fn=(lambda text: get_cached_batch_extraction(text, model)) if use_cache else None,
+            remember_fn=(
+                lambda text, result: cache_extraction(text, model, result, BATCH_EXTRACTION_PROMPT_VERSION)
+            ) if use_cache else None
+        )
+        metadata['model'] = model
+        metadata['cost_estimate'] = (metadata['tokens_used'] / 1_000_000) * 0.375
+        
+        response = {'documents': results, 'metadata': metadata}
+        
+        if data.get('merge') or data.get('network_id'):
+            with EXTRACTION_STAGE_SECONDS.labels('extract', 'normalize').time():
+                merged = merge_batch_results(results)
+            response['merged'] = merged
+            
+            if data.get('network_id'):
+                added, resolved, suggestions = add_resolved(
+                    data['network_id'], merged['entities'], merged['relationships']
+                )
+                response['network'] = {
+                    'network_id': data['network_id'], **added, 'resolved': resolved, 'suggestions': suggestions
+                }
+        
+        return jsonify(response), 200
+    
+    except LLMError as e:
+        return llm_error_response(e)
+    except Exception as e:
+        logger.error(f'Batch extraction error: {str(e)}', exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/extract/cache', methods=['GET'])
+def extraction_cache_stats():
+    """Return extraction cache hit/miss counters for this worker"""
+    if extraction_cache is None:
+        return jsonify({'enabled': False})
+    
+    return jsonify({'enabled': True, **extraction_cache.stats()})
+
+
+def request_mention_index(entities, text):
+    """Mention index of text for entities sent with a request, shared through mention_indexes"""
+    entity_key = hashlib.sha256('\n'.join(sorted(
+        '\t'.join([e['name'], *(e.get('aliases') or ())]) for e in entities
+    )).encode('utf-8')).hexdigest()
+    return mention_indexes.get(None, entity_key, entities, text)
+
+
+def build_inference_prompt(entities, relationships, original_text):
+    """Build the missing-relationship inference prompt"""
+    # Create entity summary
+    entity_summary = "\n".join([
+        f"- {e['name']} ({e['type']}): {e.get('description', 'No description')}"
+        for e in entities
+    ])
+    
+    # Create existing relationships summary
+    rel_summary = "\n".join([
+        f"- {r['source']} → {r['target']}: {r['type']}"
+        for r in relationships
+    ])
+    
+    # For long documents send the sentences mentioning the most entities
+    # instead of just the opening characters
+    context = original_text[:INFERENCE_CONTEXT_CHARS]
+    if len(original_text) > INFERENCE_CONTEXT_CHARS:
+        index = request_mention_index(entities, original_text)
+        excerpts = index.select_excerpts(INFERENCE_CONTEXT_CHARS)
+        if excerpts:
+            context = '. '.join(excerpts)
+    
+    return f"""Given these entities and their known relationships, identify any MISSING connections that are likely but not explicitly stated.
 
 ENTITIES:
 {entity_summary}
@@ -503,7 +1926,7 @@ KNOWN RELATIONSHIPS:
 {rel_summary}
 
 ORIGINAL TEXT (for context):
-{original_text[:2000]}...
+{context}...
 
 Analyze the entities and find implicit or transitive relationships that are missing. Consider:
 1. Co-occurrence (entities mentioned together)
@@ -525,36 +1948,365 @@ Return a JSON object:
 }}
 
 Return ONLY the JSON object."""
+
+
+def run_inference(entities, relationships, original_text, model):
+    """
+    Infer missing relationships with the OpenAI API
+    
+    Returns:
+        dict with inferred_relationships and metadata
+    """
+    with EXTRACTION_STAGE_SECONDS.labels('infer', 'prompt').time():
+        prompt = build_inference_prompt(entities, relationships, original_text)
+    result, tokens_used = complete_json(model, INFERENCE_SYSTEM_PROMPT, prompt, operation='infer')
+    
+    # Add metadata
+    result['metadata'] = {
+        'model': model,
+        'tokens_used': tokens_used,
+        'cost_estimate': (tokens_used / 1_000_000) * 0.375
+    }
+    
+    return result
+
+
+@app.route('/api/infer', methods=['POST'])
+def api_infer():
+    """Infer missing relationships between entities using AI"""
+    try:
+        if not openai_client:
+            return jsonify({'error': 'OpenAI API key not configured'}), 500
         
-        # Call OpenAI API
-        response = openai_client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are an expert at network analysis and finding implicit connections. Always return valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+        data = request.get_json()
         
-        content = response.choices[0].message.content
-        result = json.loads(content)
+        if not data:
+            return jsonify({'error': 'Missing request data'}), 400
+        
+        entities = data.get('entities', [])
+        relationships = data.get('relationships', [])
+        original_text = data.get('text', '')
+        model = resolve_model(data.get('model', 'gpt-5-nano'))
         
-        # Add metadata
-        result['metadata'] = {
+        if not entities:
+            return jsonify({'error': 'No entities provided'}), 400
+        
+        logger.info(f'Inferring relationships for {len(entities)} entities using {model}')
+        
+        prefilter = bool(data.get('prefilter'))
+        try:
+            top_k = int(data.get('top_k', DEFAULT_TOP_K))
+            token_budget = int(data.get('token_budget', DEFAULT_BATCH_TOKENS))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'top_k and token_budget must be integers'}), 400
+        if not 1 <= top_k <= INFERENCE_MAX_TOP_K:
+            return jsonify({'error': f'top_k must be between 1 and {INFERENCE_MAX_TOP_K}'}), 400
+        if not INFERENCE_MIN_TOKEN_BUDGET <= token_budget <= INFERENCE_MAX_TOKEN_BUDGET:
+            return jsonify({
+                'error': f'token_budget must be between {INFERENCE_MIN_TOKEN_BUDGET} and {INFERENCE_MAX_TOKEN_BUDGET}'
+            }), 400
+        
+        def infer():
+            if prefilter:
+                result = infer_from_candidates(
+                    entities, relationships, original_text,
+                    complete_fn=lambda prompt: complete_json(model, INFERENCE_SYSTEM_PROMPT, prompt, operation='infer'),
+                    top_k=top_k,
+                    token_budget=token_budget,
+                    max_workers=EXTRACTION_MAX_WORKERS,
+                    mention_index=request_mention_index(entities, original_text) if original_text else None
+                )
+                result['metadata']['model'] = model
+                result['metadata']['cost_estimate'] = (result['metadata']['tokens_used'] / 1_000_000) * 0.375
+                return result
+            return run_inference(entities, relationships, original_text, model)
+        
+        result = coalesced('infer', {
+            'entities': entities,
+            'relationships': relationships,
+            'text': normalize_text(original_text),
             'model': model,
-            'tokens_used': response.usage.total_tokens,
-            'cost_estimate': (response.usage.total_tokens / 1_000_000) * 0.375
-        }
+            'prefilter': prefilter,
+            'top_k': top_k,
+            'token_budget': token_budget
+        }, infer)
         
         logger.info(f'Inferred {len(result.get("inferred_relationships", []))} new relationships')
         
         return jsonify(result), 200
         
+    except LLMError as e:
+        return llm_error_response(e)
     except Exception as e:
         logger.error(f'Inference error: {str(e)}', exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
+def stream_format_from_request():
+    """Pick NDJSON or Server-Sent Events from ?format= or the Accept header"""
+    stream_format = request.args.get('format')
+    if stream_format in ('ndjson', 'sse'):
+        return stream_format
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        return 'sse'
+    return 'ndjson'
+
+
+def stream_model_events(model, system_prompt, prompt, item_events, stream_format, on_complete=None,
+                        operation='extract'):
+    """
+    Stream a model call, emitting one event per completed array item
+    
+    Args:
+        item_events: mapping of top-level array key -> event name
+        on_complete: optional callback receiving the fully parsed result
+        operation: 'extract' or 'infer', for metrics
+    
+    Yields:
+        formatted NDJSON lines or SSE messages
+    """
+    started = time.perf_counter()
+    first_item_seconds = None
+    parser = ArrayItemParser(item_events.keys())
+    content_parts = []
+    total_tokens = 0
+    counts = {event: 0 for event in item_events.values()}
+    
+    try:
+        with openai_client.create_chat_completion(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True}
+        ) as stream:
+            for chunk in stream:
+                if chunk.usage:
+                    total_tokens = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                
+                content_parts.append(delta)
+                for key, item in parser.feed(delta):
+                    if first_item_seconds is None:
+                        first_item_seconds = time.perf_counter() - started
+                    event = item_events[key]
+                    counts[event] += 1
+                    yield format_event(event, item, stream_format)
+        
+        EXTRACTION_STAGE_SECONDS.labels(operation, 'upstream').observe(time.perf_counter() - started)
+        record_model_usage(model, operation, total_tokens)
+        
+        if on_complete:
+            with EXTRACTION_STAGE_SECONDS.labels(operation, 'parse').time():
+                result = json.loads(''.join(content_parts))
+            result['metadata'] = {
+                'model': model,
+                'tokens_used': total_tokens,
+                'cost_estimate': (total_tokens / 1_000_000) * 0.375,
+                'cached': False
+            }
+            on_complete(result)
+        
+        yield format_event('done', {
+            'model': model,
+            'counts': counts,
+            'tokens_used': total_tokens,
+            'cost_estimate': (total_tokens / 1_000_000) * 0.375,
+            'first_item_seconds': round(first_item_seconds, 3) if first_item_seconds is not None else None,
+            'total_seconds': round(time.perf_counter() - started, 3),
+            'cached': False
+        }, stream_format)
+    
+    except Exception as e:
+        logger.error(f'Streaming error: {str(e)}', exc_info=True)
+        yield format_event('error', {'error': str(e)}, stream_format)
+
+
+def streaming_response(events, stream_format):
+    """Wrap an event generator in a streaming Flask response"""
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = Response(stream_with_context(events), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/extract/stream', methods=['POST'])
+def api_extract_stream():
+    """
+    Streaming variant of /api/extract
+    
+    Emits one NDJSON line (or SSE message) per entity and relationship as
+    soon as the model has produced it, followed by a final 'done' event.
+    """
+    if not openai_client:
+        return jsonify({'error': 'OpenAI API key not configured'}), 500
+    
+    data = request.get_json()
+    
+    if not data or 'text' not in data:
+        return jsonify({'error': 'Missing text parameter'}), 400
+    
+    text = data['text']
+    model = resolve_model(data.get('model', 'gpt-5-nano'))
+    
+    if not text.strip():
+        return jsonify({'error': 'Text cannot be empty'}), 400
+    
+    stream_format = stream_format_from_request()
+    item_events = {'entities': 'entity', 'relationships': 'relationship'}
+    logger.info(f'Streaming extraction from {len(text)} characters using {model}')
+    
+    use_cache = data.get('cache', True) and extraction_cache is not None
+    key = make_cache_key(text, model, EXTRACTION_PROMPT_VERSION) if use_cache else None
+    cached = extraction_cache.get(key) if use_cache else None
+    
+    if cached is not None:
+        def replay():
+            for array_key, event in item_events.items():
+                for item in cached.get(array_key, []):
+                    yield format_event(event, item, stream_format)
+            yield format_event('done', {
+                **cached['metadata'],
+                'counts': {event: len(cached.get(k, [])) for k, event in item_events.items()},
+                'tokens_used': 0,
+                'tokens_saved': cached['metadata']['tokens_used'],
+                'cost_estimate': 0.0,
+                'cached': True
+            }, stream_format)
+        return streaming_response(replay(), stream_format)
+    
+    on_complete = (lambda result: extraction_cache.set(key, result)) if use_cache else None
+    with EXTRACTION_STAGE_SECONDS.labels('extract', 'prompt').time():
+        prompt = build_extraction_prompt(text)
+    events = stream_model_events(
+        model, EXTRACTION_SYSTEM_PROMPT, prompt, item_events, stream_format, on_complete
+    )
+    return streaming_response(events, stream_format)
+
+
+@app.route('/api/infer/stream', methods=['POST'])
+def api_infer_stream():
+    """
+    Streaming variant of /api/infer
+    
+    Emits one 'inferred_relationship' event per inferred relationship,
+    followed by a final 'done' event.
+    """
+    if not openai_client:
+        return jsonify({'error': 'OpenAI API key not configured'}), 500
+    
+    data = request.get_json()
+    
+    if not data:
+        return jsonify({'error': 'Missing request data'}), 400
+    
+    entities = data.get('entities', [])
+    relationships = data.get('relationships', [])
+    original_text = data.get('text', '')
+    model = resolve_model(data.get('model', 'gpt-5-nano'))
+    
+    if not entities:
+        return jsonify({'error': 'No entities provided'}), 400
+    
+    stream_format = stream_format_from_request()
+    logger.info(f'Streaming inference for {len(entities)} entities using {model}')
+    
+    with EXTRACTION_STAGE_SECONDS.labels('infer', 'prompt').time():
+        prompt = build_inference_prompt(entities, relationships, original_text)
+    events = stream_model_events(
+        model, INFERENCE_SYSTEM_PROMPT, prompt,
+        {'inferred_relationships': 'inferred_relationship'}, stream_format, operation='infer'
+    )
+    return streaming_response(events, stream_format)
+
+
+# Background queue for /api/extract/jobs
+job_queue = create_job_queue(run_extract_request)
+
+
+def collect_worker_metrics():
+    """Scrape-time counters of this worker's caches, model client and coalescer"""
+    families = []
+    
+    cache_samples = []
+    if extraction_cache is not None:
+        cache_stats = extraction_cache.stats()
+        cache_samples += [
+            ({'cache': 'extraction_memory', 'result': 'hit'}, cache_stats['memory_hits']),
+            ({'cache': 'extraction_disk', 'result': 'hit'}, cache_stats['disk_hits']),
+            ({'cache': 'extraction', 'result': 'miss'}, cache_stats['misses'])
+        ]
+    body_stats = network_bodies.stats()
+    cache_samples += [
+        ({'cache': 'network_body', 'result': 'hit'}, body_stats['hits']),
+        ({'cache': 'network_body', 'result': 'miss'}, body_stats['misses'])
+    ]
+    families.append(family(
+        'silent_partners_cache_lookups_total', 'counter', 'Cache lookups by cache and result', cache_samples
+    ))
+    families.append(family(
+        'silent_partners_network_body_cache_bytes', 'gauge', 'Encoded network bodies held in memory',
+        [({}, body_stats['bytes'])]
+    ))
+    
+    if openai_client is not None:
+        client_stats = openai_client.stats()
+        families.append(family(
+            'silent_partners_llm_client_events_total', 'counter', 'Model client calls, retries and failures',
+            [({'event': event}, client_stats[event]) for event in ('calls', 'retries', 'rate_limited', 'failures')]
+        ))
+        families.append(family(
+            'silent_partners_llm_throttled_seconds_total', 'counter', 'Time spent waiting for client-side rate limits',
+            [({}, client_stats['throttled_seconds'])]
+        ))
+    
+    flight_stats = single_flight.stats()
+    families.append(family(
+        'silent_partners_coalesced_requests_total', 'counter', 'Extract/infer requests by coalescing role',
+        [({'role': role}, flight_stats[role]) for role in ('leaders', 'local_followers', 'remote_followers')]
+    ))
+    return families
+
+
+def collect_store_metrics():
+    """Scrape-time network store sizes"""
+    networks = store.list_networks()
+    return [
+        family('silent_partners_networks', 'gauge', 'Stored networks', [({}, len(networks))]),
+        family('silent_partners_network_items', 'gauge', 'Stored entities and relationships', [
+            ({'kind': 'entity'}, sum(network['entity_count'] for network in networks)),
+            ({'kind': 'relationship'}, sum(network['relationship_count'] for network in networks))
+        ])
+    ]
+
+
+def collect_job_metrics():
+    """Scrape-time extraction job counts from the shared job database"""
+    return [family('silent_partners_extraction_jobs', 'gauge', 'Extraction jobs by status', [
+        ({'status': status}, count) for status, count in job_queue.stats().items()
+    ])]
+
+
+metrics.register_collector(collect_worker_metrics)
+# A memory store belongs to each worker, so its sizes are summed like the other metrics
+metrics.register_collector(collect_store_metrics, shared=not isinstance(store, MemoryNetworkStore))
+metrics.register_collector(collect_job_metrics, shared=True)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics: request latencies, extraction stage timings, tokens, caches and store sizes"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 if __name__ == '__main__':
     logger.info('Starting Silent Partners API Server')
     logger.info('API Documentation: http://localhost:5000/api/health')
@@ -0,0 +1,232 @@
+"""
+Batch Extraction
+Extract many documents in one request
+
+Small documents are packed together into combined prompts up to a
+token budget so they share one model call; larger documents are
+extracted on their own. All groups run concurrently on a bounded
+thread pool, and the per-document results can be merged into a single
+network in the POST /api/network format.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chunked_extraction import merge_extractions
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English prose
+CHARS_PER_TOKEN = 4
+
+DEFAULT_PACK_TOKEN_BUDGET = 6000
+DEFAULT_LARGE_DOCUMENT_TOKENS = 2000
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for packing decisions"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_documents(documents, token_budget=DEFAULT_PACK_TOKEN_BUDGET,
+                   large_document_tokens=DEFAULT_LARGE_DOCUMENT_TOKENS):
+    """
+    Group documents into model calls
+
+    Documents above large_document_tokens get a group of their own; the
+    rest are packed first-fit-decreasing into groups whose combined
+    estimated size stays within token_budget.
+
+    Returns:
+        list of lists of documents
+    """
+    groups = []
+    packed = []
+
+    small = []
+    for doc in documents:
+        if estimate_tokens(doc['text']) > large_document_tokens:
+            groups.append([doc])
+        else:
+            small.append(doc)
+
+    for doc in sorted(small, key=lambda d: len(d['text']), reverse=True):
+        tokens = estimate_tokens(doc['text'])
+        for group in packed:
+            if group['tokens'] + tokens <= token_budget:
+                group['documents'].append(doc)
+                group['tokens'] += tokens
+                break
+        else:
+            packed.append({'documents': [doc], 'tokens': tokens})
+
+    groups.extend(group['documents'] for group in packed)
+    return groups
+
+
+def build_batch_prompt(documents):
+    """Build a prompt extracting several documents in one call"""
+    sections = '\n\n'.join(
+        f'=== DOCUMENT {doc["id"]} ===\n{doc["text"]}' for doc in documents
+    )
+    return f"""Analyze each of the following documents SEPARATELY and extract all entities (people, organizations, locations, events) and their relationships from each one.
+
+Return a JSON object with this structure:
+{{
+  "documents": [
+    {{
+      "doc_id": "document id from the DOCUMENT header",
+      "entities": [
+        {{
+          "id": "unique_id",
+          "name": "Entity Name",
+          "type": "person|organization|location|event|financial_institution|government_entity",
+          "importance": 1-10,
+          "description": "Brief description"
+        }}
+      ],
+      "relationships": [
+        {{
+          "source": "entity_id",
+          "target": "entity_id",
+          "type": "financial|employment|personal|legal|ownership|other",
+          "description": "Relationship description",
+          "status": "confirmed|suspected|former",
+          "value": "monetary value if applicable"
+        }}
+      ]
+    }}
+  ]
+}}
+
+Include one entry per document, even if nothing was found.
+
+Documents to analyze:
+{sections}
+
+Return ONLY the JSON object, no additional text."""
+
+
+def to_network_data(merged):
+    """Convert a merged extraction into the POST /api/network body format"""
+    names = {entity['id']: entity['name'] for entity in merged['entities']}
+    return {
+        'entities': [
+            {
+                'name': entity['name'],
+                'type': entity.get('type', 'person'),
+                'importance': entity.get('importance', 3),
+                'description': entity.get('description', '')
+            }
+            for entity in merged['entities']
+        ],
+        'relationships': [
+            {
+                **{k: v for k, v in rel.items() if k not in ('source', 'target')},
+                'source': names[rel['source']],
+                'target': names[rel['target']]
+            }
+            for rel in merged['relationships']
+        ]
+    }
+
+
+def extract_batch(documents, extract_fn, complete_fn, max_workers=4,
+                  token_budget=DEFAULT_PACK_TOKEN_BUDGET,
+                  large_document_tokens=DEFAULT_LARGE_DOCUMENT_TOKENS,
+                  lookup_fn=None, remember_fn=None):
+    """
+    Extract a list of documents, packing small ones into shared prompts
+
+    Args:
+        documents: list of dicts with 'id' and 'text'
+        extract_fn: Callable extracting a single document's text
+        complete_fn: Callable taking a prompt and returning (result, tokens)
+        lookup_fn: Optional callable returning a cached result for a text
+        remember_fn: Optional callable storing (text, result) of a packed
+            prompt in the cache; keep these apart from single-document
+            results, which come from a different prompt
+
+    Returns:
+        (list of per-document results in input order, metadata dict)
+    """
+    started = time.perf_counter()
+    results = {}
+
+    pending = []
+    for doc in documents:
+        cached = lookup_fn(doc['text']) if lookup_fn else None
+        if cached is not None:
+            results[doc['id']] = {**cached, 'metadata': {**cached['metadata'], 'packed': False}}
+        else:
+            pending.append(doc)
+
+    groups = pack_documents(pending, token_budget, large_document_tokens)
+
+    def run_single(doc):
+        result = extract_fn(doc['text'])
+        return {doc['id']: {**result, 'metadata': {**result.get('metadata', {}), 'packed': False}}}
+
+    def run_packed(group):
+        response, tokens_used = complete_fn(build_batch_prompt(group))
+        by_id = {
+            str(entry.get('doc_id')): entry
+            for entry in response.get('documents', [])
+            if isinstance(entry, dict)
+        }
+
+        total_chars = sum(len(doc['text']) for doc in group)
+        group_results = {}
+        for doc in group:
+            entry = by_id.get(str(doc['id']))
+            if entry is None:
+                # The model skipped this document; extract it on its own
+                logger.warning(f'Packed extraction omitted document {doc["id"]}, retrying alone')
+                group_results.update(run_single(doc))
+                continue
+
+            share = round(tokens_used * len(doc['text']) / total_chars) if total_chars else 0
+            result = {
+                'entities': entry.get('entities', []),
+                'relationships': entry.get('relationships', []),
+                'metadata': {'tokens_used': share, 'cached': False}
+            }
+            if remember_fn:
+                remember_fn(doc['text'], dict(result))
+            result['metadata'] = {**result['metadata'], 'packed': True, 'group_size': len(group)}
+            group_results[doc['id']] = result
+        return group_results
+
+    def run_group(group):
+        if len(group) == 1:
+            return run_single(group[0])
+        return run_packed(group)
+
+    if groups:
+        workers = max(1, min(max_workers, len(groups)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extract-batch') as executor:
+            for group_results in executor.map(run_group, groups):
+                results.update(group_results)
+
+    wall_seconds = time.perf_counter() - started
+    ordered = [{'id': doc['id'], **results[doc['id']]} for doc in documents]
+
+    metadata = {
+        'documents': len(documents),
+        'cached_documents': len(documents) - len(pending),
+        'model_calls': len(groups),
+        'packed_groups': sum(1 for group in groups if len(group) > 1),
+        'tokens_used': sum(r['metadata'].get('tokens_used', 0) for r in ordered),
+        'wall_seconds': round(wall_seconds, 3),
+        'documents_per_minute': round(len(documents) * 60 / wall_seconds, 1) if wall_seconds else None
+    }
+    logger.info(
+        f'Batch extraction: {len(documents)} documents in {len(groups)} model calls, {wall_seconds:.2f}s'
+    )
+    return ordered, metadata
+
+
+def merge_batch_results(results):
+    """Merge per-document results into one network in POST /api/network format"""
+    return to_network_data(merge_extractions(results))
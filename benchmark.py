@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Silent Partners API
+Reproducible latency, throughput and memory numbers for the main routes
+
+Drives api_server.app either in-process (Flask test client) or over a
+real gunicorn server, with the deterministic fake model provider
+(LLM_PROVIDER=fake) so extraction and inference need no network or API
+key. Synthetic networks from 1k to 1M edges are generated from a fixed
+seed.
+
+Scenarios:
+    ingest   POST /api/network in batches until the network is loaded
+    get      GET /api/network/<id>
+    export   GET /api/network/<id>/export
+    extract  POST /api/extract with distinct synthetic documents
+    infer    POST /api/infer on a sample of the network
+
+Each scenario reports p50/p99 latency, requests/s and memory (RSS of
+the server process, or of all gunicorn workers). Results can be saved
+as a baseline and later runs compared against it; a run that is slower
+than the baseline by more than --tolerance exits with status 1. p50 and
+throughput are gated on every run, p99 only with enough requests for
+it to be more than the single slowest one. A baseline recorded on
+another machine (CPU count or platform) is not compared (status 2).
+
+Usage:
+    python benchmark.py                                   # in-process, 1k-100k edges
+    python benchmark.py --mode gunicorn --workers 4
+    python benchmark.py --sizes 1k,1m --scenarios ingest,get,export
+    python benchmark.py --save-baseline                   # write benchmark_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ('ingest', 'get', 'export', 'extract', 'infer')
+
+# Scenarios that do not depend on network size run once, under this label
+SIZE_INDEPENDENT = ('extract', 'infer')
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Latency changes smaller than this are noise, whatever the ratio
+MIN_LATENCY_DELTA_MS = 2.0
+
+# Samples needed before a metric is compared with the baseline; a p99
+# from fewer than ~1000 samples rests on a handful of requests
+MIN_SAMPLES = {'p50_ms': 10, 'p99_ms': 1000}
+MIN_THROUGHPUT_SAMPLES = 10
+
+# Machine properties a baseline is only valid for
+MACHINE_KEYS = ('cpus', 'platform')
+
+INGEST_BATCH_ITEMS = 500
+
+# Size of the network that /api/infer payloads are sampled from
+INFER_SAMPLE_EDGES = 1000
+
+ENTITY_TYPES = ('person', 'organization', 'location', 'event')
+RELATIONSHIP_TYPES = ('financial', 'employment', 'personal', 'legal', 'political', 'business')
+SURNAMES = ('Low', 'Razak', 'Leissner', 'Ng', 'Tan', 'Abdullah', 'Husseiny', 'Mahony', 'Badawi', 'Lim')
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def format_size(edges):
+    if edges >= 1000000 and edges % 1000000 == 0:
+        return f'{edges // 1000000}m'
+    if edges >= 1000 and edges % 1000 == 0:
+        return f'{edges // 1000}k'
+    return str(edges)
+
+
+def synthetic_network(edges, seed=42):
+    """
+    Deterministic network with a skewed degree distribution
+
+    One entity per four edges; endpoints are drawn with a bias towards
+    low ids so a few hubs collect many relationships, as in real
+    investigations.
+    """
+    rng = random.Random(seed)
+    count = max(2, edges // 4)
+    entities = [
+        {
+            'name': f'{SURNAMES[i % len(SURNAMES)]} Entity {i}',
+            'type': ENTITY_TYPES[i % len(ENTITY_TYPES)],
+            'importance': 1 + i % 5,
+            'description': f'Synthetic entity {i}'
+        }
+        for i in range(count)
+    ]
+
+    relationships = []
+    seen = set()
+    while len(relationships) < edges:
+        source = int(count * rng.random() ** 2)
+        target = rng.randrange(count)
+        key = (min(source, target), max(source, target))
+        if source == target or key in seen:
+            continue
+        seen.add(key)
+        relationships.append({
+            'source': entities[source]['name'],
+            'target': entities[target]['name'],
+            'type': rng.choice(RELATIONSHIP_TYPES),
+            'status': rng.choice(('confirmed', 'suspected')),
+            'date': f'20{rng.randrange(10, 25)}-0{rng.randrange(1, 10)}-1{rng.randrange(0, 10)}'
+        })
+    return entities, relationships
+
+
+def synthetic_document(index, words=400, seed=7):
+    """Distinct document text naming capitalised people and organisations"""
+    rng = random.Random(seed * 1000003 + index)
+    sentences = []
+    while sum(len(s.split()) for s in sentences) < words:
+        a, b = rng.sample(SURNAMES, 2)
+        sentences.append(
+            f'{a} Holdings {index} transferred funds to {b} Capital through an account '
+            f'managed by {rng.choice(SURNAMES)} Partners in {rng.choice(("Singapore", "Geneva", "Abu Dhabi"))}.'
+        )
+    return ' '.join(sentences)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def rss_mb(pid):
+    """Current and peak resident memory of a process in MB (Linux /proc)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]) / 1024, int(fields['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        if pid == os.getpid():
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            return peak, peak
+        return None, None
+
+
+class InProcessTarget:
+    """Calls api_server.app through per-thread Flask test clients"""
+
+    name = 'inprocess'
+
+    def __init__(self):
+        import api_server
+        self.app = api_server.app
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def request(self, method, path, payload=None):
+        response = self._client().open(path, method=method, json=payload)
+        body = response.get_data()
+        return response.status_code, len(body)
+
+    def memory(self):
+        return rss_mb(os.getpid())
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    """Runs api_server under gunicorn and calls it over HTTP"""
+
+    name = 'gunicorn'
+
+    def __init__(self, workers, env, log_path):
+        import requests
+        self._requests = requests
+        self._local = threading.local()
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        self._log = open(log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', '4', '--timeout', '300',
+             '-b', f'127.0.0.1:{port}', 'api_server:app'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, **env},
+            stdout=self._log,
+            stderr=subprocess.STDOUT
+        )
+
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f'{self.base_url}/api/health', timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError(f'gunicorn did not start; see {log_path}')
+            time.sleep(0.2)
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        return session
+
+    def request(self, method, path, payload=None):
+        response = self._session().request(method, self.base_url + path, json=payload, timeout=600)
+        return response.status_code, len(response.content)
+
+    def memory(self):
+        """Summed RSS and largest peak RSS over the master and its workers"""
+        pids = [self.process.pid]
+        try:
+            with open(f'/proc/{self.process.pid}/task/{self.process.pid}/children') as f:
+                pids += [int(pid) for pid in f.read().split()]
+        except OSError:
+            pass
+        readings = [rss_mb(pid) for pid in pids]
+        readings = [r for r in readings if r[0] is not None]
+        if not readings:
+            return None, None
+        return sum(r[0] for r in readings), max(r[1] for r in readings)
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+
+def run_requests(target, calls, concurrency):
+    """
+    Issue (method, path, payload) calls with concurrency workers
+
+    Returns:
+        dict with requests, errors, seconds, first_ms, p50_ms, p99_ms, mean_ms,
+        requests_per_second; first_ms is the first call on its own, before
+        any response cache is warm. All are 0 without calls
+    """
+    if not calls:
+        return dict.fromkeys(
+            ('requests', 'errors', 'seconds', 'first_ms', 'p50_ms', 'p99_ms', 'mean_ms', 'requests_per_second'), 0
+        )
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(call):
+        started = time.perf_counter()
+        status, _ = target.request(*call)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors.append(status)
+
+    started = time.perf_counter()
+    one(calls[0])
+    first_ms = latencies[0]
+    if concurrency <= 1:
+        for call in calls[1:]:
+            one(call)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, calls[1:]))
+    wall = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(wall, 3),
+        'first_ms': round(first_ms, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'requests_per_second': round(len(latencies) / wall, 2)
+    }
+
+
+def ingest_calls(network_id, entities, relationships):
+    calls = []
+    for start in range(0, len(entities), INGEST_BATCH_ITEMS):
+        calls.append(('POST', '/api/network', {
+            'network_id': network_id, 'entities': entities[start:start + INGEST_BATCH_ITEMS]
+        }))
+    for start in range(0, len(relationships), INGEST_BATCH_ITEMS):
+        calls.append(('POST', '/api/network', {
+            'network_id': network_id, 'relationships': relationships[start:start + INGEST_BATCH_ITEMS]
+        }))
+    return calls
+
+
+def infer_payload(index, entities, relationships, sample=60):
+    rng = random.Random(index)
+    chosen = rng.sample(entities, min(sample, len(entities)))
+    names = {e['name'] for e in chosen}
+    return {
+        'entities': chosen,
+        'relationships': [r for r in relationships if r['source'] in names and r['target'] in names],
+        'text': ' '.join(f'{e["name"]} met {rng.choice(chosen)["name"]}.' for e in chosen),
+        'prefilter': True,
+        'top_k': 30
+    }
+
+
+def run_suite(target, args):
+    results = {}
+
+    def record(scenario, size_label, stats):
+        current, peak = target.memory()
+        stats['rss_mb'] = round(current, 1) if current is not None else None
+        stats['peak_rss_mb'] = round(peak, 1) if peak is not None else None
+        key = f'{target.name}/{scenario}/{size_label}'
+        results[key] = stats
+        print(
+            f'{key:<28} n={stats["requests"]:<6} first={stats["first_ms"]:>9.2f}ms p50={stats["p50_ms"]:>9.2f}ms p99={stats["p99_ms"]:>9.2f}ms '
+            f'{stats["requests_per_second"]:>9.2f} req/s  rss={stats["rss_mb"]}MB peak={stats["peak_rss_mb"]}MB'
+            + (f'  errors={stats["errors"]}' if stats['errors'] else ''),
+            flush=True
+        )
+
+    network_scenarios = [s for s in args.scenarios if s not in SIZE_INDEPENDENT]
+    for edges in (args.sizes if network_scenarios else ()):
+        label = format_size(edges)
+        network_id = f'bench-{label}'
+        entities, relationships = synthetic_network(edges, args.seed)
+
+        target.request('DELETE', f'/api/network/{network_id}')
+        stats = run_requests(target, ingest_calls(network_id, entities, relationships), 1)
+        if 'ingest' in args.scenarios:
+            stats['items_per_second'] = round((len(entities) + len(relationships)) / stats['seconds'], 1)
+            record('ingest', label, stats)
+        del entities, relationships
+
+        # Fewer repetitions for big networks keep the run time bounded
+        repeats = max(5, min(args.requests, 5000000 // max(edges, 1)))
+        for scenario, path in (('get', f'/api/network/{network_id}'),
+                               ('export', f'/api/network/{network_id}/export')):
+            if scenario in args.scenarios:
+                record(scenario, label, run_requests(target, [('GET', path, None)] * repeats, args.concurrency))
+
+        target.request('DELETE', f'/api/network/{network_id}')
+
+    if 'extract' in args.scenarios:
+        calls = [
+            ('POST', '/api/extract', {'text': synthetic_document(i, seed=args.seed), 'cache': False})
+            for i in range(args.requests)
+        ]
+        record('extract', '-', run_requests(target, calls, args.concurrency))
+
+    if 'infer' in args.scenarios:
+        entities, relationships = synthetic_network(INFER_SAMPLE_EDGES, args.seed)
+        calls = [('POST', '/api/infer', infer_payload(i, entities, relationships)) for i in range(args.requests)]
+        record('infer', '-', run_requests(target, calls, args.concurrency))
+
+    return results
+
+
+def machine_info():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def same_machine(machine, other):
+    """True if two machine_info() records describe the same benchmark machine"""
+    return all(machine.get(key) == other.get(key) for key in MACHINE_KEYS)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with the baseline
+
+    Metrics of results with fewer requests than MIN_SAMPLES or
+    MIN_THROUGHPUT_SAMPLES are not compared.
+
+    Returns:
+        (list of human-readable regressions, number of metrics compared)
+    """
+    regressions = []
+    checked = 0
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric, min_samples in MIN_SAMPLES.items():
+            if stats['requests'] < min_samples:
+                continue
+            checked += 1
+            limit = base[metric] * (1 + tolerance)
+            if stats[metric] > limit and stats[metric] - base[metric] > MIN_LATENCY_DELTA_MS:
+                regressions.append(f'{key} {metric}: {stats[metric]} > {base[metric]} (+{tolerance:.0%} allowed)')
+        if stats['requests'] < MIN_THROUGHPUT_SAMPLES:
+            continue
+        checked += 1
+        if stats['requests_per_second'] < base['requests_per_second'] * (1 - tolerance):
+            regressions.append(
+                f'{key} requests_per_second: {stats["requests_per_second"]} < '
+                f'{base["requests_per_second"]} (-{tolerance:.0%} allowed)'
+            )
+    return regressions, checked
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Silent Partners API with a fake model backend')
+    parser.add_argument('--mode', choices=('inprocess', 'gunicorn', 'both'), default='inprocess')
+    parser.add_argument('--sizes', default='1k,10k,100k', help='Network sizes in edges, e.g. 1k,10k,100k,1m')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=50, help='Requests per get/export/extract/infer scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--store', choices=('memory', 'sqlite'), default=None,
+                        help='Network store (default: memory in-process, sqlite under gunicorn)')
+    parser.add_argument('--fake-latency-ms', type=float, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--log-level', default='WARNING', help='Server LOG_LEVEL during the run')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before flagging a regression')
+
+    args = parser.parse_args(argv)
+    args.sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    args.scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='sp-bench-')
+
+    # Offline, deterministic and isolated from the developer's caches
+    env = {
+        'LLM_PROVIDER': 'fake',
+        'LLM_FAKE_LATENCY_MS': str(args.fake_latency_ms),
+        'LLM_FAKE_ERROR_RATE': '0',
+        'EXTRACTION_CACHE_DIR': '',
+        'EXTRACTION_MANIFEST_DIR': '',
+        'EXTRACTION_JOB_DB': os.path.join(workdir, 'jobs.db'),
+        'COALESCE_DIR': '',
+        'METRICS_DIR': os.path.join(workdir, 'metrics'),
+        'LOG_LEVEL': args.log_level
+    }
+
+    modes = ('inprocess', 'gunicorn') if args.mode == 'both' else (args.mode,)
+    results = {}
+    try:
+        for mode in modes:
+            store = args.store or ('memory' if mode == 'inprocess' else 'sqlite')
+            mode_env = {**env, 'NETWORK_STORE': store, 'NETWORK_DB_PATH': os.path.join(workdir, f'{mode}.db')}
+            print(f'== {mode} ({store} store, fake model {args.fake_latency_ms:g} ms) ==', flush=True)
+            if mode == 'inprocess':
+                os.environ.update(mode_env)
+                target = InProcessTarget()
+            else:
+                target = GunicornTarget(args.workers, mode_env, os.path.join(workdir, 'gunicorn.log'))
+            try:
+                results.update(run_suite(target, args))
+            finally:
+                target.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'machine': machine_info(),
+        'settings': {
+            'concurrency': args.concurrency, 'requests': args.requests, 'workers': args.workers,
+            'fake_latency_ms': args.fake_latency_ms, 'seed': args.seed
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        if not same_machine(report['machine'], baseline.get('machine', {})):
+            # Results from another machine must not be mixed with these
+            baseline = {}
+        baseline.update({key: value for key, value in report.items() if key != 'results'})
+        baseline['results'] = {**baseline.get('results', {}), **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare against (run with --save-baseline)')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if not same_machine(report['machine'], baseline.get('machine', {})):
+        recorded = {key: baseline.get('machine', {}).get(key) for key in MACHINE_KEYS}
+        current = {key: report['machine'][key] for key in MACHINE_KEYS}
+        print(f'\nBaseline {args.baseline} was recorded on another machine ({recorded}, this is {current}); '
+              f'not comparing. Re-record it here with --save-baseline')
+        return 2
+    regressions, checked = compare(results, baseline.get('results', {}), args.tolerance)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) against {args.baseline}:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    if not checked:
+        print(f'\nNothing compared against {args.baseline}: no result is in the baseline with enough requests '
+              f'(p50 needs {MIN_SAMPLES["p50_ms"]}, '
+              f'throughput {MIN_THROUGHPUT_SAMPLES}, p99 {MIN_SAMPLES["p99_ms"]})')
+        return 0
+    print(f'\nNo regressions against {args.baseline} ({checked} metrics compared)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
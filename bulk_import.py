@@ -0,0 +1,225 @@
+"""
+Bulk Import
+Streaming ingestion of very large networks from NDJSON or CSV
+
+The request body is read line by line and never held in memory as a
+whole. Each line is parsed and validated on its own, valid items are
+committed to the store in batches (one add_data transaction each), and
+problems are reported per line with their line number. Progress is
+reported after every batch.
+
+Formats:
+    - NDJSON: one JSON object per line, either an entity ({"name": ...})
+      or a relationship ({"source": ..., "target": ...}); an optional
+      "kind": "entity" | "relationship" field makes this explicit
+    - CSV: a header row followed by one item per row; a header with
+      source and target columns is an edge list, one with a name column
+      a node list
+
+Relationships can only refer to entities committed in the same or an
+earlier batch, so entities should be listed before relationships.
+"""
+
+import csv
+import io
+import json
+import logging
+
+from network_store import ENTITY_COLUMNS, RELATIONSHIP_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMPORT_BATCH_SIZE = 5000
+
+# Per-line errors kept in the summary; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+READ_BUFFER_BYTES = 64 * 1024
+
+
+def text_lines(stream):
+    """Decode a binary stream into text lines without reading it whole"""
+    return io.TextIOWrapper(
+        io.BufferedReader(stream, READ_BUFFER_BYTES), encoding='utf-8', errors='replace', newline=''
+    )
+
+
+def _validate(kind, item):
+    """Return an error message for an item of kind, or None if it can be stored"""
+    if kind == 'entity':
+        if not isinstance(item.get('name'), str) or not item['name'].strip():
+            return 'entity needs a non-empty name'
+        importance = item.get('importance')
+        if importance is not None and (isinstance(importance, bool) or not isinstance(importance, int)):
+            return 'importance must be an integer'
+        return None
+
+    for field in ('source', 'target'):
+        if not isinstance(item.get(field), str) or not item[field].strip():
+            return f'relationship needs a non-empty {field}'
+    return None
+
+
+def iter_ndjson_records(lines):
+    """
+    Parse NDJSON lines into records
+
+    Yields:
+        (line number, kind, item) for valid items and
+        (line number, None, error message) for invalid lines
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'invalid JSON: {e}'
+            continue
+        if not isinstance(item, dict):
+            yield line_number, None, 'line is not a JSON object'
+            continue
+
+        kind = item.pop('kind', None)
+        if kind is None:
+            kind = 'relationship' if 'source' in item or 'target' in item else 'entity'
+        if kind not in ('entity', 'relationship'):
+            yield line_number, None, f'unknown kind: {kind}'
+            continue
+
+        error = _validate(kind, item)
+        if error:
+            yield line_number, None, error
+        else:
+            yield line_number, kind, item
+
+
+def iter_csv_records(lines):
+    """
+    Parse a CSV node or edge list into records
+
+    Yields:
+        the same (line number, kind, item or error) tuples as iter_ndjson_records
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.strip().lower() for column in header]
+    if 'source' in header and 'target' in header:
+        kind, columns = 'relationship', RELATIONSHIP_COLUMNS
+    elif 'name' in header:
+        kind, columns = 'entity', ENTITY_COLUMNS
+    else:
+        yield 1, None, 'header needs a name column (nodes) or source and target columns (edges)'
+        return
+
+    # Unknown columns are ignored
+    fields = [(position, column) for position, column in enumerate(header) if column in columns]
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        item = {
+            column: row[position].strip() for position, column in fields
+            if position < len(row) and row[position].strip()
+        }
+        if 'importance' in item:
+            try:
+                item['importance'] = int(item['importance'])
+            except ValueError:
+                yield reader.line_num, None, 'importance must be an integer'
+                continue
+
+        error = _validate(kind, item)
+        if error:
+            yield reader.line_num, None, error
+        else:
+            yield reader.line_num, kind, item
+
+
+def import_records(store, network_id, records, batch_size=DEFAULT_IMPORT_BATCH_SIZE):
+    """
+    Commit records to a network in batches
+
+    Yields:
+        ('progress', stats) after every committed batch, ('line_error',
+        {'line', 'error'}) for each of the first MAX_REPORTED_ERRORS
+        problems, and finally ('done', summary)
+    """
+    stats = {
+        'lines': 0,
+        'batches': 0,
+        'received': {'entities': 0, 'relationships': 0},
+        'added': {'entities': 0, 'relationships': 0},
+        'duplicates': 0,
+        'error_count': 0,
+        'version': None,
+        'total': None
+    }
+    errors = []
+
+    def snapshot():
+        return {**stats, 'received': dict(stats['received']), 'added': dict(stats['added'])}
+
+    def report(line_number, message):
+        stats['error_count'] += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            error = {'line': line_number, 'error': message}
+            errors.append(error)
+            return error
+        return None
+
+    def commit(entities, relationships):
+        rejected = []
+        result = store.add_data(
+            network_id, [item for _, item in entities], [item for _, item in relationships], rejected
+        )
+        stats['batches'] += 1
+        stats['added']['entities'] += result['added']['entities']
+        stats['added']['relationships'] += result['added']['relationships']
+        added = result['added']['entities'] + result['added']['relationships']
+        stats['duplicates'] += len(entities) + len(relationships) - len(rejected) - added
+        stats['version'] = result['version']
+        stats['total'] = result['total']
+
+        reported = []
+        for kind, position, reason in rejected:
+            line_number = (entities if kind == 'entity' else relationships)[position][0]
+            error = report(line_number, reason)
+            if error:
+                reported.append(error)
+        return reported
+
+    entities, relationships = [], []
+    for line_number, kind, item in records:
+        stats['lines'] = line_number
+        if kind is None:
+            error = report(line_number, item)
+            if error:
+                yield 'line_error', error
+            continue
+
+        if kind == 'entity':
+            entities.append((line_number, item))
+            stats['received']['entities'] += 1
+        else:
+            relationships.append((line_number, item))
+            stats['received']['relationships'] += 1
+
+        if len(entities) + len(relationships) >= batch_size:
+            for error in commit(entities, relationships):
+                yield 'line_error', error
+            entities, relationships = [], []
+            yield 'progress', snapshot()
+
+    if entities or relationships or stats['batches'] == 0:
+        for error in commit(entities, relationships):
+            yield 'line_error', error
+        yield 'progress', snapshot()
+
+    logger.info(
+        f'Imported into {network_id}: {stats["added"]["entities"]} entities, '
+        f'{stats["added"]["relationships"]} relationships from {stats["lines"]} lines '
+        f'({stats["error_count"]} errors)'
+    )
+    yield 'done', {**snapshot(), 'errors': sorted(errors, key=lambda error: error['line'])}
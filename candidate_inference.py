@@ -0,0 +1,231 @@
+"""
+Candidate Inference
+Pre-filtered relationship inference for large networks
+
+Instead of sending every entity, every relationship and the first 2000
+characters of the source text in one prompt, candidate pairs are ranked
+server-side with link-prediction heuristics (common neighbours,
+Adamic-Adar, transitive paths, co-mention) and only the top-K are sent
+to the model, together with the entities, relationships and document
+sentences relevant to them, in batches sized to a token budget.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_extraction import estimate_tokens
+from graph_analysis import Graph, rank_link_candidates
+from mention_index import MentionIndex
+from network_store import name_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 50
+DEFAULT_BATCH_TOKENS = 3000
+
+
+def resolve_entity_references(entities, relationships):
+    """Rewrite relationship endpoints given as entity ids into entity names"""
+    names = {str(e['id']): e['name'] for e in entities if 'id' in e}
+    return [
+        {
+            **rel,
+            'source': names.get(str(rel['source']), rel['source']),
+            'target': names.get(str(rel['target']), rel['target'])
+        }
+        for rel in relationships
+        if 'source' in rel and 'target' in rel
+    ]
+
+
+def _describe_candidate(number, candidate):
+    signals = []
+    if candidate['shared_with']:
+        signals.append(f'shared connections: {", ".join(candidate["shared_with"])}')
+    if candidate['transitive_paths']:
+        signals.append(f'transitive paths: {candidate["transitive_paths"]}')
+    if candidate['co_occurrences']:
+        signals.append(f'mentioned together in {candidate["co_occurrences"]} sentences')
+    detail = f' ({"; ".join(signals)})' if signals else ''
+    return f'{number}. {candidate["source"]} — {candidate["target"]}{detail}'
+
+
+def build_candidate_prompt(entities, relationships, candidates, excerpts):
+    """Build an inference prompt restricted to a batch of candidate pairs"""
+    entity_summary = "\n".join([
+        f"- {e['name']} ({e.get('type', 'unknown')}): {e.get('description') or 'No description'}"
+        for e in entities
+    ])
+    rel_summary = "\n".join([
+        f"- {r['source']} → {r['target']}: {r.get('type', 'unknown')}"
+        for r in relationships
+    ]) or "- None"
+    candidate_summary = "\n".join(
+        _describe_candidate(number, candidate) for number, candidate in enumerate(candidates, 1)
+    )
+    excerpt_summary = "\n".join(f"- {excerpt}" for excerpt in excerpts) or "- None"
+
+    return f"""The entity pairs below were flagged by graph analysis as likely to have a MISSING relationship. For each pair, decide whether a relationship is likely, using the entities, their known relationships and the document excerpts.
+
+ENTITIES:
+{entity_summary}
+
+KNOWN RELATIONSHIPS:
+{rel_summary}
+
+CANDIDATE PAIRS:
+{candidate_summary}
+
+RELEVANT EXCERPTS FROM THE SOURCE TEXT:
+{excerpt_summary}
+
+Return a JSON object containing only the pairs you judge likely to be related:
+{{
+  "inferred_relationships": [
+    {{
+      "source": "entity name",
+      "target": "entity name",
+      "type": "relationship_type",
+      "description": "Why this relationship is inferred",
+      "confidence": 0.0-1.0,
+      "evidence": "Evidence from text or logical inference"
+    }}
+  ]
+}}
+
+Return ONLY the JSON object."""
+
+
+def _added_tokens(graph, batch, line, nodes, excerpts):
+    """Estimated prompt tokens a candidate adds to a batch"""
+    new_nodes = nodes - batch['nodes']
+    members = batch['nodes'] | nodes
+    tokens = estimate_tokens(line)
+    tokens += sum(
+        estimate_tokens(f"{graph.name(n)} {graph.entities[n].get('description') or ''}")
+        for n in new_nodes
+    )
+    # Relationship lines between the new entities and the rest of the batch
+    tokens += sum(
+        estimate_tokens(f"{graph.name(n)} {graph.name(m)} {graph.edge_types.get((n, m))}")
+        for n in new_nodes for m in graph.successors[n] & members
+    )
+    tokens += sum(
+        estimate_tokens(f"{graph.name(m)} {graph.name(n)} {graph.edge_types.get((m, n))}")
+        for n in new_nodes for m in graph.predecessors[n] & batch['nodes']
+    )
+    tokens += sum(estimate_tokens(e) for e in excerpts if e not in batch['excerpts'])
+    return tokens
+
+
+def pack_candidate_batches(graph, candidates, mention_index=None, token_budget=DEFAULT_BATCH_TOKENS):
+    """
+    Split ranked candidates into batches whose prompt material fits token_budget
+
+    Candidates keep their rank order. A candidate's cost is its own line
+    plus the entities, relationships and excerpts it adds to the batch,
+    so candidates sharing entities or sentences pack more densely.
+
+    Returns:
+        list of dicts with candidates, entities, relationships and excerpts
+    """
+    def new_batch():
+        return {'candidates': [], 'nodes': set(), 'excerpts': [], 'tokens': 0}
+
+    batches = [new_batch()]
+
+    for number, candidate in enumerate(candidates, 1):
+        nodes = {
+            graph.index[name_key(name)]
+            for name in (candidate['source'], candidate['target'], *candidate['shared_with'])
+        }
+        excerpts = []
+        if mention_index is not None:
+            excerpts = mention_index.excerpts_for_pairs([(candidate['source'], candidate['target'])])
+
+        line = _describe_candidate(number, candidate)
+        batch = batches[-1]
+        tokens = _added_tokens(graph, batch, line, nodes, excerpts)
+        if batch['candidates'] and batch['tokens'] + tokens > token_budget:
+            batch = new_batch()
+            batches.append(batch)
+            tokens = _added_tokens(graph, batch, line, nodes, excerpts)
+
+        batch['candidates'].append(candidate)
+        batch['nodes'].update(nodes)
+        batch['excerpts'].extend(e for e in excerpts if e not in batch['excerpts'])
+        batch['tokens'] += tokens
+
+    batches = [batch for batch in batches if batch['candidates']]
+    for batch in batches:
+        nodes = sorted(batch.pop('nodes'))
+        members = set(nodes)
+        batch['entities'] = [graph.entities[n] for n in nodes]
+        batch['relationships'] = [
+            {'source': graph.name(a), 'target': graph.name(b), 'type': graph.edge_types.get((a, b))}
+            for a in nodes for b in sorted(graph.successors[a] & members)
+        ]
+
+    return batches
+
+
+def infer_from_candidates(entities, relationships, original_text, complete_fn,
+                          top_k=DEFAULT_TOP_K, token_budget=DEFAULT_BATCH_TOKENS,
+                          max_workers=4, mention_index=None):
+    """
+    Rank candidate pairs, then ask the model about the top-K in token-bounded batches
+
+    Args:
+        complete_fn: Callable taking a prompt and returning (result, tokens)
+        mention_index: MentionIndex of original_text for these entities,
+            e.g. from a shared cache; built here when omitted
+
+    Returns:
+        dict with inferred_relationships, candidates and metadata
+    """
+    started = time.perf_counter()
+    relationships = resolve_entity_references(entities, relationships)
+    graph = Graph(entities, relationships)
+
+    if mention_index is None and original_text:
+        mention_index = MentionIndex(graph.entities, original_text)
+
+    candidates = rank_link_candidates(graph, top_k=top_k, mention_index=mention_index)
+    batches = pack_candidate_batches(graph, candidates, mention_index, token_budget)
+    ranking_seconds = time.perf_counter() - started
+
+    def run(batch):
+        prompt = build_candidate_prompt(
+            batch['entities'], batch['relationships'], batch['candidates'], batch['excerpts']
+        )
+        return complete_fn(prompt)
+
+    inferred = []
+    tokens_used = 0
+    if batches:
+        workers = max(1, min(max_workers, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='infer-batch') as executor:
+            for result, tokens in executor.map(run, batches):
+                inferred.extend(result.get('inferred_relationships', []))
+                tokens_used += tokens
+
+    seconds = time.perf_counter() - started
+    logger.info(
+        f'Pre-filtered inference: {len(candidates)} candidates in {len(batches)} batches, '
+        f'{len(inferred)} inferred, {tokens_used} tokens'
+    )
+
+    return {
+        'inferred_relationships': inferred,
+        'candidates': candidates,
+        'metadata': {
+            'mode': 'prefiltered',
+            'candidates_considered': len(candidates),
+            'batches': len(batches),
+            'tokens_used': tokens_used,
+            'tokens_per_inferred': round(tokens_used / len(inferred), 1) if inferred else None,
+            'ranking_seconds': round(ranking_seconds, 4),
+            'seconds': round(seconds, 3)
+        }
+    }
@@ -0,0 +1,277 @@
+"""
+Chunked Extraction
+Map/reduce extraction for documents too long for a single prompt
+
+The text is split into overlapping chunks on paragraph and sentence
+boundaries, each chunk is extracted concurrently on a bounded thread
+pool, and the per-chunk graphs are merged into one network with
+entities deduplicated by normalized name.
+"""
+
+import hashlib
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_CHARS = 12000
+DEFAULT_OVERLAP_CHARS = 600
+
+# A paragraph ends a content-defined chunk when its hash is divisible by this
+CONTENT_BOUNDARY_DIVISOR = 4
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
+
+
+def _split_units(text, start, end, max_chars):
+    """Yield (start, end) spans of paragraphs, split into sentences when too long"""
+    if end - start <= max_chars:
+        yield (start, end)
+        return
+
+    sentence_start = start
+    for match in SENTENCE_END.finditer(text, start, end):
+        yield from _hard_split(sentence_start, match.end(), max_chars)
+        sentence_start = match.end()
+    if sentence_start < end:
+        yield from _hard_split(sentence_start, end, max_chars)
+
+
+def _hard_split(start, end, max_chars):
+    """Split an unbroken run of text (e.g. a table) at fixed offsets"""
+    for offset in range(start, end, max_chars):
+        yield (offset, min(offset + max_chars, end))
+
+
+def _paragraph_units(text, max_chars):
+    """(start, end) spans of non-empty paragraphs, split further when longer than max_chars"""
+    units = []
+    paragraph_start = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        if text[paragraph_start:match.start()].strip():
+            units.extend(_split_units(text, paragraph_start, match.start(), max_chars))
+        paragraph_start = match.end()
+    if text[paragraph_start:].strip():
+        units.extend(_split_units(text, paragraph_start, len(text), max_chars))
+    return units
+
+
+def split_into_chunks(text, max_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_OVERLAP_CHARS):
+    """
+    Split text into overlapping chunks on paragraph/sentence boundaries
+
+    Args:
+        text: Document text
+        max_chars: Target maximum chunk size (excluding overlap)
+        overlap_chars: Trailing context from the previous chunk to repeat
+            so relationships spanning a boundary are still seen together
+
+    Returns:
+        list of dicts with index, start, end and text
+    """
+    units = _paragraph_units(text, max_chars)
+
+    # Pack units greedily into chunks
+    spans = []
+    chunk_start = chunk_end = None
+    for unit_start, unit_end in units:
+        if chunk_start is not None and unit_end - chunk_start > max_chars:
+            spans.append((chunk_start, chunk_end))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = unit_start
+        chunk_end = unit_end
+    if chunk_start is not None:
+        spans.append((chunk_start, chunk_end))
+
+    chunks = []
+    for index, (start, end) in enumerate(spans):
+        if index > 0 and overlap_chars > 0:
+            # Start the overlap on a sentence boundary where possible
+            overlap_start = max(spans[index - 1][0], start - overlap_chars)
+            match = SENTENCE_END.search(text, overlap_start, start)
+            start = match.end() if match else overlap_start
+        chunks.append({
+            'index': index,
+            'start': start,
+            'end': end,
+            'text': text[start:end]
+        })
+
+    return chunks
+
+
+def split_into_content_chunks(text, max_chars=DEFAULT_CHUNK_CHARS, min_chars=None,
+                              boundary_divisor=CONTENT_BOUNDARY_DIVISOR):
+    """
+    Split text into chunks whose boundaries depend only on nearby content
+
+    split_into_chunks packs greedily from the start of the document, so
+    an edit near the top shifts every later boundary. Here a chunk ends
+    after a paragraph whose normalized text hashes to a multiple of
+    boundary_divisor (once the chunk holds min_chars), or before it
+    would exceed max_chars. Editing one paragraph therefore changes
+    only the chunks around it; boundaries resynchronise at the next
+    boundary paragraph. Chunks do not overlap, so unchanged chunks keep
+    identical text.
+
+    Returns:
+        list of dicts with index, start, end and text
+    """
+    if min_chars is None:
+        min_chars = max_chars // 4
+
+    spans = []
+    chunk_start = chunk_end = None
+    for unit_start, unit_end in _paragraph_units(text, max_chars):
+        if chunk_start is not None and unit_end - chunk_start > max_chars:
+            spans.append((chunk_start, chunk_end))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = unit_start
+        chunk_end = unit_end
+
+        unit_text = ' '.join(text[unit_start:unit_end].split())
+        digest = hashlib.blake2b(unit_text.encode('utf-8'), digest_size=8).digest()
+        if chunk_end - chunk_start >= min_chars and int.from_bytes(digest, 'big') % boundary_divisor == 0:
+            spans.append((chunk_start, chunk_end))
+            chunk_start = None
+    if chunk_start is not None:
+        spans.append((chunk_start, chunk_end))
+
+    return [
+        {'index': index, 'start': start, 'end': end, 'text': text[start:end]}
+        for index, (start, end) in enumerate(spans)
+    ]
+
+
+def normalize_entity_name(name):
+    """Normalize an entity name for cross-chunk deduplication"""
+    return ' '.join(str(name).split()).casefold()
+
+
+def merge_extractions(results):
+    """
+    Merge per-chunk extraction results into a single graph
+
+    Entities are deduplicated by normalized name and given fresh ids;
+    relationship endpoints (chunk-local ids or names) are remapped to
+    the merged ids and duplicate relationships are dropped.
+
+    Args:
+        results: list of extraction result dicts, in chunk order
+
+    Returns:
+        dict with entities and relationships
+    """
+    entities = []
+    entities_by_name = {}
+    relationships = []
+    seen_relationships = set()
+
+    for result in results:
+        local_ids = {}
+
+        for entity in result.get('entities', []):
+            if not isinstance(entity, dict) or not entity.get('name'):
+                continue
+
+            key = normalize_entity_name(entity['name'])
+            merged = entities_by_name.get(key)
+            if merged is None:
+                merged = {**entity, 'id': f'e{len(entities) + 1}'}
+                entities.append(merged)
+                entities_by_name[key] = merged
+            else:
+                # Keep the strongest importance and the most detailed description
+                if (entity.get('importance') or 0) > (merged.get('importance') or 0):
+                    merged['importance'] = entity['importance']
+                if len(entity.get('description') or '') > len(merged.get('description') or ''):
+                    merged['description'] = entity['description']
+
+            if 'id' in entity:
+                local_ids[str(entity['id'])] = merged['id']
+            local_ids[key] = merged['id']
+
+        for rel in result.get('relationships', []):
+            if not isinstance(rel, dict):
+                continue
+
+            source = local_ids.get(str(rel.get('source'))) or local_ids.get(normalize_entity_name(rel.get('source', '')))
+            target = local_ids.get(str(rel.get('target'))) or local_ids.get(normalize_entity_name(rel.get('target', '')))
+            if not source or not target or source == target:
+                continue
+
+            key = (source, target, rel.get('type'))
+            if key in seen_relationships:
+                continue
+            seen_relationships.add(key)
+            relationships.append({**rel, 'source': source, 'target': target})
+
+    return {'entities': entities, 'relationships': relationships}
+
+
+def extract_chunked(text, extract_fn, max_workers=4,
+                    max_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_OVERLAP_CHARS,
+                    chunks=None):
+    """
+    Run extract_fn over the chunks of text concurrently and merge the results
+
+    Args:
+        text: Document text
+        extract_fn: Callable taking chunk text and returning an extraction
+            result dict with a 'metadata' entry
+        max_workers: Maximum concurrent chunk extractions
+        chunks: Precomputed chunks (default: split_into_chunks(text))
+
+    Returns:
+        merged result dict with per-chunk timings in metadata
+    """
+    if chunks is None:
+        chunks = split_into_chunks(text, max_chars, overlap_chars)
+    started = time.perf_counter()
+
+    def run(chunk):
+        chunk_started = time.perf_counter()
+        result = extract_fn(chunk['text'])
+        return result, time.perf_counter() - chunk_started
+
+    workers = max(1, min(max_workers, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extract-chunk') as executor:
+        outcomes = list(executor.map(run, chunks))
+
+    results = [result for result, _ in outcomes]
+    merge_started = time.perf_counter()
+    merged = merge_extractions(results)
+    merge_seconds = time.perf_counter() - merge_started
+
+    chunk_metadata = []
+    for chunk, (result, seconds) in zip(chunks, outcomes):
+        metadata = result.get('metadata', {})
+        chunk_metadata.append({
+            'index': chunk['index'],
+            'start': chunk['start'],
+            'end': chunk['end'],
+            'seconds': round(seconds, 3),
+            'tokens_used': metadata.get('tokens_used', 0),
+            'cached': metadata.get('cached', False),
+            'entities': len(result.get('entities', [])),
+            'relationships': len(result.get('relationships', []))
+        })
+
+    wall_seconds = time.perf_counter() - started
+    logger.info(f'Chunked extraction: {len(chunks)} chunks on {workers} workers in {wall_seconds:.2f}s')
+
+    merged['metadata'] = {
+        'mode': 'chunked',
+        'chunk_count': len(chunks),
+        'concurrency': workers,
+        'wall_seconds': round(wall_seconds, 3),
+        'merge_seconds': round(merge_seconds, 6),
+        'tokens_used': sum(c['tokens_used'] for c in chunk_metadata),
+        'chunks': chunk_metadata
+    }
+    return merged
@@ -0,0 +1,538 @@
+"""
+Entity Resolution
+Fuzzy merging of near-duplicate entities such as "Jho Low" / "Low Taek Jho"
+
+Names are reduced to tokens (casefolded, accents and punctuation removed,
+honorifics and legal suffixes dropped) and filed under a few blocking
+keys: each token, the sorted token set, Soundex codes of token pairs
+and acronyms. Only names that share a block are ever compared, so the
+work grows with the block sizes rather than with the square of the
+number of entities; blocks larger than max_block_size (e.g. a very
+common first name) are skipped for pairing.
+
+Within a block, pairs are scored by:
+    - identical token sets (word order ignored): 1.0
+    - one name's tokens contained in the other's (at least two tokens),
+      or one name being the acronym of the other: CONTAINMENT_SCORE
+    - otherwise the difflib ratio of the sorted token strings
+
+Entities are only merged when their types are compatible (see
+TYPE_GROUPS; a missing type matches anything) and their names contain
+the same numbers.
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import combinations
+
+from network_store import name_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_MAX_BLOCK_SIZE = 100
+
+# Score of token containment ("Jho Low" in "Low Taek Jho") and acronyms ("1MDB")
+CONTAINMENT_SCORE = 0.9
+
+# How far the bigram overlap of two names may fall below the threshold
+# before the exact edit-distance ratio is skipped
+BIGRAM_SLACK = 0.2
+
+# Shorter acronyms ("JL", "AB") are too ambiguous to match on
+MIN_ACRONYM_LENGTH = 3
+
+# Names with more tokens than this get no token-pair phonetic keys
+MAX_PAIR_KEY_TOKENS = 4
+
+TOKEN = re.compile(r'[^\W_]+')
+DIGIT_LETTER = re.compile(r'\d+|[^\W\d_]+')
+DIGITS = re.compile(r'\d+')
+
+HONORIFICS = {'mr', 'mrs', 'ms', 'miss', 'dr', 'prof', 'sir', 'dame', 'lord', 'lady', 'hon', 'jr', 'sr'}
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'ltd', 'limited', 'llc', 'llp', 'lp', 'corp', 'corporation', 'co', 'company',
+    'plc', 'sa', 'ag', 'gmbh', 'bv', 'nv', 'bhd', 'sdn', 'pte', 'group', 'holdings'
+}
+CONNECTORS = {'the', 'of', 'and', 'for', 'de', 'la', 'le', 'du', 'van', 'von', 'al', 'bin', 'binti'}
+
+# Model-assigned types that describe the same kind of entity
+TYPE_GROUPS = {
+    'organization': 'organization', 'corporation': 'organization', 'company': 'organization',
+    'bank': 'organization', 'fund': 'organization', 'agency': 'organization',
+    'government': 'organization', 'institution': 'organization',
+    'location': 'location', 'country': 'location', 'city': 'location', 'place': 'location'
+}
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+    'l': '4', **dict.fromkeys('mn', '5'), 'r': '6'
+}
+
+
+def name_tokens(name):
+    """Comparable tokens of an entity name"""
+    folded = str(name).casefold()
+    if not folded.isascii():
+        folded = ''.join(
+            char for char in unicodedata.normalize('NFKD', folded) if not unicodedata.combining(char)
+        )
+    tokens = [token for token in TOKEN.findall(folded.replace("'", '')) if token not in HONORIFICS]
+    # Keep a bare "Company" or "Group" rather than dropping the whole name
+    stripped = [token for token in tokens if token not in LEGAL_SUFFIXES]
+    return tuple(stripped or tokens)
+
+
+@lru_cache(maxsize=65536)
+def soundex(token):
+    """American Soundex code of a token (e.g. 'leissner' -> 'L256')"""
+    if not token.isalpha():
+        return token
+    code = token[0].upper()
+    previous = _SOUNDEX_CODES.get(token[0])
+    for char in token[1:]:
+        digit = _SOUNDEX_CODES.get(char)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def type_group(entity_type):
+    if not entity_type:
+        return None
+    entity_type = str(entity_type).casefold()
+    return TYPE_GROUPS.get(entity_type, entity_type)
+
+
+class ResolvedName:
+    """
+    An entity name prepared for blocking and scoring
+
+    The token set, bigrams and acronyms are derived on first use: most
+    indexed names are never scored, and fewer live containers keep
+    garbage collection pauses short on large networks.
+    """
+
+    __slots__ = ('name', 'canonical', 'group', 'tokens', 'text', 'numbers', '_token_set', '_bigrams', '_acronyms', '_keys')
+
+    def __init__(self, name, entity_type=None, canonical=None):
+        self.name = name
+        self.canonical = canonical or name
+        self.group = type_group(entity_type)
+        self.tokens = name_tokens(name)
+        self.text = ' '.join(sorted(self.tokens))
+        self.numbers = tuple(sorted(DIGITS.findall(self.text)))
+        self._token_set = self._bigrams = self._acronyms = self._keys = None
+
+    @property
+    def token_set(self):
+        if self._token_set is None:
+            self._token_set = frozenset(self.tokens)
+        return self._token_set
+
+    @property
+    def bigrams(self):
+        if self._bigrams is None:
+            self._bigrams = frozenset(map(str.__add__, self.text, self.text[1:]))
+        return self._bigrams
+
+    @property
+    def acronyms(self):
+        if self._acronyms is None:
+            if len(self.tokens) == 1:
+                self._acronyms = {self.tokens[0]} if MIN_ACRONYM_LENGTH <= len(self.tokens[0]) <= 6 else set()
+            else:
+                parts = self.tokens if ''.join(self.tokens).isalpha() else DIGIT_LETTER.findall(' '.join(self.tokens))
+                self._acronyms = {
+                    ''.join(part[0] for part in parts),
+                    ''.join(part[0] for part in parts if part not in CONNECTORS)
+                }
+        return self._acronyms
+
+    def blocking_keys(self):
+        if self._keys is None:
+            self._keys = self._blocking_keys()
+        return self._keys
+
+    def _blocking_keys(self):
+        if not self.tokens:
+            return set()
+        # Names with different numbers never match, so they need not share a block
+        suffix = '#' + ','.join(self.numbers) if self.numbers else ''
+        keys = {f'k:{self.text}{suffix}'}
+        codes = set()
+        for token in self.tokens:
+            if len(token) > 1 and token not in CONNECTORS:
+                keys.add(f't:{token}{suffix}')
+                if len(token) > 2:
+                    codes.add(soundex(token))
+        for acronym in self.acronyms:
+            if len(acronym) >= MIN_ACRONYM_LENGTH:
+                keys.add(f'a:{acronym}{suffix}')
+        if len(codes) == 1:
+            keys.add(f'p:{codes.pop()}{suffix}')
+        elif len(codes) <= MAX_PAIR_KEY_TOKENS:
+            keys.update(f'p:{a}|{b}{suffix}' for a, b in combinations(sorted(codes), 2))
+        return keys
+
+    def compatible(self, other):
+        return self.group is None or other.group is None or self.group == other.group
+
+
+def similarity(a, b, threshold=0.0):
+    """
+    Score two ResolvedNames in [0, 1]
+
+    Scores that cannot reach threshold may be returned as 0.0 without
+    running the edit-distance comparison.
+    """
+    if a.text == b.text:
+        return 1.0
+    # "Entity 12" and "Entity 13" are different entities however similar
+    if a.numbers != b.numbers:
+        return 0.0
+
+    smaller = min(len(a.token_set), len(b.token_set))
+    if smaller >= 2 and len(a.token_set & b.token_set) == smaller:
+        return CONTAINMENT_SCORE
+    if smaller == 1 and a.acronyms & b.acronyms and len(a.token_set) != len(b.token_set):
+        return CONTAINMENT_SCORE
+
+    # ratio() is at most 2 * min(len) / (len(a) + len(b)); bigram overlap
+    # is a cheap screen that rejects most unrelated pairs
+    length_a, length_b = len(a.text), len(b.text)
+    if 2 * min(length_a, length_b) < threshold * (length_a + length_b):
+        return 0.0
+    if 2 * len(a.bigrams & b.bigrams) < (threshold - BIGRAM_SLACK) * (len(a.bigrams) + len(b.bigrams)):
+        return 0.0
+    return SequenceMatcher(None, a.text, b.text, autojunk=False).ratio()
+
+
+class ResolutionIndex:
+    """
+    Blocking index over the entity names (and aliases) of one network
+
+    Args:
+        max_block_size: Blocks with more names than this are not used for
+            matching
+    """
+
+    def __init__(self, max_block_size=DEFAULT_MAX_BLOCK_SIZE):
+        self.max_block_size = max_block_size
+        self.names = []
+        # Most blocks hold a single name, stored as a bare position rather than a list
+        self.blocks = {}
+        self.known = {}
+
+    def add(self, entry):
+        """Index a ResolvedName (an alias carries the entity it stands for as canonical)"""
+        key = name_key(entry.name)
+        if key in self.known:
+            return
+        self.known[key] = entry.canonical
+        position = len(self.names)
+        self.names.append(entry)
+        blocks = self.blocks
+        for block_key in entry.blocking_keys():
+            block = blocks.get(block_key)
+            if block is None:
+                blocks[block_key] = position
+            elif type(block) is int:
+                blocks[block_key] = [block, position]
+            else:
+                block.append(position)
+
+    def canonical(self, name):
+        """The stored entity an exact name or alias refers to, or None"""
+        return self.known.get(name_key(name))
+
+    def match(self, entry, threshold=DEFAULT_THRESHOLD):
+        """
+        Find the best indexed name for an unseen ResolvedName
+
+        Returns:
+            (canonical name, score), or None below threshold
+        """
+        best = None
+        seen = set()
+        for block_key in entry.blocking_keys():
+            block = self.blocks.get(block_key)
+            if block is None:
+                continue
+            if type(block) is int:
+                block = (block,)
+            elif len(block) > self.max_block_size:
+                continue
+            for position in block:
+                if position in seen:
+                    continue
+                seen.add(position)
+                candidate = self.names[position]
+                if not entry.compatible(candidate):
+                    continue
+                score = similarity(entry, candidate, threshold)
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (candidate.canonical, score)
+        return best
+
+
+def resolve_incoming(index, entities, threshold=DEFAULT_THRESHOLD):
+    """
+    Map incoming entities onto near-duplicates already in index
+
+    New entities that match each other are resolved onto the first of
+    them. index itself is not modified.
+
+    Returns:
+        ({incoming name: (canonical name, score)} for the entities to merge,
+        {name key: ResolvedName} for the new entities that matched nothing)
+    """
+    batch = ResolutionIndex(index.max_block_size)
+    resolved = {}
+    for entity in entities:
+        if not isinstance(entity, dict) or not isinstance(entity.get('name'), str):
+            continue
+        name = entity['name']
+        if index.canonical(name) is not None or batch.canonical(name) is not None:
+            continue
+        entry = ResolvedName(name, entity.get('type'))
+        matches = [match for match in (index.match(entry, threshold), batch.match(entry, threshold)) if match]
+        if matches:
+            resolved[name] = max(matches, key=lambda match: match[1])
+        else:
+            batch.add(entry)
+    return resolved, {name_key(entry.name): entry for entry in batch.names}
+
+
+def find_duplicates(entities, relationships=(), threshold=DEFAULT_THRESHOLD,
+                    max_block_size=DEFAULT_MAX_BLOCK_SIZE, merge_above=None):
+    """
+    Group the near-duplicate entities of a whole network
+
+    The entity with the most relationships (then the highest importance,
+    then the earliest) becomes the canonical name of its group.
+
+    Args:
+        merge_above: Pairs scoring at least threshold but no more than
+            this are not grouped and are returned as suggestions instead
+            (CONTAINMENT_SCORE keeps "Goldman Sachs Asia" apart from
+            "Goldman Sachs"); None groups every pair
+
+    Returns:
+        (clusters, suggestions, stats) where clusters is a list of
+        {'canonical': name, 'aliases': [{'name', 'score'}]} and
+        suggestions a list of {'name', 'canonical', 'score'}
+    """
+    started = time.perf_counter()
+    entries = []
+    order = {}
+    for entity in entities:
+        key = name_key(entity['name'])
+        if key not in order:
+            order[key] = len(entries)
+            entries.append((entity, ResolvedName(entity['name'], entity.get('type'))))
+
+    degree = [0] * len(entries)
+    for rel in relationships:
+        for endpoint in (rel['source'], rel['target']):
+            position = order.get(name_key(endpoint))
+            if position is not None:
+                degree[position] += 1
+
+    blocks = defaultdict(list)
+    for position, (_, entry) in enumerate(entries):
+        for block_key in entry.blocking_keys():
+            blocks[block_key].append(position)
+
+    parent = list(range(len(entries)))
+    best_score = {}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    names = [entry for _, entry in entries]
+    size = len(names)
+    compared = set()
+    skipped_blocks = 0
+    weak_pairs = []
+    for block in blocks.values():
+        if len(block) < 2:
+            continue
+        if len(block) > max_block_size:
+            skipped_blocks += 1
+            continue
+        # Positions within a block ascend, so i < j for every pair
+        for i, j in combinations(block, 2):
+            pair = i * size + j
+            if pair in compared:
+                continue
+            compared.add(pair)
+            a, b = names[i], names[j]
+            if a.group != b.group and a.group is not None and b.group is not None:
+                continue
+            score = similarity(a, b, threshold)
+            if score >= threshold and merge_above is not None and score <= merge_above:
+                weak_pairs.append((i, j, score))
+            elif score >= threshold:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+                for node in (i, j):
+                    best_score[node] = max(best_score.get(node, 0.0), score)
+
+    groups = defaultdict(list)
+    for position in best_score:
+        groups[find(position)].append(position)
+
+    def rank(position):
+        entity = entries[position][0]
+        return (-degree[position], -(entity.get('importance') or 0), position)
+
+    clusters = []
+    for members in groups.values():
+        members.sort(key=rank)
+        clusters.append({
+            'canonical': entries[members[0]][0]['name'],
+            'aliases': [
+                {'name': entries[position][0]['name'], 'score': round(best_score[position], 3)}
+                for position in members[1:]
+            ]
+        })
+    clusters.sort(key=lambda cluster: order[name_key(cluster['canonical'])])
+
+    # A suggestion joins two groups (or ungrouped entities), named by the
+    # entity that would stay canonical after merging them
+    canonical = {position: members[0] for members in groups.values() for position in members}
+    suggested = {}
+    for i, j, score in weak_pairs:
+        head_i, head_j = canonical.get(i, i), canonical.get(j, j)
+        if head_i == head_j:
+            continue
+        keep, merge = sorted((head_i, head_j), key=rank)
+        if score > suggested.get((keep, merge), 0.0):
+            suggested[(keep, merge)] = score
+    suggestions = [
+        {'name': entries[merge][0]['name'], 'canonical': entries[keep][0]['name'], 'score': round(score, 3)}
+        for (keep, merge), score in sorted(suggested.items(), key=lambda item: item[0][1])
+    ]
+
+    stats = {
+        'entities': len(entries),
+        'blocks': len(blocks),
+        'skipped_blocks': skipped_blocks,
+        'comparisons': len(compared),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    logger.info(
+        f'Entity resolution: {len(clusters)} groups and {len(suggestions)} suggestions from '
+        f'{len(entries)} entities ({len(compared)} comparisons) in {stats["seconds"]:.2f}s'
+    )
+    return clusters, suggestions, stats
+
+
+class ResolverCache:
+    """
+    Resolution indexes per network, kept current from the change log
+
+    An index is extended with the entities added since the version it was
+    built at; when the change log cannot answer (compaction, a merge or a
+    re-created network) it is rebuilt from a snapshot. Each index has its
+    own lock, and builds run outside the cache lock, so a cold network only
+    holds up requests for that network.
+    """
+
+    def __init__(self, max_networks=8, max_block_size=DEFAULT_MAX_BLOCK_SIZE):
+        self.max_networks = max_networks
+        self.max_block_size = max_block_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, store, network_id):
+        index = ResolutionIndex(self.max_block_size)
+        with store.snapshot(network_id) as view:
+            if view is None:
+                return None
+            for entity in view['entities']:
+                index.add(ResolvedName(entity['name'], entity.get('type')))
+            state = {'created_at': view['created_at'], 'version': view['version']}
+        for alias in store.aliases(network_id) or ():
+            index.add(ResolvedName(alias['alias'], canonical=alias['canonical']))
+        return {**state, 'index': index, 'pending': {}, 'lock': threading.Lock()}
+
+    def _refresh(self, store, network_id, entry):
+        """Bring entry up to date from the change log (under its lock); False if it needs a rebuild"""
+        state = store.network_version(network_id)
+        if state is None or entry['created_at'] != state['created_at']:
+            return False
+        if entry['version'] == state['version']:
+            return True
+        changes = store.changes_since(network_id, entry['version'])
+        if changes is None or 'entities' not in changes:
+            return False
+        # Entities resolved by the last call are already parsed
+        pending, entry['pending'] = entry['pending'], {}
+        for entity in changes['entities']:
+            resolved_name = pending.get(name_key(entity['name']))
+            if resolved_name is None or resolved_name.name != entity['name']:
+                resolved_name = ResolvedName(entity['name'], entity.get('type'))
+            else:
+                resolved_name.group = type_group(entity.get('type'))
+            entry['index'].add(resolved_name)
+        entry['version'] = changes['version']
+        return True
+
+    def resolve(self, store, network_id, entities, threshold=DEFAULT_THRESHOLD):
+        """
+        Resolve incoming entities against the stored network
+
+        Returns:
+            {incoming name: (canonical name, score)}, as resolve_incoming
+        """
+        with self._lock:
+            entry = self._entries.get(network_id)
+            if entry is not None:
+                self._entries.move_to_end(network_id)
+
+        if entry is not None:
+            with entry['lock']:
+                if self._refresh(store, network_id, entry):
+                    resolved, entry['pending'] = resolve_incoming(entry['index'], entities, threshold)
+                    return resolved
+
+        entry = self._build(store, network_id)
+        with self._lock:
+            if entry is None:
+                self._entries.pop(network_id, None)
+            else:
+                current = self._entries.get(network_id)
+                # A concurrent request may have cached a newer version meanwhile
+                if current is not None and current['created_at'] == entry['created_at'] \
+                        and current['version'] >= entry['version']:
+                    entry = current
+                self._entries[network_id] = entry
+                self._entries.move_to_end(network_id)
+                while len(self._entries) > self.max_networks:
+                    self._entries.popitem(last=False)
+        if entry is None:
+            return resolve_incoming(ResolutionIndex(self.max_block_size), entities, threshold)[0]
+
+        with entry['lock']:
+            resolved, entry['pending'] = resolve_incoming(entry['index'], entities, threshold)
+            return resolved
+
+    def discard(self, network_id):
+        with self._lock:
+            self._entries.pop(network_id, None)
@@ -0,0 +1,276 @@
+"""
+Extraction Cache
+Content-addressed cache for AI extraction results
+
+Results are keyed on a hash of the normalized input text, the resolved
+model name and the prompt version, so re-running extraction on the same
+document never calls the model twice. Two tiers are used:
+- a bounded in-process LRU for hot documents
+- an on-disk directory shared by every gunicorn worker on the host
+
+Configure with EXTRACTION_CACHE_SIZE (LRU entries, 0 disables caching)
+and EXTRACTION_CACHE_DIR (empty string disables the disk tier). The disk
+tier is capped at EXTRACTION_CACHE_DISK_MB: reads refresh an entry's
+mtime, and once enough has been written the least recently used files
+are swept away.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Normalize text so that insignificant whitespace changes share a cache entry"""
+    text = unicodedata.normalize('NFC', text)
+    return ' '.join(text.split())
+
+
+def make_cache_key(text, model, prompt_version):
+    """Return the content address for an extraction request"""
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, normalize_text(text)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+# A sweep trims a full directory to this fraction of its cap, so the
+# next sweep is not due right away
+SWEEP_LOW_WATER = 0.9
+
+# Temp files older than this were left by a writer that died
+STALE_TEMP_SECONDS = 3600
+
+
+def sweep_directory(directory, max_bytes, low_water=SWEEP_LOW_WATER):
+    """
+    Delete the least recently used files under directory once it exceeds max_bytes
+
+    Files are removed oldest mtime first until at most low_water *
+    max_bytes remain. Several processes may sweep the same directory;
+    files another sweep removed first are skipped.
+
+    Returns:
+        (bytes remaining, files removed)
+    """
+    files = []
+    total = 0
+    removed = 0
+    now = time.time()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith('.tmp') and now - stat.st_mtime > STALE_TEMP_SECONDS:
+                try:
+                    os.unlink(path)
+                    removed += 1
+                except OSError:
+                    pass
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total > max_bytes:
+        files.sort()
+        target = max_bytes * low_water
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+    return total, removed
+
+
+class DiskQuota:
+    """
+    Byte cap on a cache directory, enforced by periodic sweeps
+
+    Writers report the bytes they add; after every sweep_fraction of the
+    cap written by this process, sweep_directory runs once (a write that
+    finds a sweep already running does not wait for it).
+
+    Args:
+        directory: Directory to keep under the cap
+        max_bytes: Cap on the directory's size (0 disables it)
+        sweep_fraction: Share of the cap written between sweeps
+    """
+
+    def __init__(self, directory, max_bytes, sweep_fraction=0.05):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sweep_bytes = max(1, int(max_bytes * sweep_fraction))
+        self._written = 0
+        self._lock = threading.Lock()
+        self._sweeping = threading.Lock()
+
+    def sweep(self):
+        if not self.max_bytes or not self._sweeping.acquire(blocking=False):
+            return
+        try:
+            total, removed = sweep_directory(self.directory, self.max_bytes)
+            if removed:
+                logger.info(f'Swept {removed} files from {self.directory} ({total} bytes remain)')
+        except OSError as e:
+            logger.warning(f'Could not sweep {self.directory}: {e}')
+        finally:
+            self._sweeping.release()
+
+    def record(self, size):
+        """Account for size bytes written, sweeping when enough have accumulated"""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            self._written += size
+            due = self._written >= self.sweep_bytes
+            if due:
+                self._written = 0
+        if due:
+            self.sweep()
+
+
+def touch(path):
+    """Mark a cache file as recently used for the next sweep"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class ExtractionCache:
+    """
+    Two-tier (memory LRU + disk) cache of extraction results
+
+    Args:
+        max_entries: Results kept in memory
+        cache_dir: Directory of the disk tier (None disables it)
+        max_disk_bytes: Cap on the disk tier (0 for no cap)
+    """
+
+    def __init__(self, max_entries=256, cache_dir=None, max_disk_bytes=0):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._quota = None
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._quota = DiskQuota(cache_dir, max_disk_bytes)
+            self._quota.sweep()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached result for a key, or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return value
+
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                touch(path)
+            except FileNotFoundError:
+                value = None
+            except (OSError, ValueError) as e:
+                logger.warning(f'Ignoring unreadable cache entry {key}: {e}')
+                value = None
+
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store a result in both tiers"""
+        self._remember(key, value)
+
+        if not self.cache_dir:
+            return
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so other workers never read partial JSON
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f'Failed to write cache entry {key}: {e}')
+            return
+        self._quota.record(size)
+
+    def stats(self):
+        """Return hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_enabled': bool(self.cache_dir)
+            }
+
+
+def create_extraction_cache():
+    """Create the extraction cache configured by the environment, or None if disabled"""
+    max_entries = int(os.getenv('EXTRACTION_CACHE_SIZE', '256'))
+    if max_entries <= 0:
+        logger.info('Extraction cache disabled')
+        return None
+
+    cache_dir = os.getenv('EXTRACTION_CACHE_DIR', os.path.join('.cache', 'extraction'))
+    max_disk_mb = float(os.getenv('EXTRACTION_CACHE_DISK_MB', '512'))
+    logger.info(f'Extraction cache: {max_entries} entries in memory, disk tier at {cache_dir or "disabled"}')
+    return ExtractionCache(
+        max_entries=max_entries, cache_dir=cache_dir or None, max_disk_bytes=int(max_disk_mb * 1024 * 1024)
+    )
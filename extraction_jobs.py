@@ -0,0 +1,281 @@
+"""
+Extraction Jobs
+Asynchronous extraction queue with durable job state
+
+POST /api/extract/jobs stores a job and returns immediately; a bounded
+thread pool in the worker runs the extraction in the background. Job
+state lives in a SQLite file shared by every gunicorn worker, so a
+status poll can be answered by any worker and jobs owned by a worker
+that died are picked up again by the next process that notices.
+
+Every process renews a lease on the jobs it owns from a heartbeat
+thread; a job whose lease ran out belongs to a dead process. Unlike a
+PID check, this stays correct when PIDs are reused after a container
+restart or when workers in different containers share the database.
+Finished jobs and their results are pruned after a retention period.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner_pid INTEGER,
+    owner TEXT,
+    heartbeat_at REAL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+ACTIVE_STATUSES = ('queued', 'running')
+FINISHED_STATUSES = ('completed', 'failed')
+
+# Columns added after the first release, with their SQL types
+ADDED_COLUMNS = (('owner', 'TEXT'), ('heartbeat_at', 'REAL'))
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its configured depth"""
+
+
+class ExtractionJobQueue:
+    """
+    Bounded background executor for extraction jobs
+
+    Args:
+        db_path: SQLite file holding job state
+        run_fn: Callable taking a job payload dict and returning a result dict
+        max_workers: Concurrent jobs per process
+        max_queued: Maximum queued + running jobs across all processes
+        lease_seconds: Active jobs whose owner has not renewed them for
+            this long are adopted by another process
+        retention_seconds: Finished jobs older than this are deleted
+    """
+
+    def __init__(self, db_path, run_fn, max_workers=2, max_queued=32,
+                 lease_seconds=60, retention_seconds=86400):
+        self.db_path = db_path
+        self.run_fn = run_fn
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._owner = None
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+        if columns:
+            for column, column_type in ADDED_COLUMNS:
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _get_executor(self):
+        # Threads do not survive a fork, so each worker process builds its
+        # own pool, owner token and heartbeat
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='extract-job'
+                )
+                self._executor_pid = os.getpid()
+                self._owner = uuid.uuid4().hex
+                threading.Thread(
+                    target=self._heartbeat, args=(self._owner,), name='extract-job-heartbeat', daemon=True
+                ).start()
+            return self._executor
+
+    def _owner_token(self):
+        """Token identifying this process as the owner of its jobs"""
+        self._get_executor()
+        return self._owner
+
+    def _heartbeat(self, owner):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self._connection().execute(
+                    'UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)',
+                    (time.time(), owner, *ACTIVE_STATUSES)
+                )
+                self.prune()
+            except sqlite3.Error as e:
+                logger.warning(f'Extraction job heartbeat failed: {e}')
+
+    def _expired(self, heartbeat_at):
+        return heartbeat_at is None or heartbeat_at < time.time() - self.lease_seconds
+
+    def submit(self, payload):
+        """
+        Queue a job and schedule it on this process
+
+        Raises:
+            QueueFullError: if max_queued jobs are already queued or running
+        """
+        job_id = uuid.uuid4().hex
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            active = conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES
+            ).fetchone()[0]
+            if active >= self.max_queued:
+                raise QueueFullError(f'Extraction queue is full ({active} jobs pending)')
+
+            conn.execute(
+                'INSERT INTO jobs (id, status, payload, owner_pid, owner, heartbeat_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', json.dumps(payload), os.getpid(), self._owner_token(), time.time(),
+                 datetime.utcnow().isoformat())
+            )
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+        self._get_executor().submit(self._run, job_id)
+        logger.info(f'Queued extraction job {job_id}')
+        return self.get(job_id)
+
+    def _run(self, job_id):
+        conn = self._connection()
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'running', owner_pid = ?, owner = ?, heartbeat_at = ?, started_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (os.getpid(), self._owner_token(), time.time(), datetime.utcnow().isoformat(), job_id)
+        ).rowcount
+        if not claimed:
+            return
+
+        payload = json.loads(conn.execute(
+            'SELECT payload FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()[0])
+
+        try:
+            result = self.run_fn(payload)
+        except Exception as e:
+            logger.error(f'Extraction job {job_id} failed: {e}', exc_info=True)
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                (str(e), datetime.utcnow().isoformat(), job_id)
+            )
+            return
+
+        conn.execute(
+            "UPDATE jobs SET status = 'completed', result = ?, finished_at = ? WHERE id = ?",
+            (json.dumps(result), datetime.utcnow().isoformat(), job_id)
+        )
+        logger.info(f'Extraction job {job_id} completed')
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+        row = self._connection().execute(
+            'SELECT id, status, result, error, heartbeat_at, created_at, started_at, finished_at '
+            'FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        if row[1] in ACTIVE_STATUSES and self._expired(row[4]):
+            # The owning worker stopped renewing its lease; adopt the job here
+            self.recover()
+            return self.get(job_id)
+
+        job = {
+            'job_id': row[0],
+            'status': row[1],
+            'created_at': row[5],
+            'started_at': row[6],
+            'finished_at': row[7]
+        }
+        if row[2] is not None:
+            job['result'] = json.loads(row[2])
+        if row[3] is not None:
+            job['error'] = row[3]
+        return job
+
+    def stats(self):
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+        return {status: count for status, count in rows}
+
+    def recover(self):
+        """Requeue and schedule jobs whose owning process stopped renewing its lease"""
+        conn = self._connection()
+        orphaned = [
+            job_id for job_id, heartbeat_at in conn.execute(
+                'SELECT id, heartbeat_at FROM jobs WHERE status IN (?, ?)', ACTIVE_STATUSES
+            )
+            if self._expired(heartbeat_at)
+        ]
+
+        recovered = 0
+        for job_id in orphaned:
+            # The lease is checked again so two processes cannot both adopt a job
+            adopted = conn.execute(
+                "UPDATE jobs SET status = 'queued', owner_pid = ?, owner = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (os.getpid(), self._owner_token(), time.time(), job_id, *ACTIVE_STATUSES,
+                 time.time() - self.lease_seconds)
+            ).rowcount
+            if adopted:
+                recovered += 1
+                logger.info(f'Recovered extraction job {job_id}')
+                self._get_executor().submit(self._run, job_id)
+
+        return recovered
+
+    def prune(self):
+        """Delete finished jobs, with their results, older than the retention period"""
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.retention_seconds)).isoformat()
+        deleted = self._connection().execute(
+            'DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?', (*FINISHED_STATUSES, cutoff)
+        ).rowcount
+        if deleted:
+            logger.info(f'Pruned {deleted} finished extraction jobs')
+        return deleted
+
+
+def create_job_queue(run_fn):
+    """Create the extraction job queue configured by the environment"""
+    queue = ExtractionJobQueue(
+        os.getenv('EXTRACTION_JOB_DB', 'extraction_jobs.db'),
+        run_fn,
+        max_workers=int(os.getenv('EXTRACTION_JOB_WORKERS', '2')),
+        max_queued=int(os.getenv('EXTRACTION_JOB_QUEUE_DEPTH', '32')),
+        lease_seconds=float(os.getenv('EXTRACTION_JOB_LEASE_SECONDS', '60')),
+        retention_seconds=float(os.getenv('EXTRACTION_JOB_RETENTION_HOURS', '24')) * 3600
+    )
+    queue.prune()
+    queue.recover()
+    return queue
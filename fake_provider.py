@@ -0,0 +1,144 @@
+"""
+Fake Provider
+Offline stand-in for the OpenAI chat API, for load testing
+
+Selected with LLM_PROVIDER=fake. Responses have the same shape as the
+SDK's (choices[0].message.content, usage.total_tokens, streamed deltas)
+and are derived deterministically from the prompt: capitalised phrases
+in the text become entities and consecutive ones are linked. Latency
+and a rate of simulated 429/503 errors are configurable so retries and
+rate limiting can be exercised without a network.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+# Runs of capitalised words, e.g. "Goldman Sachs" or "Jho Low"
+PHRASE = re.compile(r'\b[A-Z][\w&\-]*(?:\s+[A-Z][\w&\-]*)*')
+
+DOCUMENT_HEADER = re.compile(r'=== DOCUMENT (\S+) ===\n')
+CANDIDATE_LINE = re.compile(r'^\d+\. (.+?) — (.+?)(?: \(|$)', re.MULTILINE)
+
+MAX_FAKE_ENTITIES = 25
+
+
+class FakeProviderError(Exception):
+    """Simulated HTTP error from the fake provider"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers={})
+
+
+def _fake_extraction(text):
+    names = []
+    seen = set()
+    for match in PHRASE.finditer(text):
+        name = match.group(0).strip()
+        if len(name) > 2 and name.casefold() not in seen:
+            seen.add(name.casefold())
+            names.append(name)
+        if len(names) >= MAX_FAKE_ENTITIES:
+            break
+
+    entities = [
+        {'id': f'e{i}', 'name': name, 'type': 'person', 'importance': 3, 'description': ''}
+        for i, name in enumerate(names, 1)
+    ]
+    relationships = [
+        {'source': f'e{i}', 'target': f'e{i + 1}', 'type': 'other', 'description': '', 'status': 'suspected'}
+        for i in range(1, len(names))
+    ]
+    return {'entities': entities, 'relationships': relationships}
+
+
+def fake_response_content(prompt):
+    """JSON content the fake model returns for a prompt"""
+    documents = DOCUMENT_HEADER.split(prompt)
+    if len(documents) > 1:
+        ids = documents[1::2]
+        texts = [text.split('Return ONLY', 1)[0] for text in documents[2::2]]
+        return {
+            'documents': [
+                {'doc_id': doc_id, **_fake_extraction(text)}
+                for doc_id, text in zip(ids, texts)
+            ]
+        }
+
+    if 'inferred_relationships' in prompt:
+        return {
+            'inferred_relationships': [
+                {
+                    'source': source, 'target': target, 'type': 'other',
+                    'description': 'Fake inference', 'confidence': 0.5, 'evidence': 'fake provider'
+                }
+                for source, target in CANDIDATE_LINE.findall(prompt)[:5]
+            ]
+        }
+
+    text = prompt.split('Text to analyze:', 1)[-1].split('Return ONLY', 1)[0]
+    return _fake_extraction(text)
+
+
+class _FakeCompletions:
+    def __init__(self, provider):
+        self._provider = provider
+
+    def create(self, model, messages, stream=False, timeout=None, **kwargs):
+        provider = self._provider
+        provider.count_call()
+        if provider.latency:
+            time.sleep(provider.latency * random.uniform(0.5, 1.5))
+        if provider.error_rate and random.random() < provider.error_rate:
+            status = random.choice((429, 503))
+            raise FakeProviderError(status, f'Fake provider error {status}')
+
+        prompt = messages[-1]['content']
+        content = json.dumps(fake_response_content(prompt))
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=len(prompt) // 4 + len(content) // 4
+        )
+
+        if not stream:
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                usage=usage
+            )
+
+        def chunks():
+            for start in range(0, len(content), 40):
+                yield SimpleNamespace(
+                    choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + 40]))],
+                    usage=None
+                )
+            yield SimpleNamespace(choices=[], usage=usage)
+
+        return chunks()
+
+
+class FakeOpenAI:
+    """
+    Drop-in replacement for openai.OpenAI's chat.completions.create
+
+    Args:
+        latency: Mean seconds per call (actual latency is 0.5x-1.5x)
+        error_rate: Fraction of calls failing with a simulated 429 or 503
+    """
+
+    def __init__(self, latency=0.2, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
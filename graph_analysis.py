@@ -0,0 +1,360 @@
+"""
+Graph Analysis
+Server-side candidate generation for missing relationships
+
+Python port of graph-analysis.js. The browser version compares every
+pair of entities or relationships; here adjacency sets are built once
+and candidates come from set intersections and single passes over the
+edges and sentences, so large networks finish in seconds.
+
+Candidates use the same schema as the browser module:
+    {source, sourceName, target, targetName, confidence, method, evidence, ...}
+with entity names as ids, matching the relationships stored by
+POST /api/network.
+"""
+
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+
+from mention_index import WORD, MentionIndex, name_words
+from network_store import name_key
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('co-occurrence', 'similar-context', 'transitive', 'shared-connections')
+
+# Nodes whose neighbourhood would generate more pairs than this are
+# skipped by the pair-enumerating methods; they connect almost everything
+# and their candidates carry little signal.
+DEFAULT_MAX_PAIRS_PER_NODE = 20000
+
+# Keep at most this many evidence strings per aggregated candidate
+MAX_EVIDENCE = 5
+
+
+class Graph:
+    """Undirected and directed adjacency sets over integer node ids"""
+
+    def __init__(self, entities, relationships):
+        self.entities = []
+        self.index = {}
+        for entity in entities:
+            key = name_key(entity['name'])
+            if key not in self.index:
+                self.index[key] = len(self.entities)
+                self.entities.append(entity)
+
+        size = len(self.entities)
+        self.neighbors = [set() for _ in range(size)]
+        self.successors = [set() for _ in range(size)]
+        self.predecessors = [set() for _ in range(size)]
+        self.edge_types = {}
+
+        for rel in relationships:
+            source = self.index.get(name_key(rel['source']))
+            target = self.index.get(name_key(rel['target']))
+            if source is None or target is None or source == target:
+                continue
+            self.neighbors[source].add(target)
+            self.neighbors[target].add(source)
+            self.successors[source].add(target)
+            self.predecessors[target].add(source)
+            self.edge_types[(source, target)] = rel.get('type')
+
+    def name(self, node):
+        return self.entities[node]['name']
+
+    def connected(self, a, b):
+        return b in self.neighbors[a]
+
+
+def _candidate(graph, a, b, confidence, method, evidence, **extra):
+    return {
+        'source': graph.name(a),
+        'sourceName': graph.name(a),
+        'target': graph.name(b),
+        'targetName': graph.name(b),
+        'confidence': confidence,
+        'method': method,
+        'evidence': evidence,
+        **extra
+    }
+
+
+def aggregate_candidates(candidates):
+    """
+    Merge candidates for the same unordered pair
+
+    Mirrors _aggregateCandidates: each extra occurrence adds 0.1
+    confidence (capped at 0.95), methods are collected and evidence is
+    combined into a list.
+    """
+    merged = {}
+    for candidate in candidates:
+        key = frozenset((name_key(candidate['source']), name_key(candidate['target'])))
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = dict(candidate)
+            continue
+
+        existing['confidence'] = min(existing['confidence'] + 0.1, 0.95)
+        methods = existing.setdefault('methods', [existing['method']])
+        if candidate['method'] not in methods:
+            methods.append(candidate['method'])
+        if not isinstance(existing['evidence'], list):
+            existing['evidence'] = [existing['evidence']]
+        if len(existing['evidence']) < MAX_EVIDENCE:
+            new_evidence = candidate['evidence']
+            if isinstance(new_evidence, list):
+                existing['evidence'].extend(new_evidence[:MAX_EVIDENCE - len(existing['evidence'])])
+            else:
+                existing['evidence'].append(new_evidence)
+
+    return list(merged.values())
+
+
+def find_co_occurrences(graph, document_text, mention_index=None):
+    """Entities mentioned in the same sentence, from one scan of the document"""
+    if not document_text or not graph.entities:
+        return []
+
+    if mention_index is None:
+        mention_index = MentionIndex(graph.entities, document_text)
+
+    candidates = []
+    for sentence_index, nodes in mention_index.co_occurrences():
+        present = sorted(graph.index[name_key(mention_index.names[node])] for node in nodes)
+        evidence = mention_index.sentence_text(sentence_index)
+        for i, a in enumerate(present):
+            for b in present[i + 1:]:
+                candidates.append(_candidate(
+                    graph, a, b, 0.6, 'co-occurrence', evidence,
+                    sentenceIndex=sentence_index
+                ))
+
+    return aggregate_candidates(candidates)
+
+
+def find_transitive_connections(graph, max_pairs_per_node=DEFAULT_MAX_PAIRS_PER_NODE):
+    """A -> B and B -> C without an A - C edge, enumerated per middle node B"""
+    candidates = []
+
+    for via in range(len(graph.entities)):
+        sources = graph.predecessors[via]
+        targets = graph.successors[via]
+        if not sources or not targets or len(sources) * len(targets) > max_pairs_per_node:
+            continue
+
+        for a in sources:
+            first_type = graph.edge_types.get((a, via)) or 'connected'
+            for c in targets:
+                if a == c or graph.connected(a, c):
+                    continue
+                second_type = graph.edge_types.get((via, c)) or 'connected'
+                candidates.append(_candidate(
+                    graph, a, c, 0.7, 'transitive',
+                    f'{first_type} via {graph.name(via)}, then {second_type}',
+                    via=graph.name(via),
+                    viaId=graph.name(via),
+                    path=[graph.name(a), graph.name(via), graph.name(c)]
+                ))
+
+    return aggregate_candidates(candidates)
+
+
+def find_shared_connections(graph, min_shared=2, max_pairs_per_node=DEFAULT_MAX_PAIRS_PER_NODE):
+    """Unconnected pairs with at least min_shared common neighbours"""
+    shared = defaultdict(list)
+
+    # Every pair of neighbours of w shares w; count pairs per common neighbour
+    for w, neighbors in enumerate(graph.neighbors):
+        degree = len(neighbors)
+        if degree < 2 or degree * (degree - 1) // 2 > max_pairs_per_node:
+            continue
+        ordered = sorted(neighbors)
+        for i, a in enumerate(ordered):
+            for b in ordered[i + 1:]:
+                shared[(a, b)].append(w)
+
+    candidates = []
+    for (a, b), common in shared.items():
+        if len(common) < min_shared or graph.connected(a, b):
+            continue
+        names = [graph.name(w) for w in common]
+        candidates.append(_candidate(
+            graph, a, b, min(0.5 + len(common) * 0.1, 0.9), 'shared-connections',
+            f'Both connected to: {", ".join(names)}',
+            sharedCount=len(common),
+            sharedWith=names
+        ))
+
+    return candidates
+
+
+def find_similar_contexts(graph, max_group_size=50):
+    """People whose descriptions mention the same organization"""
+    org_words = defaultdict(list)
+    for node, entity in enumerate(graph.entities):
+        if entity.get('type') in ('corporation', 'organization'):
+            for word in name_words(entity['name']) or {name_key(entity['name'])}:
+                org_words[word].append(node)
+
+    if not org_words:
+        return []
+
+    people_by_org = defaultdict(list)
+    for node, entity in enumerate(graph.entities):
+        if entity.get('type') != 'person':
+            continue
+        description = (entity.get('description') or '').casefold()
+        if not description:
+            continue
+
+        possible = set()
+        for word in set(WORD.findall(description)):
+            possible.update(org_words.get(word, ()))
+        for org in possible:
+            if name_key(graph.name(org)) in description:
+                people_by_org[org].append(node)
+
+    candidates = []
+    for org, people in people_by_org.items():
+        if len(people) > max_group_size:
+            continue
+        org_name = graph.name(org)
+        for i, a in enumerate(people):
+            for b in people[i + 1:]:
+                candidates.append(_candidate(
+                    graph, a, b, 0.65, 'similar-context',
+                    f'Both associated with {org_name}',
+                    context=org_name
+                ))
+
+    return candidates
+
+
+def analyze_missing_connections(entities, relationships, document_text='', methods=METHODS,
+                                min_confidence=0.0, limit=None,
+                                max_pairs_per_node=DEFAULT_MAX_PAIRS_PER_NODE,
+                                mention_index=None):
+    """
+    Run the selected candidate generators and return ranked candidates
+
+    A prebuilt MentionIndex for document_text can be passed to avoid
+    rescanning the document.
+
+    Returns:
+        (candidates sorted by confidence, metadata with per-method counts and timings)
+    """
+    started = time.perf_counter()
+    graph = Graph(entities, relationships)
+    build_seconds = time.perf_counter() - started
+
+    generators = {
+        'co-occurrence': lambda: find_co_occurrences(graph, document_text, mention_index),
+        'similar-context': lambda: find_similar_contexts(graph),
+        'transitive': lambda: find_transitive_connections(graph, max_pairs_per_node),
+        'shared-connections': lambda: find_shared_connections(graph, max_pairs_per_node=max_pairs_per_node)
+    }
+
+    all_candidates = []
+    method_stats = {}
+    for method in methods:
+        method_started = time.perf_counter()
+        found = generators[method]()
+        method_stats[method] = {
+            'candidates': len(found),
+            'seconds': round(time.perf_counter() - method_started, 4)
+        }
+        all_candidates.extend(found)
+
+    candidates = [
+        c for c in aggregate_candidates(all_candidates)
+        if c['confidence'] >= min_confidence
+        and not graph.connected(graph.index[name_key(c['source'])], graph.index[name_key(c['target'])])
+    ]
+    candidates.sort(key=lambda c: c['confidence'], reverse=True)
+    total = len(candidates)
+    if limit is not None:
+        candidates = candidates[:limit]
+
+    seconds = time.perf_counter() - started
+    logger.info(f'Graph analysis: {total} candidates from {len(graph.entities)} entities in {seconds:.2f}s')
+
+    return candidates, {
+        'entities': len(graph.entities),
+        'total_candidates': total,
+        'returned': len(candidates),
+        'methods': method_stats,
+        'build_seconds': round(build_seconds, 4),
+        'seconds': round(seconds, 4)
+    }
+
+
+def rank_link_candidates(graph, top_k=50, mention_index=None,
+                         max_pairs_per_node=DEFAULT_MAX_PAIRS_PER_NODE):
+    """
+    Score unconnected pairs with link-prediction heuristics and keep the best
+
+    Features per pair:
+        common_neighbors  number of shared neighbours
+        adamic_adar       sum of 1 / log(degree) over shared neighbours
+        transitive_paths  number of directed A -> B -> C paths
+        co_occurrences    sentences mentioning both (needs mention_index)
+
+    Returns:
+        list of up to top_k dicts with source, target, score and the features
+    """
+    features = defaultdict(lambda: [0, 0.0, 0, 0])
+
+    for w, neighbors in enumerate(graph.neighbors):
+        degree = len(neighbors)
+        if degree < 2 or degree * (degree - 1) // 2 > max_pairs_per_node:
+            continue
+        weight = 1.0 / math.log(degree)
+        ordered = sorted(neighbors)
+        for i, a in enumerate(ordered):
+            for b in ordered[i + 1:]:
+                if b in graph.neighbors[a]:
+                    continue
+                entry = features[(a, b)]
+                entry[0] += 1
+                entry[1] += weight
+                if (a in graph.predecessors[w] and b in graph.successors[w]) or \
+                        (b in graph.predecessors[w] and a in graph.successors[w]):
+                    entry[2] += 1
+
+    if mention_index is not None:
+        for _, nodes in mention_index.co_occurrences():
+            present = sorted(
+                graph.index[key] for key in (name_key(mention_index.names[n]) for n in nodes)
+                if key in graph.index
+            )
+            if len(present) * (len(present) - 1) // 2 > max_pairs_per_node:
+                continue
+            for i, a in enumerate(present):
+                for b in present[i + 1:]:
+                    if not graph.connected(a, b):
+                        features[(a, b)][3] += 1
+
+    def score(item):
+        common, adamic_adar, transitive, co_occurrences = item[1]
+        return adamic_adar + 0.5 * transitive + 0.75 * co_occurrences
+
+    best = heapq.nlargest(top_k, features.items(), key=score)
+    return [
+        {
+            'source': graph.name(a),
+            'target': graph.name(b),
+            'score': round(score(((a, b), values)), 4),
+            'common_neighbors': values[0],
+            'adamic_adar': round(values[1], 4),
+            'transitive_paths': values[2],
+            'co_occurrences': values[3],
+            'shared_with': [graph.name(w) for w in sorted(graph.neighbors[a] & graph.neighbors[b])[:5]]
+        }
+        for (a, b), values in best
+    ]
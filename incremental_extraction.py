@@ -0,0 +1,149 @@
+"""
+Incremental Extraction
+Diff-aware re-extraction of edited documents
+
+The document is split into content-defined chunks (see
+split_into_content_chunks), so editing a paragraph changes only the
+chunk that contains it. A manifest per (document_id, model) records the
+fingerprint and extraction result of every chunk; on re-submission only
+chunks with new fingerprints are sent to the model, the rest reuse
+their stored results, and all chunk results are merged again.
+Manifests of documents not re-submitted for a while are swept once the
+directory exceeds EXTRACTION_MANIFEST_DISK_MB.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from chunked_extraction import extract_chunked, split_into_content_chunks
+from extraction_cache import DiskQuota, touch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INCREMENTAL_CHUNK_CHARS = 4000
+
+
+class ChunkManifestStore:
+    """
+    Per-document chunk fingerprints and results stored as JSON files
+
+    Args:
+        directory: Directory holding one manifest file per (document, model)
+        max_bytes: Cap on the directory's size; the least recently used
+            manifests are deleted beyond it (0 for no cap)
+    """
+
+    def __init__(self, directory, max_bytes=0):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._quota = DiskQuota(directory, max_bytes)
+        self._quota.sweep()
+
+    def _path(self, document_id, model):
+        digest = hashlib.sha256(f'{document_id}\0{model}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.json')
+
+    def get(self, document_id, model):
+        """Return the stored manifest, or None"""
+        path = self._path(document_id, model)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            touch(path)
+            return manifest
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f'Ignoring unreadable manifest for {document_id}: {e}')
+            return None
+
+    def set(self, document_id, model, manifest):
+        """Atomically replace the manifest for a document"""
+        path = self._path(document_id, model)
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f)
+                    size = f.tell()
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        self._quota.record(size)
+
+
+def extract_incremental(text, extract_fn, fingerprint_fn, previous=None, max_workers=4,
+                        max_chars=DEFAULT_INCREMENTAL_CHUNK_CHARS):
+    """
+    Extract text chunk by chunk, reusing results of chunks seen in previous
+
+    Args:
+        text: Document text
+        extract_fn: Callable taking chunk text and returning an extraction result
+        fingerprint_fn: Callable mapping chunk text to a stable fingerprint
+        previous: Manifest from the last extraction of this document, if any
+
+    Returns:
+        (merged result dict, new manifest dict)
+    """
+    chunks = split_into_content_chunks(text, max_chars)
+    fingerprints = [fingerprint_fn(chunk['text']) for chunk in chunks]
+    by_text = dict(zip((chunk['text'] for chunk in chunks), fingerprints))
+    previous_results = (previous or {}).get('results', {})
+    results = {}
+
+    def run(chunk_text):
+        fingerprint = by_text[chunk_text]
+        stored = previous_results.get(fingerprint)
+        if stored is not None:
+            results[fingerprint] = stored
+            return {
+                **stored,
+                'metadata': {
+                    **stored.get('metadata', {}),
+                    'tokens_used': 0,
+                    'cost_estimate': 0.0,
+                    'cached': True
+                }
+            }
+        result = extract_fn(chunk_text)
+        results[fingerprint] = result
+        return result
+
+    merged = extract_chunked(text, run, max_workers=max_workers, chunks=chunks)
+
+    # Chunks served from the manifest or the extraction cache cost no model call
+    changed = [chunk['index'] for chunk in merged['metadata']['chunks'] if not chunk['cached']]
+    previous_fingerprints = set((previous or {}).get('fingerprints', []))
+    merged['metadata'].update({
+        'mode': 'incremental',
+        'chunks_reused': len(chunks) - len(changed),
+        'chunks_extracted': len(changed),
+        'chunks_removed': len(previous_fingerprints - set(fingerprints)),
+        'changed_chunks': changed
+    })
+    for chunk_metadata, fingerprint in zip(merged['metadata']['chunks'], fingerprints):
+        chunk_metadata['fingerprint'] = fingerprint
+
+    manifest = {
+        'fingerprints': fingerprints,
+        'results': {fingerprint: results[fingerprint] for fingerprint in fingerprints}
+    }
+    logger.info(f'Incremental extraction: {len(changed)} of {len(chunks)} chunks re-extracted')
+    return merged, manifest
+
+
+def create_manifest_store():
+    """Create the chunk manifest store configured by the environment, or None if disabled"""
+    directory = os.getenv('EXTRACTION_MANIFEST_DIR', '.cache/manifests')
+    if not directory:
+        logger.info('Incremental extraction manifests disabled')
+        return None
+    max_mb = float(os.getenv('EXTRACTION_MANIFEST_DISK_MB', '256'))
+    return ChunkManifestStore(directory, max_bytes=int(max_mb * 1024 * 1024))
@@ -0,0 +1,396 @@
+"""
+LLM Client
+Shared, rate-limit-aware chat completion client
+
+One client per process wraps the OpenAI SDK (or the offline fake
+provider) with:
+    - a tuned HTTP connection pool reused by every request
+    - token buckets for requests/min and tokens/min, so bursts queue
+      locally instead of tripping provider rate limits
+    - a cap on concurrent in-flight calls (a streamed call holds its slot
+      until the stream is consumed or closed)
+    - jittered exponential retries on 429, 5xx, timeouts and connection
+      errors, honouring Retry-After
+    - per-call deadlines covering queueing, retries and backoff
+
+Failures that survive the retries are raised as LLMError subclasses
+carrying the HTTP status the API should answer with.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Rough characters-per-token ratio used to reserve tokens before a call
+CHARS_PER_TOKEN = 4
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """A model call failed in a way the API should report with status_code"""
+
+    status_code = 502
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(LLMError):
+    """The provider kept rate limiting the call after all retries"""
+
+    status_code = 429
+
+
+class ProviderUnavailable(LLMError):
+    """The provider kept failing with server or connection errors"""
+
+    status_code = 503
+
+
+class DeadlineExceeded(LLMError):
+    """The call could not finish before its deadline"""
+
+    status_code = 504
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute
+
+    The bucket holds at most one minute of capacity. A debit larger than
+    the capacity is allowed once the bucket is full, so a single large
+    prompt cannot block forever.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount, deadline=None):
+        """
+        Wait until amount can be debited
+
+        Returns:
+            False if the wait would run past deadline (nothing is debited)
+        """
+        needed = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._available >= needed:
+                    self._available -= amount
+                    return True
+                wait = (needed - self._available) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount):
+        """Credit (negative) or debit (positive) tokens after the fact"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._available = min(self.capacity, self._available - amount)
+
+
+def estimate_message_tokens(messages, completion_tokens=0):
+    """Cheap estimate of the tokens a chat call will consume"""
+    chars = sum(len(message.get('content') or '') for message in messages)
+    return chars // CHARS_PER_TOKEN + completion_tokens + 1
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def _is_retryable(error):
+    if _status_code(error) in RETRYABLE_STATUS:
+        return True
+    # Timeouts and connection resets carry no status code
+    return type(error).__name__ in ('APITimeoutError', 'APIConnectionError')
+
+
+def _retry_after(error):
+    """Seconds from a Retry-After header on the error's response, if any"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _SlotStream:
+    """
+    Streamed response holding a concurrency slot until it is consumed or closed
+
+    Iterates the chunks of the SDK stream; at the end of the stream (or on
+    close) the slot is released and the token reservation is settled
+    against the usage reported by the last chunk that carried one.
+    """
+
+    def __init__(self, stream, release, settle):
+        self._stream = stream
+        self._release = release
+        self._settle = settle
+        self._usage = None
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                usage = getattr(chunk, 'usage', None)
+                if usage is not None:
+                    self._usage = usage
+                yield chunk
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            close = getattr(self._stream, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._release()
+            self._settle(self._usage)
+
+
+class LLMClient:
+    """
+    Chat completion client shared by every request in a process
+
+    Args:
+        client: OpenAI SDK client (or fake provider) exposing chat.completions.create
+        requests_per_minute: Local request rate limit (0 disables)
+        tokens_per_minute: Local token rate limit (0 disables)
+        max_concurrency: Maximum in-flight calls
+        timeout: Per-attempt HTTP timeout in seconds
+        deadline_seconds: Default total budget per call, including retries
+        max_retries: Retries after the first attempt
+        retry_base_seconds: First backoff step, doubled per retry
+        retry_max_seconds: Cap on a single backoff
+        completion_token_estimate: Tokens reserved for the response before a call
+    """
+
+    def __init__(self, client, requests_per_minute=0, tokens_per_minute=0, max_concurrency=16,
+                 timeout=60.0, deadline_seconds=120.0, max_retries=4, retry_base_seconds=0.5,
+                 retry_max_seconds=20.0, completion_token_estimate=1000):
+        self.client = client
+        self.timeout = timeout
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.completion_token_estimate = completion_token_estimate
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0, 'throttled_seconds': 0.0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['throttled_seconds'] = round(stats['throttled_seconds'], 3)
+        return stats
+
+    def _throttle(self, estimated_tokens, deadline):
+        started = time.monotonic()
+        if self._requests and not self._requests.acquire(1, deadline):
+            raise DeadlineExceeded('Deadline exceeded waiting for the request rate limit')
+        if self._tokens and not self._tokens.acquire(estimated_tokens, deadline):
+            raise DeadlineExceeded('Deadline exceeded waiting for the token rate limit')
+        self._count('throttled_seconds', time.monotonic() - started)
+
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.retry_max_seconds)
+        # Full jitter: uniform over [0, base * 2^attempt]
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+
+    def create_chat_completion(self, deadline=None, **kwargs):
+        """
+        Call chat.completions.create with rate limiting, retries and a deadline
+
+        Args:
+            deadline: Absolute time.monotonic() by which the call must finish;
+                defaults to now + deadline_seconds
+            **kwargs: Passed through to the SDK (model, messages, stream, ...)
+
+        With stream=True the response is returned as an iterable that
+        keeps its concurrency slot until it is exhausted or closed; use it
+        as a context manager so an abandoned stream is released promptly.
+
+        Raises:
+            RateLimitExceeded, ProviderUnavailable, DeadlineExceeded once retries
+            are exhausted; non-retryable SDK errors are raised unchanged
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_seconds
+        estimated = estimate_message_tokens(kwargs.get('messages', []), self.completion_token_estimate)
+        self._count('calls')
+
+        attempt = 0
+        while True:
+            self._throttle(estimated, deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded('Deadline exceeded before the model call started')
+
+            self._slots.acquire()
+            try:
+                response = self.client.chat.completions.create(
+                    timeout=min(self.timeout, remaining), **kwargs
+                )
+            except Exception as e:
+                self._slots.release()
+                if self._tokens:
+                    # Nothing was consumed; give the reservation back before retrying
+                    self._tokens.adjust(-estimated)
+                if not _is_retryable(e):
+                    self._count('failures')
+                    raise
+
+                rate_limited = _status_code(e) == 429
+                if rate_limited:
+                    self._count('rate_limited')
+                delay = self._backoff(attempt, e)
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    error_class = RateLimitExceeded if rate_limited else ProviderUnavailable
+                    raise error_class(
+                        f'Model call failed after {attempt + 1} attempts: {e}',
+                        retry_after=max(1, round(delay))
+                    ) from e
+                if time.monotonic() + delay >= deadline:
+                    self._count('failures')
+                    raise DeadlineExceeded(f'Deadline exceeded after {attempt + 1} attempts: {e}') from e
+
+                attempt += 1
+                self._count('retries')
+                logger.warning(f'Model call failed ({e}); retry {attempt}/{self.max_retries} in {delay:.2f}s')
+                time.sleep(delay)
+                continue
+
+            if kwargs.get('stream'):
+                return _SlotStream(response, self._slots.release, lambda usage: self._settle(usage, estimated))
+            self._slots.release()
+            self._settle(getattr(response, 'usage', None), estimated)
+            return response
+
+    def _settle(self, usage, estimated):
+        """Settle a token reservation against the real usage, when reported"""
+        if self._tokens and usage is not None and getattr(usage, 'total_tokens', None):
+            self._tokens.adjust(usage.total_tokens - estimated)
+
+
+def _build_openai_client(api_key, max_connections, timeout):
+    from openai import OpenAI
+
+    options = {'api_key': api_key, 'max_retries': 0, 'timeout': timeout}
+    if httpx is not None:
+        from openai import DefaultHttpxClient
+        options['http_client'] = DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=30
+            )
+        )
+    return OpenAI(**options)
+
+
+_shared_client = None
+_shared_initialized = False
+_shared_lock = threading.Lock()
+
+
+def create_llm_client():
+    """
+    Create the LLM client configured by the environment
+
+    Returns None when the OpenAI provider is selected but no
+    OPENAI_API_KEY is set.
+    """
+    provider = os.getenv('LLM_PROVIDER', 'openai').lower()
+    timeout = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+    max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+
+    if provider == 'fake':
+        from fake_provider import FakeOpenAI
+        client = FakeOpenAI(
+            latency=float(os.getenv('LLM_FAKE_LATENCY_MS', '200')) / 1000,
+            error_rate=float(os.getenv('LLM_FAKE_ERROR_RATE', '0'))
+        )
+        logger.info('Using fake LLM provider')
+    else:
+        api_key = os.getenv('OPENAI_API_KEY')
+        logger.info(f'Checking for OPENAI_API_KEY: {"Found" if api_key else "Not found"}')
+        if not api_key:
+            logger.warning('OPENAI_API_KEY not found in environment')
+            return None
+        client = _build_openai_client(api_key, max_connections, timeout)
+        logger.info('OpenAI client initialized successfully')
+
+    return LLMClient(
+        client,
+        requests_per_minute=int(os.getenv('LLM_REQUESTS_PER_MINUTE', '0')),
+        tokens_per_minute=int(os.getenv('LLM_TOKENS_PER_MINUTE', '0')),
+        max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', str(max_connections))),
+        timeout=timeout,
+        deadline_seconds=float(os.getenv('LLM_DEADLINE_SECONDS', '110')),
+        max_retries=int(os.getenv('LLM_MAX_RETRIES', '4'))
+    )
+
+
+def get_llm_client():
+    """Return the process-wide LLM client, creating it on first use"""
+    global _shared_client, _shared_initialized
+    with _shared_lock:
+        if not _shared_initialized:
+            _shared_initialized = True
+            try:
+                _shared_client = create_llm_client()
+            except Exception as e:
+                logger.error(f'Failed to initialize LLM client: {e}', exc_info=True)
+        return _shared_client
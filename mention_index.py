@@ -0,0 +1,343 @@
+"""
+Mention Index
+Single-pass entity mention search over a source document
+
+All entity names, aliases and distinctive name words are compiled into
+one Aho-Corasick automaton, so finding every entity mention costs one
+scan of the document instead of one substring search per entity, name
+variant and sentence. The resulting index answers which sentences
+mention an entity, which entities co-occur, which excerpts are worth
+sending to the model and where to highlight mentions in the UI.
+"""
+
+import hashlib
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict, deque
+
+from network_store import name_key
+
+# Same sentence boundaries as the browser modules: split on runs of .!?
+SENTENCE_BOUNDARY = re.compile(r'[.!?]+')
+WORD = re.compile(r'\w+')
+
+# Name words too common to identify an entity on their own
+NAME_STOPWORDS = {
+    'the', 'of', 'and', 'for', 'in', 'on', 'at', 'to', 'de', 'la', 'le',
+    'inc', 'ltd', 'llc', 'corp', 'co', 'plc', 'sa', 'ag', 'group', 'company',
+    'bank', 'fund', 'mr', 'mrs', 'ms', 'dr'
+}
+
+# Strength of each kind of match, strongest first
+MATCH_KINDS = ('name', 'alias', 'word')
+
+
+def fold(text):
+    """Lowercase text without changing its length, so offsets stay valid"""
+    return ''.join(
+        lowered if len(lowered) == 1 else char
+        for char, lowered in ((c, c.lower()) for c in text)
+    )
+
+
+def name_words(name):
+    """Distinctive words of an entity name (e.g. 'Jho', 'Low' for 'Jho Low')"""
+    return {
+        word for word in WORD.findall(name.casefold())
+        if len(word) > 2 and word not in NAME_STOPWORDS
+    }
+
+
+def with_aliases(entities, aliases):
+    """
+    Entity dicts with the names merged into them as 'aliases'
+
+    Args:
+        aliases: a store alias table, [{'alias', 'canonical'}]
+    """
+    merged = defaultdict(list)
+    for row in aliases or ():
+        merged[name_key(row['canonical'])].append(row['alias'])
+    if not merged:
+        return list(entities)
+    return [
+        {**entity, 'aliases': list(entity.get('aliases') or ()) + merged[name_key(entity['name'])]}
+        if name_key(entity['name']) in merged else entity
+        for entity in entities
+    ]
+
+
+def split_sentences(text):
+    """Return (start, end) spans of the non-empty sentences in text"""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher (Aho-Corasick automaton)"""
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state].extend(self._output[self._fail[next_state]])
+
+    def search(self, text):
+        """Yield (start, end, pattern_id) for every occurrence of every pattern"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        patterns = self.patterns
+        state = 0
+
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                end = position + 1
+                yield end - len(patterns[pattern_id]), end, pattern_id
+
+
+class MentionIndex:
+    """
+    Entity mentions found in one document
+
+    Args:
+        entities: entity dicts with 'name' and optional 'aliases'
+        text: document text
+        include_name_words: also match single distinctive name words,
+            like the browser's 'Jho Low' / 'Low Taek Jho' handling
+    """
+
+    def __init__(self, entities, text, include_name_words=True):
+        self.text = text
+        self.names = []
+        self.sentences = split_sentences(text)
+        self.mentions = defaultdict(list)
+
+        patterns = {}
+
+        def add_pattern(pattern, node, kind):
+            pattern = fold(pattern.strip())
+            if pattern:
+                patterns.setdefault(pattern, []).append((node, kind))
+
+        seen = set()
+        for entity in entities:
+            key = name_key(entity['name'])
+            if key in seen:
+                continue
+            seen.add(key)
+            node = len(self.names)
+            self.names.append(entity['name'])
+
+            add_pattern(entity['name'], node, 'name')
+            for alias in entity.get('aliases') or ():
+                add_pattern(alias, node, 'alias')
+            if include_name_words:
+                for word in name_words(entity['name']):
+                    add_pattern(word, node, 'word')
+
+        pattern_list = list(patterns)
+        automaton = AhoCorasick(pattern_list)
+        folded = fold(text)
+        sentence_starts = [start for start, _ in self.sentences]
+
+        for start, end, pattern_id in automaton.search(folded):
+            if start > 0 and folded[start - 1].isalnum():
+                continue
+            if end < len(folded) and folded[end].isalnum():
+                continue
+
+            sentence = bisect_right(sentence_starts, start) - 1
+            if sentence < 0 or start >= self.sentences[sentence][1]:
+                sentence = None
+
+            for node, kind in patterns[pattern_list[pattern_id]]:
+                mention = (start, end, sentence, kind)
+                self.mentions[node].append(mention)
+
+        # Drop matches nested inside a longer match for the same entity, so a
+        # full-name mention is not reported again as its individual words
+        for node, found in self.mentions.items():
+            found.sort(key=lambda m: (m[0], -m[1], MATCH_KINDS.index(m[3])))
+            covered_until = -1
+            kept = []
+            for mention in found:
+                if mention[0] < covered_until:
+                    continue
+                kept.append(mention)
+                covered_until = mention[1]
+            self.mentions[node] = kept
+
+        self.entities_by_sentence = defaultdict(set)
+        for node, found in self.mentions.items():
+            for _, _, sentence, _ in found:
+                if sentence is not None:
+                    self.entities_by_sentence[sentence].add(node)
+
+        self._node_by_key = {name_key(name): node for node, name in enumerate(self.names)}
+
+    def node(self, name):
+        return self._node_by_key.get(name_key(name))
+
+    def sentence_text(self, sentence):
+        start, end = self.sentences[sentence]
+        return self.text[start:end].strip()
+
+    def sentences_for(self, name):
+        """Sorted sentence indices that mention an entity"""
+        node = self.node(name)
+        if node is None:
+            return []
+        return sorted({m[2] for m in self.mentions.get(node, ()) if m[2] is not None})
+
+    def co_occurrences(self):
+        """Yield (sentence index, sorted entity nodes) for sentences mentioning two or more entities"""
+        for sentence in sorted(self.entities_by_sentence):
+            nodes = self.entities_by_sentence[sentence]
+            if len(nodes) > 1:
+                yield sentence, sorted(nodes)
+
+    def excerpts_for_pairs(self, pairs, per_entity=2):
+        """
+        Sentences relevant to candidate pairs, in document order
+
+        Mirrors _extractRelevantExcerpts: for each pair, the first
+        per_entity sentences mentioning either entity.
+        """
+        selected = set()
+        for source, target in pairs:
+            relevant = sorted(set(self.sentences_for(source)) | set(self.sentences_for(target)))
+            selected.update(relevant[:per_entity])
+        return [self.sentence_text(sentence) for sentence in sorted(selected)]
+
+    def select_excerpts(self, max_chars):
+        """
+        Pick the most informative sentences within a character budget
+
+        Sentences mentioning more distinct entities rank first; the
+        chosen sentences are returned in document order.
+        """
+        ranked = sorted(
+            self.entities_by_sentence,
+            key=lambda sentence: (-len(self.entities_by_sentence[sentence]), sentence)
+        )
+        chosen = []
+        used = 0
+        for sentence in ranked:
+            length = len(self.sentence_text(sentence)) + 2
+            if used + length > max_chars:
+                continue
+            chosen.append(sentence)
+            used += length
+        return [self.sentence_text(sentence) for sentence in sorted(chosen)]
+
+    def to_dict(self):
+        """Mention offsets per entity, for UI highlighting"""
+        return {
+            'sentences': [{'start': start, 'end': end} for start, end in self.sentences],
+            'mentions': {
+                self.names[node]: [
+                    {'start': start, 'end': end, 'sentence': sentence, 'match': kind}
+                    for start, end, sentence, kind in found
+                ]
+                for node, found in sorted(self.mentions.items())
+            }
+        }
+
+
+class MentionIndexCache:
+    """
+    Small LRU of mention indexes keyed on (network, network version, document hash)
+
+    Versions of stored networks are (created_at, version) pairs, as in
+    GraphCache, so a re-created network never reuses an old index.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+            return index
+
+    def _remember(self, key, index):
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, network_id, version, entities, text):
+        """Return the cached index for this network state and document, building it if needed"""
+        key = (network_id, version, hashlib.sha256(text.encode('utf-8')).hexdigest())
+        index = self._lookup(key)
+        if index is None:
+            index = MentionIndex(entities, text)
+            self._remember(key, index)
+        return index
+
+    def for_network(self, store, network_id, text):
+        """
+        Index of text for the current version of a stored network, or None if it does not exist
+
+        The network's entities and alias table are only read, from a
+        store snapshot, when no index is cached for its version. Merged
+        names are matched as aliases of the entity they were merged into.
+        """
+        state = store.network_version(network_id)
+        if state is None:
+            return None
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        index = self._lookup((network_id, (state['created_at'], state['version']), digest))
+        if index is not None:
+            return index
+
+        with store.snapshot(network_id) as view:
+            if view is None:
+                return None
+            version = (view['created_at'], view['version'])
+            index = MentionIndex(with_aliases(view['entities'], store.aliases(network_id)), text)
+        self._remember((network_id, version, digest), index)
+        return index
@@ -0,0 +1,374 @@
+"""
+Metrics
+Prometheus counters, gauges and histograms rendered in the text exposition format
+
+Metrics live in a MetricsRegistry and are updated in place on the hot
+path (one dict lookup and a lock per update). Values that other
+components already count, such as cache hit/miss totals, are read at
+scrape time through collector callbacks instead of being duplicated.
+
+Under gunicorn every worker has its own registry. With a metrics
+directory configured, each worker periodically writes its samples to
+<dir>/metrics-<pid>-<start time>.json and a scrape of any worker sums
+the files of all live workers, so /api/metrics reports the whole
+server. The process start time in the name tells a live worker from a
+file left by an earlier process that had the same PID, e.g. before a
+container restart. Collectors
+registered as shared (e.g. sizes of a store every worker reads) are
+evaluated once by the scraping worker and never summed.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Request and stage latencies in seconds
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Seconds between writes of a worker's samples to the metrics directory
+FLUSH_INTERVAL_SECONDS = 5.0
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def family(name, kind, help_text, samples):
+    """
+    Build a metric family for a collector callback
+
+    Args:
+        kind: 'counter' or 'gauge'
+        samples: iterable of (labels dict, value)
+    """
+    return {
+        'name': name,
+        'type': kind,
+        'help': help_text,
+        'samples': [(name, tuple(sorted(labels.items())), value) for labels, value in samples]
+    }
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[position] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the wall time of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        """Return the time series for one combination of label values"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self):
+        with self._lock:
+            items = list(self._children.items())
+        for key, child in items:
+            yield tuple(zip(self.labelnames, key)), child
+
+    def collect(self):
+        return {
+            'name': self.name,
+            'type': self.kind,
+            'help': self.help,
+            'samples': [(self.name, labels, child.value) for labels, child in self._series()]
+        }
+
+
+class Counter(_Metric):
+    """Monotonically increasing count; name it with a _total suffix"""
+    kind = 'counter'
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def collect(self):
+        samples = []
+        for labels, child in self._series():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', labels + (('le', _format_value(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return {'name': self.name, 'type': self.kind, 'help': self.help, 'samples': samples}
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(families):
+    """Render metric families in the Prometheus text exposition format"""
+    lines = []
+    for metric in families:
+        lines.append(f'# HELP {metric["name"]} {metric["help"]}')
+        lines.append(f'# TYPE {metric["name"]} {metric["type"]}')
+        for sample_name, labels, value in metric['samples']:
+            if labels:
+                rendered = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f'{sample_name}{{{rendered}}} {_format_value(value)}')
+            else:
+                lines.append(f'{sample_name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def merge(snapshots):
+    """Sum the samples of families with the same name across worker snapshots"""
+    merged = {}
+    for families in snapshots:
+        for metric in families:
+            target = merged.setdefault(metric['name'], {**metric, 'samples': {}})
+            for sample_name, labels, value in metric['samples']:
+                key = (sample_name, tuple(tuple(pair) for pair in labels))
+                target['samples'][key] = target['samples'].get(key, 0) + value
+    return [
+        {**metric, 'samples': [(name, labels, value) for (name, labels), value in metric['samples'].items()]}
+        for metric in merged.values()
+    ]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid):
+    """Start time of a process in clock ticks since boot, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='ascii', errors='replace') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses; fields resume after the last ')'
+    fields = stat[stat.rfind(')') + 2:].split()
+    return fields[19] if len(fields) > 19 else None
+
+
+def _worker_alive(pid, start):
+    """True if pid is running and, when start is known, is the process that started then"""
+    if not _pid_alive(pid):
+        return False
+    return start is None or _process_start(pid) == start
+
+
+class MetricsRegistry:
+    """
+    Metrics of one process, optionally aggregated across workers
+
+    Args:
+        directory: Directory for per-worker snapshot files (None reports
+            this process only)
+        flush_interval: Minimum seconds between snapshot writes
+    """
+
+    def __init__(self, directory=None, flush_interval=FLUSH_INTERVAL_SECONDS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._collectors = []
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def register_collector(self, collect_fn, shared=False):
+        """
+        Add a callback returning metric families (see family) at scrape time
+
+        Args:
+            shared: The values describe state common to all workers, so
+                they are reported once rather than summed per worker
+        """
+        self._collectors.append((collect_fn, shared))
+
+    def _collect(self, shared):
+        families = [] if shared else [metric.collect() for metric in self._metrics]
+        for collect_fn, is_shared in self._collectors:
+            if is_shared != shared:
+                continue
+            try:
+                families.extend(collect_fn())
+            except Exception as e:
+                logger.warning(f'Metrics collector failed: {e}')
+        return families
+
+    def _snapshot_path(self):
+        pid = os.getpid()
+        start = _process_start(pid)
+        name = f'metrics-{pid}-{start}.json' if start is not None else f'metrics-{pid}.json'
+        return os.path.join(self.directory, name)
+
+    def flush(self):
+        """Write this worker's samples to the metrics directory"""
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self._last_flush = time.monotonic()
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._collect(shared=False), f)
+                os.replace(tmp_path, self._snapshot_path())
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def maybe_flush(self):
+        """flush() if the last write is older than flush_interval"""
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f'Could not write metrics snapshot: {e}')
+
+    def _worker_snapshots(self):
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            path = os.path.join(self.directory, name)
+            pid, _, start = name[len('metrics-'):-len('.json')].partition('-')
+            try:
+                pid = int(pid)
+            except ValueError:
+                continue
+            if not _worker_alive(pid, start or None):
+                # Counters of exited workers disappear; Prometheus treats that as a reset
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Exposition text for this process, or for all workers with a directory"""
+        if self.directory:
+            self.flush()
+            families = merge(self._worker_snapshots())
+        else:
+            families = self._collect(shared=False)
+        return render(families + self._collect(shared=True))
+
+
+def create_metrics_registry():
+    """Create the metrics registry configured by the environment"""
+    directory = os.getenv('METRICS_DIR', '.cache/metrics') or None
+    flush_interval = float(os.getenv('METRICS_FLUSH_SECONDS', str(FLUSH_INTERVAL_SECONDS)))
+    logger.info(f'Metrics: {"aggregated across workers via " + directory if directory else "per process"}')
+    return MetricsRegistry(directory, flush_interval)
@@ -0,0 +1,518 @@
+"""
+Network Analytics
+Community detection and centrality computed on the server
+
+Python counterpart of detectCommunities in advanced-layouts.js, which
+finds connected components in the browser on every layout switch.
+Here a network is converted once per version into an undirected graph
+in compressed sparse row (CSR) form: node ids are positions in the
+entity list, indptr[i]:indptr[i + 1] delimits the neighbours of node i
+in indices. Vectorized passes (degree, PageRank, modularity) work on
+the numpy arrays directly; the traversals (Louvain, label propagation,
+betweenness) walk plain lists made from them.
+
+Relationships are treated as undirected, as in the visualizer:
+"A paid B" and "B paid A" connect the same two entities.
+
+GraphCache keeps the graph of the latest version of recently used
+networks together with everything computed on it, so repeated requests
+for the same version are lookups.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from network_store import name_key
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ('louvain', 'label_propagation')
+
+# Betweenness is computed exactly up to this many nodes; larger graphs
+# use this many randomly sampled BFS sources (Brandes-Pich estimate)
+DEFAULT_BETWEENNESS_SAMPLES = 100
+
+# Breadth-first searches run together until their state (one cell per
+# source and node) reaches this size
+BETWEENNESS_BATCH_CELLS = 1 << 21
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_MAX_ITERATIONS = 100
+
+# Local-moving passes per Louvain level and levels in total
+LOUVAIN_MAX_PASSES = 20
+LOUVAIN_MAX_LEVELS = 10
+
+LABEL_PROPAGATION_MAX_ITERATIONS = 30
+
+# Fixed seed so the same network version always gives the same answer
+RANDOM_SEED = 42
+
+
+class CSRGraph:
+    """
+    Undirected simple graph in compressed sparse row form
+
+    Attributes:
+        names: entity name of each node id
+        index: name_key -> node id
+        indptr, indices: CSR adjacency; every edge is stored in both directions
+        degree: number of neighbours per node
+        edge_count: number of undirected edges
+    """
+
+    def __init__(self, names, index, indptr, indices):
+        self.names = names
+        self.index = index
+        self.indptr = indptr
+        self.indices = indices
+        self.degree = np.diff(indptr)
+        self.edge_count = len(indices) // 2
+        self._lists = None
+
+    @classmethod
+    def from_network(cls, entities, relationships):
+        """Build from entity and relationship dicts; loops and dangling edges are dropped"""
+        names = []
+        index = {}
+        for entity in entities:
+            key = name_key(entity['name'])
+            if key not in index:
+                index[key] = len(names)
+                names.append(entity['name'])
+
+        sources = []
+        targets = []
+        for rel in relationships:
+            source = index.get(name_key(rel['source']))
+            target = index.get(name_key(rel['target']))
+            if source is None or target is None or source == target:
+                continue
+            sources.append(source)
+            targets.append(target)
+
+        return cls.from_edges(names, index, sources, targets)
+
+    @classmethod
+    def from_edges(cls, names, index, sources, targets):
+        """Build from parallel lists of endpoint ids; duplicate edges are merged"""
+        size = len(names)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        pairs = np.unique(np.minimum(sources, targets) * size + np.maximum(sources, targets))
+        low, high = pairs // size, pairs % size
+
+        rows = np.concatenate([low, high])
+        columns = np.concatenate([high, low])
+        order = np.lexsort((columns, rows))
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+        return cls(names, index, indptr, columns[order].astype(np.int32))
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    def rows(self):
+        """Source node of every stored (directed) arc, aligned with indices"""
+        return np.repeat(np.arange(self.node_count, dtype=np.int32), self.degree)
+
+    def lists(self):
+        """indptr and indices as Python lists, for loops that index them element by element"""
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.indices.tolist())
+        return self._lists
+
+
+def pagerank(graph, damping=PAGERANK_DAMPING, tolerance=PAGERANK_TOLERANCE,
+             max_iterations=PAGERANK_MAX_ITERATIONS):
+    """PageRank by power iteration; isolated nodes spread their rank evenly"""
+    size = graph.node_count
+    if size == 0:
+        return np.zeros(0)
+
+    rows = graph.rows()
+    degree = graph.degree.astype(np.float64)
+    inverse_degree = np.divide(1.0, degree, out=np.zeros(size), where=degree > 0)
+    isolated = degree == 0
+
+    rank = np.full(size, 1.0 / size)
+    for _ in range(max_iterations):
+        share = rank * inverse_degree
+        updated = np.bincount(graph.indices, weights=share[rows], minlength=size)
+        updated = damping * (updated + rank[isolated].sum() / size) + (1.0 - damping) / size
+        error = np.abs(updated - rank).sum()
+        rank = updated
+        if error < size * tolerance:
+            break
+    return rank
+
+
+def _frontier_arcs(graph, flat_nodes, size):
+    """
+    Expand (batch row * size + node) ids into one entry per outgoing arc
+
+    Returns:
+        (flat id of the arc source, flat id of the arc target), both in
+        the batch row of the source
+    """
+    nodes = flat_nodes % size
+    starts = graph.indptr[nodes]
+    counts = graph.indptr[nodes + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    sources = np.repeat(flat_nodes, counts)
+    return sources, sources - np.repeat(nodes, counts) + graph.indices[offsets]
+
+
+def betweenness(graph, samples=DEFAULT_BETWEENNESS_SAMPLES, seed=RANDOM_SEED):
+    """
+    Normalized betweenness centrality (Brandes)
+
+    Sources are processed in batches whose breadth-first searches
+    advance together, one array operation per level, over a flat
+    (batch row * node count + node) state. With samples set and smaller
+    than the graph, only that many random sources are traversed and the
+    sums are scaled up, which estimates the exact values at a fraction
+    of the cost.
+
+    Returns:
+        (array of centralities in [0, 1], number of sources traversed)
+    """
+    size = graph.node_count
+    centrality = np.zeros(size)
+    if size < 3 or graph.edge_count == 0:
+        return centrality, 0
+
+    if samples and samples < size:
+        sources = np.array(sorted(random.Random(seed).sample(range(size), samples)))
+    else:
+        sources = np.arange(size)
+
+    batch = max(1, BETWEENNESS_BATCH_CELLS // size)
+    for first in range(0, len(sources), batch):
+        rows = sources[first:first + batch]
+        cells = len(rows) * size
+        roots = np.arange(len(rows)) * size + rows
+        distance = np.full(cells, -1, dtype=np.int32)
+        sigma = np.zeros(cells)
+        distance[roots] = 0
+        sigma[roots] = 1.0
+
+        levels = [roots]
+        while True:
+            arc_sources, arc_targets = _frontier_arcs(graph, levels[-1], size)
+            unseen = distance[arc_targets] < 0
+            reached = np.unique(arc_targets[unseen])
+            if not len(reached):
+                break
+            distance[reached] = len(levels)
+            on_path = distance[arc_targets] == len(levels)
+            sigma += np.bincount(arc_targets[on_path], weights=sigma[arc_sources[on_path]], minlength=cells)
+            levels.append(reached)
+
+        delta = np.zeros(cells)
+        for depth in range(len(levels) - 1, 0, -1):
+            arc_sources, arc_targets = _frontier_arcs(graph, levels[depth], size)
+            back = distance[arc_targets] == depth - 1
+            arc_sources, arc_targets = arc_sources[back], arc_targets[back]
+            weights = sigma[arc_targets] / sigma[arc_sources] * (1.0 + delta[arc_sources])
+            delta += np.bincount(arc_targets, weights=weights, minlength=cells)
+
+        delta[roots] = 0.0
+        centrality += delta.reshape(len(rows), size).sum(axis=0)
+
+    # Each unordered pair is counted from both ends over all sources
+    scale = size / len(sources) / ((size - 1) * (size - 2))
+    return centrality * scale, len(sources)
+
+
+def _move_nodes(indptr, indices, weights, total_weight, resolution):
+    """Louvain local moving: move nodes to the neighbouring community with the best modularity gain"""
+    size = len(indptr) - 1
+    degree = [sum(weights[indptr[node]:indptr[node + 1]]) for node in range(size)]
+    community = list(range(size))
+    community_degree = degree[:]
+
+    for _ in range(LOUVAIN_MAX_PASSES):
+        moved = 0
+        for node in range(size):
+            start, end = indptr[node], indptr[node + 1]
+            if start == end:
+                continue
+            current = community[node]
+            links = {}
+            for neighbor, weight in zip(indices[start:end], weights[start:end]):
+                if neighbor != node:
+                    target = community[neighbor]
+                    links[target] = links.get(target, 0.0) + weight
+
+            node_degree = degree[node]
+            community_degree[current] -= node_degree
+            penalty = resolution * node_degree / total_weight
+            best = current
+            best_gain = links.get(current, 0.0) - community_degree[current] * penalty
+            for target, weight in links.items():
+                gain = weight - community_degree[target] * penalty
+                if gain > best_gain:
+                    best, best_gain = target, gain
+            community_degree[best] += node_degree
+            if best != current:
+                community[node] = best
+                moved += 1
+        if not moved:
+            break
+    return community
+
+
+def _aggregate(indptr, indices, weights, community, size):
+    """Collapse each community into one node; internal edges become self-loop weight"""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    keys, inverse = np.unique(community[rows] * size + community[indices], return_inverse=True)
+    summed = np.bincount(inverse, weights=weights)
+    aggregated_indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // size, minlength=size), out=aggregated_indptr[1:])
+    return aggregated_indptr, keys % size, summed
+
+
+def louvain(graph, resolution=1.0):
+    """Louvain modularity optimization; returns a community id per node"""
+    membership = np.arange(graph.node_count)
+    if graph.edge_count == 0:
+        return membership
+
+    indptr, indices = graph.indptr, graph.indices
+    weights = np.ones(len(indices))
+    total_weight = float(weights.sum())
+    for _ in range(LOUVAIN_MAX_LEVELS):
+        community = _move_nodes(indptr.tolist(), indices.tolist(), weights.tolist(), total_weight, resolution)
+        labels, community = np.unique(community, return_inverse=True)
+        if len(labels) == len(indptr) - 1:
+            break
+        membership = community[membership]
+        indptr, indices, weights = _aggregate(indptr, indices, weights, community, len(labels))
+    return membership
+
+
+def label_propagation(graph, max_iterations=LABEL_PROPAGATION_MAX_ITERATIONS, seed=RANDOM_SEED):
+    """Asynchronous label propagation; returns a community id per node"""
+    size = graph.node_count
+    indptr, indices = graph.lists()
+    labels = list(range(size))
+    order = [node for node in range(size) if indptr[node] != indptr[node + 1]]
+    rng = random.Random(seed)
+
+    for _ in range(max_iterations):
+        rng.shuffle(order)
+        changed = 0
+        for node in order:
+            counts = {}
+            for neighbor in indices[indptr[node]:indptr[node + 1]]:
+                label = labels[neighbor]
+                counts[label] = counts.get(label, 0) + 1
+            best = max(counts.values())
+            if counts.get(labels[node]) == best:
+                continue
+            labels[node] = rng.choice([label for label, count in counts.items() if count == best])
+            changed += 1
+        if not changed:
+            break
+    return np.asarray(labels, dtype=np.int64)
+
+
+def renumber_communities(membership):
+    """Relabel communities 0, 1, ... by decreasing size (ties by first member)"""
+    if len(membership) == 0:
+        return membership, np.zeros(0, dtype=np.int64)
+    labels, first, inverse, sizes = np.unique(membership, return_index=True, return_inverse=True,
+                                              return_counts=True)
+    order = np.lexsort((first, -sizes))
+    rank = np.empty(len(labels), dtype=np.int64)
+    rank[order] = np.arange(len(labels))
+    return rank[inverse], sizes[order]
+
+
+def modularity(graph, membership, resolution=1.0):
+    """Newman modularity of a partition"""
+    arcs = len(graph.indices)
+    if arcs == 0:
+        return 0.0
+    count = int(membership.max()) + 1
+    row_community = membership[graph.rows()]
+    internal = np.bincount(
+        row_community, weights=row_community == membership[graph.indices], minlength=count
+    )
+    totals = np.bincount(membership, weights=graph.degree, minlength=count)
+    return float((internal / arcs - resolution * (totals / arcs) ** 2).sum())
+
+
+def detect_communities(graph, algorithm='louvain', resolution=1.0):
+    """Community id per node, numbered by decreasing community size"""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown algorithm: {algorithm}')
+    started = time.perf_counter()
+    if algorithm == 'louvain':
+        membership = louvain(graph, resolution)
+    else:
+        membership = label_propagation(graph)
+    membership, sizes = renumber_communities(membership)
+    logger.info(
+        f'Community detection: {len(sizes)} communities ({algorithm}) over {graph.node_count} nodes '
+        f'in {time.perf_counter() - started:.2f}s'
+    )
+    return membership
+
+
+def analyze_network(graph, algorithm='louvain', resolution=1.0,
+                    betweenness_samples=DEFAULT_BETWEENNESS_SAMPLES, membership=None):
+    """
+    Communities and centralities of every node
+
+    Args:
+        membership: communities already found by detect_communities with
+            the same algorithm and resolution, if any
+
+    Returns:
+        {
+            'algorithm', 'modularity',
+            'communities': [{'id', 'size'}] largest first,
+            'nodes': [{'name', 'community', 'degree', 'pagerank', 'betweenness'}],
+            'metadata': {'nodes', 'edges', 'betweenness_sources', 'betweenness_exact', 'seconds'}
+        }
+    """
+    seconds = {}
+    if membership is None:
+        started = time.perf_counter()
+        membership = detect_communities(graph, algorithm, resolution)
+        seconds['communities'] = time.perf_counter() - started
+    sizes = np.bincount(membership) if len(membership) else np.zeros(0, dtype=np.int64)
+
+    started = time.perf_counter()
+    ranks = pagerank(graph)
+    seconds['pagerank'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    centrality, sources = betweenness(graph, betweenness_samples)
+    seconds['betweenness'] = time.perf_counter() - started
+
+    nodes = [
+        {
+            'name': name,
+            'community': community,
+            'degree': degree,
+            'pagerank': round(rank, 8),
+            'betweenness': round(between, 8)
+        }
+        for name, community, degree, rank, between in zip(
+            graph.names, membership.tolist(), graph.degree.tolist(), ranks.tolist(), centrality.tolist()
+        )
+    ]
+    total = sum(seconds.values())
+    logger.info(f'Network analytics: {graph.node_count} nodes and {graph.edge_count} edges in {total:.2f}s')
+
+    return {
+        'algorithm': algorithm,
+        'modularity': round(modularity(graph, membership, resolution), 6),
+        'communities': [{'id': community, 'size': size} for community, size in enumerate(sizes.tolist())],
+        'nodes': nodes,
+        'metadata': {
+            'nodes': graph.node_count,
+            'edges': graph.edge_count,
+            'betweenness_sources': sources,
+            'betweenness_exact': sources == graph.node_count,
+            'seconds': {**{key: round(value, 4) for key, value in seconds.items()}, 'total': round(total, 4)}
+        }
+    }
+
+
+class GraphCache:
+    """
+    CSR graphs of the latest version of recently used networks
+
+    Results computed on a graph are memoized with it and dropped together
+    when the network changes.
+
+    Args:
+        max_networks: Networks kept before the least recently used is evicted
+    """
+
+    def __init__(self, max_networks=8):
+        self.max_networks = max_networks
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, store, network_id):
+        """
+        Return the cache entry for the current version, building the graph if needed
+
+        Returns:
+            {'created_at', 'updated_at', 'version', 'graph', 'results'}, or
+            None if the network does not exist
+        """
+        state = store.network_version(network_id)
+        if state is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(network_id)
+            if entry is not None and (entry['created_at'], entry['version']) == (state['created_at'], state['version']):
+                self._entries.move_to_end(network_id)
+                return entry
+
+        started = time.perf_counter()
+        with store.snapshot(network_id) as view:
+            if view is None:
+                return None
+            graph = CSRGraph.from_network(view['entities'], view['relationships'])
+            entry = {
+                'created_at': view['created_at'],
+                'updated_at': view['updated_at'],
+                'version': view['version'],
+                'graph': graph,
+                'results': {}
+            }
+        logger.debug(
+            f'Built graph of {network_id} v{entry["version"]} ({graph.node_count} nodes, '
+            f'{graph.edge_count} edges) in {time.perf_counter() - started:.3f}s'
+        )
+
+        with self._lock:
+            current = self._entries.get(network_id)
+            # A concurrent request may have cached a newer version meanwhile
+            if current is not None and current['created_at'] == entry['created_at'] \
+                    and current['version'] >= entry['version']:
+                return current
+            self._entries[network_id] = entry
+            self._entries.move_to_end(network_id)
+            while len(self._entries) > self.max_networks:
+                self._entries.popitem(last=False)
+        return entry
+
+    def memoize(self, entry, key, compute):
+        """compute(graph) for the graph of entry, computed once per key"""
+        with self._lock:
+            if key in entry['results']:
+                return entry['results'][key]
+        value = compute(entry['graph'])
+        with self._lock:
+            return entry['results'].setdefault(key, value)
+
+    def result(self, store, network_id, key, compute):
+        """
+        compute(graph), memoized per network version under key
+
+        Returns:
+            (cache entry, result), or (None, None) if the network does not exist
+        """
+        entry = self.get(store, network_id)
+        if entry is None:
+            return None, None
+        return entry, self.memoize(entry, key, compute)
+
+    def discard(self, network_id):
+        with self._lock:
+            self._entries.pop(network_id, None)
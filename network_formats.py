@@ -0,0 +1,312 @@
+"""
+Network Formats
+Streaming writers for graph-native export formats
+
+Every writer takes the entity and relationship iterators of a store
+snapshot and yields the encoded file in chunks of about
+STREAM_CHUNK_BYTES, so memory stays bounded whatever the network size:
+
+    graphml  GraphML XML (Gephi, Cytoscape, yEd, networkx)
+    gexf     GEXF 1.3 XML (Gephi)
+    csv      node or edge list
+    parquet  node or edge table, one row group per ARROW_BATCH_ROWS rows
+    arrow    node or edge table in the Arrow IPC stream format
+
+Nodes are identified by name_key(name), the store's identity for an
+entity, so edges can reference their endpoints without a lookup table
+of the whole network. Parquet and Arrow need pyarrow
+(pip install pyarrow); the other formats only use the standard library.
+"""
+
+import csv
+import io
+import logging
+
+from network_store import ENTITY_COLUMNS, RELATIONSHIP_COLUMNS, name_key
+from serialization import STREAM_CHUNK_BYTES
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Format -> (mimetype, file extension, True if one file holds only nodes or edges)
+FORMATS = {
+    'graphml': ('application/graphml+xml', 'graphml', False),
+    'gexf': ('application/gexf+xml', 'gexf', False),
+    'csv': ('text/csv', 'csv', True),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', True),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows', True)
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+TABLES = ('nodes', 'edges')
+
+NODE_COLUMNS = ('id',) + ENTITY_COLUMNS
+EDGE_COLUMNS = RELATIONSHIP_COLUMNS
+
+# Rows per Arrow record batch and Parquet row group
+ARROW_BATCH_ROWS = 65536
+
+# Markup characters escaped for element text and double-quoted attributes;
+# characters XML 1.0 does not allow, which model output occasionally
+# contains, are dropped
+XML_ESCAPES = str.maketrans({
+    **{chr(code): None for code in (*range(0x09), 0x0b, 0x0c, *range(0x0e, 0x20), 0xfffe, 0xffff)},
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\t': '&#9;', '\n': '&#10;', '\r': '&#13;'
+})
+
+# Attribute declarations: (column, GraphML type, GEXF type)
+NODE_ATTRIBUTES = (('type', 'string', 'string'), ('importance', 'int', 'integer'), ('description', 'string', 'string'))
+EDGE_ATTRIBUTES = (
+    ('type', 'string', 'string'), ('status', 'string', 'string'), ('description', 'string', 'string'),
+    ('value', 'string', 'string'), ('date', 'string', 'string')
+)
+
+
+def available(format_name):
+    """True if the writer for format_name can run in this installation"""
+    return format_name not in COLUMNAR_FORMATS or pyarrow is not None
+
+
+def _xml(value):
+    return str(value).translate(XML_ESCAPES)
+
+
+def _chunked(pieces):
+    """Join string pieces into UTF-8 chunks of about STREAM_CHUNK_BYTES"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def node_rows(entities):
+    """Tuples in NODE_COLUMNS order"""
+    for entity in entities:
+        yield (name_key(entity['name']),) + tuple(entity.get(column) for column in ENTITY_COLUMNS)
+
+
+def edge_rows(relationships):
+    """Tuples in EDGE_COLUMNS order, endpoints given as node ids"""
+    for rel in relationships:
+        yield (name_key(rel['source']), name_key(rel['target'])) + tuple(
+            rel.get(column) for column in EDGE_COLUMNS[2:]
+        )
+
+
+def _graphml_pieces(network_id, entities, relationships):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns '
+        'http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n'
+        '<key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+    )
+    for scope, attributes in (('node', NODE_ATTRIBUTES), ('edge', EDGE_ATTRIBUTES)):
+        for column, graphml_type, _ in attributes:
+            yield f'<key id="{scope[0]}_{column}" for="{scope}" attr.name="{column}" attr.type="{graphml_type}"/>\n'
+    yield f'<graph id="{_xml(network_id)}" edgedefault="directed">\n'
+
+    for entity in entities:
+        data = ''.join(
+            f'<data key="n_{column}">{_xml(entity[column])}</data>'
+            for column, _, _ in NODE_ATTRIBUTES if entity.get(column) not in (None, '')
+        )
+        yield (
+            f'<node id="{_xml(name_key(entity["name"]))}">'
+            f'<data key="label">{_xml(entity["name"])}</data>{data}</node>\n'
+        )
+
+    for position, rel in enumerate(relationships):
+        data = ''.join(
+            f'<data key="e_{column}">{_xml(rel[column])}</data>'
+            for column, _, _ in EDGE_ATTRIBUTES if rel.get(column) not in (None, '')
+        )
+        yield (
+            f'<edge id="e{position}" source="{_xml(name_key(rel["source"]))}" '
+            f'target="{_xml(name_key(rel["target"]))}">{data}</edge>\n'
+        )
+    yield '</graph>\n</graphml>\n'
+
+
+def iter_graphml(network_id, network):
+    """GraphML document of a snapshot, in chunks"""
+    return _chunked(_graphml_pieces(network_id, network['entities'], network['relationships']))
+
+
+def _gexf_attvalues(item, attributes):
+    values = [
+        f'<attvalue for="{position}" value="{_xml(item[column])}"/>'
+        for position, (column, _, _) in enumerate(attributes)
+        if item.get(column) not in (None, '')
+    ]
+    return f'<attvalues>{"".join(values)}</attvalues>' if values else ''
+
+
+def _gexf_pieces(network_id, network):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gexf xmlns="http://gexf.net/1.3" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://gexf.net/1.3 http://gexf.net/1.3/gexf.xsd" version="1.3">\n'
+        f'<meta lastmodifieddate="{_xml(str(network["updated_at"])[:10])}">'
+        f'<creator>Silent Partners</creator><description>{_xml(network_id)}</description></meta>\n'
+        '<graph defaultedgetype="directed" mode="static">\n'
+    )
+    for scope, attributes in (('node', NODE_ATTRIBUTES), ('edge', EDGE_ATTRIBUTES)):
+        yield f'<attributes class="{scope}">\n'
+        for position, (column, _, gexf_type) in enumerate(attributes):
+            yield f'<attribute id="{position}" title="{column}" type="{gexf_type}"/>\n'
+        yield '</attributes>\n'
+
+    yield '<nodes>\n'
+    for entity in network['entities']:
+        yield (
+            f'<node id="{_xml(name_key(entity["name"]))}" label="{_xml(entity["name"])}">'
+            f'{_gexf_attvalues(entity, NODE_ATTRIBUTES)}</node>\n'
+        )
+    yield '</nodes>\n<edges>\n'
+    for position, rel in enumerate(network['relationships']):
+        label = f' label="{_xml(rel["type"])}"' if rel.get('type') else ''
+        yield (
+            f'<edge id="{position}" source="{_xml(name_key(rel["source"]))}" '
+            f'target="{_xml(name_key(rel["target"]))}"{label}>'
+            f'{_gexf_attvalues(rel, EDGE_ATTRIBUTES)}</edge>\n'
+        )
+    yield '</edges>\n</graph>\n</gexf>\n'
+
+
+def iter_gexf(network_id, network):
+    """GEXF 1.3 document of a snapshot, in chunks"""
+    return _chunked(_gexf_pieces(network_id, network))
+
+
+def iter_csv(columns, rows):
+    """CSV with a header row, in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are taken out as they are written"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def take(self):
+        """Bytes written since the last call"""
+        chunk = b''.join(self._chunks)
+        self._chunks.clear()
+        return chunk
+
+
+def _arrow_schema(table):
+    if table == 'nodes':
+        types = {'importance': pyarrow.int64()}
+        columns = NODE_COLUMNS
+    else:
+        types = {}
+        columns = EDGE_COLUMNS
+    return pyarrow.schema([(column, types.get(column, pyarrow.string())) for column in columns])
+
+
+def iter_columnar(format_name, table, rows):
+    """
+    Parquet file or Arrow IPC stream of one table, in chunks
+
+    Rows are converted ARROW_BATCH_ROWS at a time, and the bytes each
+    batch adds are yielded before the next one is read.
+    """
+    if pyarrow is None:
+        raise RuntimeError(f'{format_name} export requires pyarrow (pip install pyarrow)')
+    schema = _arrow_schema(table)
+    sink = _ChunkSink()
+    if format_name == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= ARROW_BATCH_ROWS:
+                writer.write_batch(_record_batch(schema, batch))
+                batch.clear()
+                yield sink.take()
+        if batch:
+            writer.write_batch(_record_batch(schema, batch))
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def _record_batch(schema, rows):
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pyarrow.record_batch(
+        [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def iter_export(format_name, network_id, network, table='nodes'):
+    """
+    Encode a store snapshot in one of FORMATS, yielding bytes chunks
+
+    Args:
+        table: 'nodes' or 'edges' for the formats that hold one table
+    """
+    if format_name == 'graphml':
+        return iter_graphml(network_id, network)
+    if format_name == 'gexf':
+        return iter_gexf(network_id, network)
+
+    if table == 'nodes':
+        columns, rows = NODE_COLUMNS, node_rows(network['entities'])
+    else:
+        columns, rows = EDGE_COLUMNS, edge_rows(network['relationships'])
+    if format_name == 'csv':
+        return iter_csv(columns, rows)
+    return iter_columnar(format_name, table, rows)
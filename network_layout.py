@@ -0,0 +1,375 @@
+"""
+Network Layout
+Node coordinates computed on the server
+
+The visualizer settles a d3 force simulation in the browser on every
+page load, which takes tens of seconds for a few thousand nodes. Here
+the same kind of layout is computed once per network version with a
+vectorized Fruchterman-Reingold simulation over the CSR graph of
+network_analytics:
+
+    - attraction along every edge (d^2 / k)
+    - repulsion (k^2 / d) between all nodes: exact for pairs in the same
+      or adjacent grid cells, through an FFT convolution of the cell
+      counts for everything further away, so each step costs
+      O(nodes + edges + cells log cells) instead of O(nodes^2)
+    - a pull towards the centre that keeps components together
+
+where k is LINK_DISTANCE, the ideal edge length in layout units
+(comparable to d3 pixels). Algorithms:
+
+    force      plain force-directed layout
+    community  nodes additionally pulled towards the centre of their
+               Louvain community; centres are packed on a spiral
+    temporal   x fixed by the earliest relationship date of each entity
+               (undated entities in a column on the right), y by the
+               force simulation
+
+A layout is warm-started from the positions computed for the previous
+version of the same network: known nodes keep their place, new nodes
+start next to their placed neighbours, and far fewer steps are needed.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from network_store import name_key
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ('force', 'community', 'temporal')
+
+# Ideal edge length in layout units
+LINK_DISTANCE = 100.0
+
+# Simulation steps from random positions and from a previous layout
+COLD_ITERATIONS = 150
+WARM_ITERATIONS = 40
+
+# Largest side of the grid used for far-field repulsion
+MAX_GRID_CELLS = 256
+
+# Strength of the linear pull towards the centre. Against the summed
+# k^2 / d repulsion it settles at a density of about GRAVITY / (pi k^2)
+# whatever the node count, and keeps small components at the rim of
+# the main one instead of drifting away
+GRAVITY = 0.5
+
+# Strength of the pull towards the community centre in the community layout
+COMMUNITY_PULL = 0.05
+
+# Distance, in multiples of LINK_DISTANCE, between the undated column of
+# the temporal layout and the latest date
+UNDATED_GAP = 3.0
+
+RANDOM_SEED = 42
+
+# A year, optionally followed by a month: "2013", "2013-05-01", "2009-2015"
+YEAR_MONTH = re.compile(r'\b(1[89]\d\d|2\d\d\d)(?:[-/.](\d{1,2})\b)?')
+
+
+def parse_year(value):
+    """Fractional year of the first date in a free-form date string, or None"""
+    match = YEAR_MONTH.search(str(value or ''))
+    if match is None:
+        return None
+    month = int(match.group(2) or 1)
+    return int(match.group(1)) + (min(max(month, 1), 12) - 1) / 12.0
+
+
+def _far_field_kernel(shape, cell, k):
+    """Repulsion per unit mass at every cell offset, zero within the 3x3 neighbourhood"""
+    width, height = shape
+    dx = np.fft.fftfreq(2 * width, 1.0 / (2 * width))[:, None]
+    dy = np.fft.fftfreq(2 * height, 1.0 / (2 * height))[None, :]
+    distance2 = dx * dx + dy * dy
+    near = (np.abs(dx) <= 1) & (np.abs(dy) <= 1)
+    scale = np.where(near, 0.0, k * k / (cell * np.where(near, 1.0, distance2)))
+    return np.fft.rfft2(dx * scale), np.fft.rfft2(dy * scale)
+
+
+def _repulsion(positions, k):
+    """
+    Repulsive displacement k^2 / d from all other nodes
+
+    Nodes are binned into square cells of at least k. Pairs in the same
+    or adjacent cells are computed exactly; everything further away acts
+    through the node count of its cell, convolved with the force kernel
+    by FFT (a particle-mesh approximation).
+    """
+    size = len(positions)
+    origin = positions.min(axis=0)
+    cell = max(k, float((positions.max(axis=0) - origin).max()) / MAX_GRID_CELLS)
+    cells = np.minimum(((positions - origin) / cell).astype(np.int64), MAX_GRID_CELLS - 1)
+    shape = tuple(int(extent) for extent in cells.max(axis=0) + 1)
+    keys = cells[:, 0] * (shape[1] + 2) + cells[:, 1]
+
+    order = np.argsort(keys, kind='stable')
+    occupied, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    displacement = np.zeros_like(positions)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            wanted = keys + dx * (shape[1] + 2) + dy
+            slot = np.minimum(np.searchsorted(occupied, wanted), len(occupied) - 1)
+            found = occupied[slot] == wanted
+            members = counts[slot[found]]
+            offsets = np.repeat(starts[slot[found]] - (np.cumsum(members) - members), members)
+            first = np.repeat(np.flatnonzero(found), members)
+            second = order[offsets + np.arange(members.sum())]
+
+            distinct = first != second
+            first, second = first[distinct], second[distinct]
+            delta = positions[first] - positions[second]
+            distance2 = np.maximum(np.einsum('ij,ij->i', delta, delta), 1e-4 * k * k)
+            force = (k * k) / distance2
+            displacement[:, 0] += np.bincount(first, weights=delta[:, 0] * force, minlength=size)
+            displacement[:, 1] += np.bincount(first, weights=delta[:, 1] * force, minlength=size)
+
+    if shape[0] > 3 or shape[1] > 3:
+        density = np.zeros((2 * shape[0], 2 * shape[1]))
+        np.add.at(density, (cells[:, 0], cells[:, 1]), 1.0)
+        kernel_x, kernel_y = _far_field_kernel(shape, cell, k)
+        spectrum = np.fft.rfft2(density)
+        field_x = np.fft.irfft2(spectrum * kernel_x, density.shape)
+        field_y = np.fft.irfft2(spectrum * kernel_y, density.shape)
+        displacement[:, 0] += field_x[cells[:, 0], cells[:, 1]]
+        displacement[:, 1] += field_y[cells[:, 0], cells[:, 1]]
+    return displacement
+
+
+def force_directed(graph, positions, iterations, temperature, anchors=None, anchor_pull=0.0, fixed_x=False):
+    """
+    Run the simulation in place and return positions
+
+    Args:
+        positions: (nodes, 2) float array of starting positions
+        temperature: largest step a node may take in the first iteration;
+            it cools geometrically to a tenth of LINK_DISTANCE
+        anchors: optional (nodes, 2) points each node is pulled towards
+        fixed_x: only move nodes vertically
+    """
+    size = graph.node_count
+    if size < 2 or iterations <= 0:
+        return positions
+
+    k = LINK_DISTANCE
+    rows = graph.rows()
+    columns = graph.indices
+    final_temperature = 0.1 * k
+    cooling = (final_temperature / temperature) ** (1.0 / iterations) if temperature > final_temperature else 1.0
+
+    for _ in range(iterations):
+        displacement = _repulsion(positions, k)
+
+        delta = positions[rows] - positions[columns]
+        length = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        pull = delta * (length / k)[:, None]
+        displacement[:, 0] -= np.bincount(rows, weights=pull[:, 0], minlength=size)
+        displacement[:, 1] -= np.bincount(rows, weights=pull[:, 1], minlength=size)
+
+        displacement -= GRAVITY * (positions - positions.mean(axis=0))
+        if anchors is not None:
+            displacement -= anchor_pull * (positions - anchors)
+        if fixed_x:
+            displacement[:, 0] = 0.0
+
+        step = np.sqrt(np.einsum('ij,ij->i', displacement, displacement))
+        scale = np.minimum(step, temperature) / np.maximum(step, 1e-9)
+        positions += displacement * scale[:, None]
+        temperature *= cooling
+    return positions
+
+
+def _initial_positions(graph, previous, rng):
+    """
+    Starting positions, reusing a previous layout where possible
+
+    Returns:
+        (positions, number of nodes placed from the previous layout)
+    """
+    size = graph.node_count
+    radius = LINK_DISTANCE * math.sqrt(max(size, 1)) / 2.0
+    angle = rng.uniform(0, 2 * math.pi, size)
+    distance = radius * np.sqrt(rng.uniform(0, 1, size))
+    positions = np.column_stack([distance * np.cos(angle), distance * np.sin(angle)])
+    if not previous:
+        return positions, 0
+
+    placed = np.zeros(size, dtype=bool)
+    for key, point in zip(previous['keys'], previous['positions']):
+        node = graph.index.get(key)
+        if node is not None:
+            positions[node] = point
+            placed[node] = True
+    reused = int(placed.sum())
+    if reused == 0:
+        return positions, 0
+
+    # New nodes start beside the mean of their placed neighbours
+    rows = graph.rows()
+    useful = placed[graph.indices] & ~placed[rows]
+    neighbor_count = np.bincount(rows[useful], minlength=size)
+    for axis in (0, 1):
+        total = np.bincount(rows[useful], weights=positions[graph.indices[useful], axis], minlength=size)
+        beside = neighbor_count > 0
+        positions[beside, axis] = total[beside] / neighbor_count[beside]
+    jitter = ~placed & (neighbor_count > 0)
+    positions[jitter] += rng.normal(0, LINK_DISTANCE / 2, (int(jitter.sum()), 2))
+    return positions, reused
+
+
+def community_centres(membership):
+    """Centre per community, packed on a sunflower spiral with area proportional to size"""
+    if len(membership) == 0:
+        return np.zeros((0, 2))
+    sizes = np.bincount(membership)
+    # Communities are numbered largest first, so the big ones sit in the middle
+    radius = LINK_DISTANCE * np.sqrt(np.cumsum(sizes) - sizes / 2.0)
+    angle = np.arange(len(sizes)) * math.pi * (3 - math.sqrt(5))
+    return np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+
+
+def temporal_columns(graph, years):
+    """
+    x position per node from its year, undated nodes in a column on the right
+
+    Returns:
+        (x array, timeline dict), or (None, None) when nothing is dated
+    """
+    size = graph.node_count
+    dated = ~np.isnan(years)
+    if not dated.any():
+        return None, None
+    x = np.zeros(size)
+    width = LINK_DISTANCE * max(4.0, math.sqrt(size) * 2)
+    start, end = float(years[dated].min()), float(years[dated].max())
+    span = end - start or 1.0
+    x[dated] = (years[dated] - start) / span * width
+    x[~dated] = width + UNDATED_GAP * LINK_DISTANCE
+    return x, {'from': round(start, 3), 'to': round(end, 3), 'x_from': 0.0, 'x_to': round(width, 2)}
+
+
+def compute_layout(graph, algorithm='force', previous=None, membership=None, years=None, iterations=None):
+    """
+    Lay out a graph
+
+    Args:
+        previous: {'keys', 'positions'} of an earlier layout of the same
+            network, for a warm start
+        membership: community per node (community layout)
+        years: fractional year per node, NaN if undated (temporal layout)
+        iterations: simulation steps; defaults to COLD_ITERATIONS, or
+            WARM_ITERATIONS when a previous layout is reused
+
+    Returns:
+        (positions array of shape (nodes, 2), metadata dict)
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown layout algorithm: {algorithm}')
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(RANDOM_SEED)
+    positions, reused = _initial_positions(graph, previous, rng)
+    warm = reused > 0
+    if iterations is None:
+        iterations = WARM_ITERATIONS if warm else COLD_ITERATIONS
+    temperature = LINK_DISTANCE if warm else LINK_DISTANCE * max(1.0, math.sqrt(graph.node_count) / 4)
+
+    metadata = {}
+    anchors = None
+    fixed_x = False
+    if algorithm == 'community':
+        anchors = community_centres(membership)[membership]
+        if not warm:
+            positions = anchors + rng.normal(0, LINK_DISTANCE, positions.shape)
+        metadata['communities'] = int(membership.max()) + 1 if len(membership) else 0
+    elif algorithm == 'temporal':
+        x, timeline = temporal_columns(graph, years)
+        # Without dates there is no time axis; the force layout is used as is
+        if x is not None:
+            positions[:, 0] = x
+            fixed_x = True
+        metadata['timeline'] = timeline
+
+    positions = force_directed(
+        graph, positions, iterations, temperature,
+        anchors=anchors, anchor_pull=COMMUNITY_PULL, fixed_x=fixed_x
+    )
+
+    seconds = time.perf_counter() - started
+    logger.info(
+        f'Layout ({algorithm}): {graph.node_count} nodes, {iterations} iterations'
+        f'{f", {reused} reused" if warm else ""} in {seconds:.2f}s'
+    )
+    metadata.update({
+        'nodes': graph.node_count,
+        'edges': graph.edge_count,
+        'iterations': iterations,
+        'warm_start': warm,
+        'reused_positions': reused,
+        'seconds': round(seconds, 4)
+    })
+    return positions, metadata
+
+
+def entity_years(graph, relationships):
+    """Earliest relationship date of each node as a fractional year (NaN if none)"""
+    years = np.full(graph.node_count, np.nan)
+    for rel in relationships:
+        year = parse_year(rel.get('date'))
+        if year is None:
+            continue
+        for endpoint in (rel['source'], rel['target']):
+            node = graph.index.get(name_key(endpoint))
+            if node is not None and not years[node] <= year:
+                years[node] = year
+    return years
+
+
+class LayoutHistory:
+    """
+    Last computed positions per (network, algorithm), used for warm starts
+
+    Args:
+        max_entries: Layouts kept before the least recently used is evicted
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, network_id, algorithm, created_at):
+        """Previous layout of the same network incarnation, or None"""
+        with self._lock:
+            entry = self._entries.get((network_id, algorithm))
+            if entry is None or entry['created_at'] != created_at:
+                return None
+            return entry
+
+    def put(self, network_id, algorithm, created_at, version, keys, positions):
+        with self._lock:
+            current = self._entries.get((network_id, algorithm))
+            if current is not None and current['created_at'] == created_at and current['version'] > version:
+                return
+            self._entries[(network_id, algorithm)] = {
+                'created_at': created_at,
+                'version': version,
+                'keys': keys,
+                'positions': positions
+            }
+            self._entries.move_to_end((network_id, algorithm))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, network_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == network_id]:
+                del self._entries[key]
@@ -0,0 +1,344 @@
+"""
+Network Paths
+Neighbourhood and path queries answered on the server
+
+Answers "who is within two hops of Z" and "how is X connected to Y"
+without sending the whole network to the browser. A PathIndex is built
+once per network version from a store snapshot. It holds:
+
+    - the CSRGraph of network_analytics (one node id per entity)
+    - the endpoints, type and status of every relationship as integer
+      arrays, so a type/status filter becomes a boolean mask
+    - the entity and relationship dicts, to return the subgraph a query
+      touches
+
+Filtered traversals run on a CSRGraph of the matching relationships,
+built once per filter. Shortest paths use a bidirectional breadth-first
+search that always expands the smaller frontier; k shortest paths use
+Yen's algorithm on top of it, and all simple paths up to a length are
+enumerated depth-first, pruned by the distance to the target.
+
+Relationships are treated as undirected and a path is a sequence of
+entities; every matching relationship between two consecutive entities
+is part of the returned subgraph.
+"""
+
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from network_analytics import CSRGraph
+from network_store import name_key
+
+logger = logging.getLogger(__name__)
+
+# Filtered graphs kept per index before the least recently used is dropped
+MAX_FILTERED_GRAPHS = 8
+
+
+class PathIndex:
+    """
+    Integer-indexed adjacency of a network with the relationships behind it
+
+    Attributes:
+        graph: CSRGraph of all relationships
+        entities: entity dict per node id
+        relationships: relationship dicts in store order
+        sources, targets: node id of each relationship's endpoints (-1 if missing)
+        types, statuses: value per relationship, coded through type_codes / status_codes
+    """
+
+    def __init__(self, graph, entities, relationships, sources, targets, types, statuses, type_codes, status_codes):
+        self.graph = graph
+        self.entities = entities
+        self.relationships = relationships
+        self.sources = sources
+        self.targets = targets
+        self.types = types
+        self.statuses = statuses
+        self.type_codes = type_codes
+        self.status_codes = status_codes
+        size = max(graph.node_count, 1)
+        self.valid = (sources >= 0) & (targets >= 0)
+        self.pairs = np.minimum(sources, targets).astype(np.int64) * size + np.maximum(sources, targets)
+        self._filtered = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_network(cls, graph, entities, relationships):
+        """Build from the snapshot the graph was made from"""
+        nodes = [None] * graph.node_count
+        for entity in entities:
+            node = graph.index.get(name_key(entity['name']))
+            if node is not None and nodes[node] is None:
+                nodes[node] = entity
+
+        relationships = list(relationships)
+        type_codes = {}
+        status_codes = {}
+        sources = np.empty(len(relationships), dtype=np.int32)
+        targets = np.empty(len(relationships), dtype=np.int32)
+        types = np.empty(len(relationships), dtype=np.int32)
+        statuses = np.empty(len(relationships), dtype=np.int32)
+        for position, rel in enumerate(relationships):
+            sources[position] = graph.index.get(name_key(rel['source']), -1)
+            targets[position] = graph.index.get(name_key(rel['target']), -1)
+            types[position] = type_codes.setdefault(rel.get('type'), len(type_codes))
+            statuses[position] = status_codes.setdefault(rel.get('status'), len(status_codes))
+        logger.debug(
+            f'Built path index ({graph.node_count} nodes, {len(relationships)} relationships, '
+            f'{len(type_codes)} types, {len(status_codes)} statuses)'
+        )
+        return cls(graph, nodes, relationships, sources, targets, types, statuses, type_codes, status_codes)
+
+    def node(self, name):
+        """Node id of an entity name, or None"""
+        return self.graph.index.get(name_key(name))
+
+    def allowed(self, types=None, statuses=None):
+        """Boolean mask of the relationships matching the filter"""
+        mask = self.valid.copy()
+        for values, codes, column in ((types, self.type_codes, self.types), (statuses, self.status_codes, self.statuses)):
+            if values:
+                wanted = [codes[value] for value in values if value in codes]
+                mask &= np.isin(column, wanted)
+        return mask
+
+    def filtered_graph(self, types=None, statuses=None):
+        """CSRGraph of the relationships matching the filter, built once per filter"""
+        if not types and not statuses:
+            return self.graph
+        key = (frozenset(types or ()), frozenset(statuses or ()))
+        with self._lock:
+            graph = self._filtered.get(key)
+            if graph is not None:
+                self._filtered.move_to_end(key)
+                return graph
+
+        mask = self.allowed(types, statuses) & (self.sources != self.targets)
+        graph = CSRGraph.from_edges(self.graph.names, self.graph.index, self.sources[mask], self.targets[mask])
+        with self._lock:
+            self._filtered[key] = graph
+            while len(self._filtered) > MAX_FILTERED_GRAPHS:
+                self._filtered.popitem(last=False)
+        return graph
+
+    def subgraph(self, nodes, allowed, pairs=None):
+        """
+        Entities and relationships of a query result
+
+        Args:
+            nodes: node ids to return
+            allowed: relationship mask of the filter
+            pairs: only relationships between these (node, node) pairs;
+                None for every relationship among nodes
+
+        Returns:
+            (entity dicts, relationship dicts)
+        """
+        if pairs is None:
+            members = np.zeros(self.graph.node_count, dtype=bool)
+            members[list(nodes)] = True
+            selected = allowed & members[np.maximum(self.sources, 0)] & members[np.maximum(self.targets, 0)]
+        else:
+            size = max(self.graph.node_count, 1)
+            codes = [min(a, b) * size + max(a, b) for a, b in pairs]
+            selected = allowed & np.isin(self.pairs, codes)
+        return (
+            [self.entities[node] for node in nodes],
+            [self.relationships[position] for position in np.flatnonzero(selected).tolist()]
+        )
+
+
+def _neighbours(graph, nodes):
+    """Sorted distinct neighbours of an array of node ids"""
+    starts = graph.indptr[nodes]
+    counts = graph.indptr[nodes + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    return np.unique(graph.indices[offsets])
+
+
+def ego_network(graph, center, hops, max_nodes):
+    """
+    Nodes within hops of center, nearest first
+
+    Returns:
+        (node ids, distance per returned node, True if max_nodes cut the result)
+    """
+    distance = np.full(graph.node_count, -1, dtype=np.int32)
+    distance[center] = 0
+    nodes = [center]
+    frontier = np.array([center], dtype=np.int64)
+    truncated = False
+    for hop in range(1, hops + 1):
+        neighbours = _neighbours(graph, frontier)
+        frontier = neighbours[distance[neighbours] < 0].astype(np.int64)
+        if len(nodes) + len(frontier) > max_nodes:
+            frontier = frontier[:max_nodes - len(nodes)]
+            truncated = True
+        distance[frontier] = hop
+        nodes.extend(frontier.tolist())
+        if truncated or len(frontier) == 0:
+            break
+    return nodes, [int(distance[node]) for node in nodes], truncated
+
+
+def shortest_path(graph, source, target, blocked_nodes=(), blocked_edges=()):
+    """
+    One shortest path by bidirectional breadth-first search
+
+    Args:
+        blocked_nodes: node ids the path may not visit
+        blocked_edges: (node, node) pairs the path may not use, either direction
+
+    Returns:
+        list of node ids from source to target, or None if unreachable
+    """
+    if source == target:
+        return [source]
+    indptr, indices = graph.lists()
+    forward = {source: None}
+    backward = {target: None}
+    forward_frontier = [source]
+    backward_frontier = [target]
+
+    while forward_frontier and backward_frontier:
+        # Expanding the smaller side keeps the two searches balanced
+        expand_forward = len(forward_frontier) <= len(backward_frontier)
+        frontier = forward_frontier if expand_forward else backward_frontier
+        parents, others = (forward, backward) if expand_forward else (backward, forward)
+
+        following = []
+        meeting = None
+        for node in frontier:
+            for neighbour in indices[indptr[node]:indptr[node + 1]]:
+                if neighbour in parents or neighbour in blocked_nodes:
+                    continue
+                if blocked_edges and (node, neighbour) in blocked_edges:
+                    continue
+                parents[neighbour] = node
+                if neighbour in others:
+                    meeting = neighbour
+                    break
+                following.append(neighbour)
+            if meeting is not None:
+                break
+
+        if meeting is not None:
+            # The first meeting closes a shortest path: every node of this
+            # level is at the same distance from the expanded side, and the
+            # other side's frontier is all at its deepest level
+            path = []
+            node = meeting
+            while node is not None:
+                path.append(node)
+                node = forward[node]
+            path.reverse()
+            node = backward[meeting]
+            while node is not None:
+                path.append(node)
+                node = backward[node]
+            return path
+
+        if expand_forward:
+            forward_frontier = following
+        else:
+            backward_frontier = following
+    return None
+
+
+def k_shortest_paths(graph, source, target, k):
+    """
+    Up to k loopless paths in order of length (Yen's algorithm)
+
+    Returns:
+        list of node id lists
+    """
+    first = shortest_path(graph, source, target)
+    if first is None:
+        return []
+    paths = [first]
+    candidates = []
+    seen = {tuple(first)}
+
+    while len(paths) < k:
+        previous = paths[-1]
+        for spur_index in range(len(previous) - 1):
+            root = previous[:spur_index + 1]
+            blocked_edges = set()
+            for path in paths:
+                if path[:spur_index + 1] == root and len(path) > spur_index + 1:
+                    blocked_edges.add((path[spur_index], path[spur_index + 1]))
+                    blocked_edges.add((path[spur_index + 1], path[spur_index]))
+            spur = shortest_path(graph, root[-1], target, set(root[:-1]), blocked_edges)
+            if spur is None:
+                continue
+            candidate = root[:-1] + spur
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (len(candidate), candidate))
+        if not candidates:
+            break
+        paths.append(heapq.heappop(candidates)[1])
+    return paths
+
+
+def _distances_to(graph, target, limit):
+    """Hop distance of every node to target, or limit + 1 beyond limit"""
+    distance = np.full(graph.node_count, limit + 1, dtype=np.int32)
+    distance[target] = 0
+    frontier = np.array([target], dtype=np.int64)
+    for hop in range(1, limit + 1):
+        neighbours = _neighbours(graph, frontier)
+        frontier = neighbours[distance[neighbours] > limit].astype(np.int64)
+        if len(frontier) == 0:
+            break
+        distance[frontier] = hop
+    return distance.tolist()
+
+
+def simple_paths(graph, source, target, max_length, limit):
+    """
+    Simple paths of at most max_length edges, shortest first
+
+    A branch is only followed while the target is still within reach
+    of the remaining length, so the search never leaves the region
+    between the two entities.
+
+    Returns:
+        (list of node id lists, True if limit cut the result)
+    """
+    if source == target:
+        return [[source]], False
+    indptr, indices = graph.lists()
+    distance = _distances_to(graph, target, max_length)
+    if distance[source] > max_length:
+        return [], False
+
+    paths = []
+    for length in range(distance[source], max_length + 1):
+        path = [source]
+        on_path = {source}
+        stack = [iter(indices[indptr[source]:indptr[source + 1]])]
+        while stack:
+            remaining = length - len(path)
+            for neighbour in stack[-1]:
+                if neighbour in on_path or distance[neighbour] > remaining:
+                    continue
+                if neighbour == target:
+                    if remaining == 0:
+                        paths.append(path + [target])
+                        if len(paths) >= limit:
+                            return paths, True
+                    continue
+                path.append(neighbour)
+                on_path.add(neighbour)
+                stack.append(iter(indices[indptr[neighbour]:indptr[neighbour + 1]]))
+                break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
+    return paths, False
@@ -0,0 +1,1420 @@
+"""
+Network Store
+Storage backends for network data shared by all API workers
+
+Two backends are provided:
+- MemoryNetworkStore: per-process dictionaries (development default)
+- SQLiteNetworkStore: a WAL-mode SQLite file that every gunicorn worker
+  on the host reads and writes, so networks survive restarts and are
+  visible regardless of which worker served the POST
+
+Select the backend with NETWORK_STORE=memory|sqlite and, for SQLite,
+the database file with NETWORK_DB_PATH.
+
+Every change is also appended to a per-network change log, so clients
+can fetch just the items added since a version they already hold.
+"""
+
+import heapq
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 400
+
+# Invalid-item warnings logged per add_data call; the rest are only counted
+MAX_ITEM_WARNINGS = 10
+
+# Change log entries kept per network; older versions are compacted away
+DEFAULT_CHANGE_LOG_LIMIT = 50000
+
+
+def name_key(name):
+    """Return the case-insensitive lookup key for an entity name"""
+    return name.casefold()
+
+
+def edge_key(source, target):
+    """Return the direction-independent lookup key for a relationship"""
+    source_key = name_key(source)
+    target_key = name_key(target)
+    if source_key <= target_key:
+        return (source_key, target_key)
+    return (target_key, source_key)
+
+
+def normalize_entity(entity):
+    """Apply defaults and bounds to an incoming entity"""
+    return {
+        'name': entity['name'],
+        'type': entity.get('type', 'person'),
+        'importance': min(5, max(1, entity.get('importance', 3))),
+        'description': entity.get('description', '')
+    }
+
+
+def normalize_relationship(rel):
+    """Apply defaults to an incoming relationship"""
+    return {
+        'source': rel['source'],
+        'target': rel['target'],
+        'type': rel.get('type', 'business'),
+        'description': rel.get('description', ''),
+        'status': rel.get('status', 'confirmed'),
+        'value': rel.get('value', ''),
+        'date': rel.get('date', '')
+    }
+
+
+def page_query(include=('entities', 'relationships'), entity_fields=None, relationship_fields=None,
+               entity_types=None, min_importance=None, relationship_types=None, statuses=None,
+               date_from=None, date_to=None, after_entity=-1, after_relationship=-1, limit=1000,
+               id_epoch=None):
+    """
+    Build a query for NetworkStore.page_network
+
+    Args:
+        include: Which lists to return ('entities', 'relationships')
+        entity_fields / relationship_fields: Columns to return (None for all);
+            'id' may be requested to get the stable item id
+        entity_types, min_importance: Entity filters
+        relationship_types, statuses, date_from, date_to: Relationship filters
+            (dates compare as ISO strings, inclusive)
+        after_entity / after_relationship: Return items with ids greater than
+            this (-1 to start, None to skip the list)
+        limit: Maximum items per list
+        id_epoch: The page's id_epoch the boundaries were taken from (None
+            on the first page); checked by the caller against the new page
+
+    Raises:
+        ValueError: for unknown field names
+    """
+    for fields, allowed in ((entity_fields, ENTITY_COLUMNS), (relationship_fields, RELATIONSHIP_COLUMNS)):
+        unknown = set(fields or ()) - set(allowed) - {'id'}
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+
+    return {
+        'include': set(include),
+        'entity_fields': list(entity_fields) if entity_fields else list(ENTITY_COLUMNS),
+        'relationship_fields': list(relationship_fields) if relationship_fields else list(RELATIONSHIP_COLUMNS),
+        'entity_types': list(entity_types) if entity_types else None,
+        'min_importance': min_importance,
+        'relationship_types': list(relationship_types) if relationship_types else None,
+        'statuses': list(statuses) if statuses else None,
+        'date_from': date_from,
+        'date_to': date_to,
+        'after_entity': after_entity,
+        'after_relationship': after_relationship,
+        'limit': limit,
+        'id_epoch': id_epoch
+    }
+
+
+def _in_date_range(date, date_from, date_to):
+    if date_from is None and date_to is None:
+        return True
+    if not date:
+        return False
+    return (date_from is None or date >= date_from) and (date_to is None or date <= date_to)
+
+
+class NetworkIndex:
+    """
+    Incrementally maintained index over a single network
+
+    Keeps a casefolded name -> entity map and a set of unordered
+    (source, target) pairs so that duplicate checks on insert do not
+    have to scan the existing entity and relationship lists, plus
+    ascending list positions per entity type and importance and per
+    relationship type and status for filtered, paginated reads.
+    """
+
+    def __init__(self, entities=(), relationships=()):
+        self.reset(entities, relationships)
+
+    def reset(self, entities=(), relationships=()):
+        """Rebuild the index from scratch (after items were removed or renumbered)"""
+        self.entities_by_name = {}
+        self.edges = set()
+        self.entities_by_type = defaultdict(list)
+        self.entities_by_importance = defaultdict(list)
+        self.relationships_by_type = defaultdict(list)
+        self.relationships_by_status = defaultdict(list)
+
+        for position, entity in enumerate(entities):
+            self.add_entity(entity, position)
+        for position, rel in enumerate(relationships):
+            self.add_relationship(rel, position)
+
+    def has_entity(self, name):
+        return name_key(name) in self.entities_by_name
+
+    def get_entity(self, name):
+        return self.entities_by_name.get(name_key(name))
+
+    def add_entity(self, entity, position):
+        self.entities_by_name.setdefault(name_key(entity['name']), entity)
+        self.entities_by_type[entity['type']].append(position)
+        self.entities_by_importance[entity['importance']].append(position)
+
+    def has_relationship(self, source, target):
+        return edge_key(source, target) in self.edges
+
+    def add_relationship(self, rel, position):
+        self.edges.add(edge_key(rel['source'], rel['target']))
+        self.relationships_by_type[rel['type']].append(position)
+        self.relationships_by_status[rel['status']].append(position)
+
+
+def _positions_after(position_lists, after):
+    """Ascending positions greater than after, merged from sorted position lists"""
+    def tail(positions):
+        for i in range(bisect_right(positions, after), len(positions)):
+            yield positions[i]
+    return heapq.merge(*(tail(positions) for positions in position_lists))
+
+
+class NetworkStore:
+    """
+    Base class for network storage backends
+
+    Subclasses provide a writer (see ``_writer``) that exposes set-based
+    existence checks and bulk inserts; the dedup and validation rules
+    live here so every backend behaves identically.
+    """
+
+    def exists(self, network_id):
+        raise NotImplementedError
+
+    def get_network(self, network_id):
+        """Return the full network dict, or None if it does not exist"""
+        raise NotImplementedError
+
+    def list_networks(self):
+        """Return summary dicts for every stored network"""
+        raise NotImplementedError
+
+    def network_version(self, network_id):
+        """
+        Return created_at, updated_at and version of a network, or None
+
+        The version starts at 0 and increases by one with every add_data
+        call that changes the network, so (created_at, version) identifies
+        the network's content.
+        """
+        raise NotImplementedError
+
+    def delete_network(self, network_id):
+        """Delete a network, returning False if it did not exist"""
+        raise NotImplementedError
+
+    def changes_since(self, network_id, since):
+        """
+        Return the entities and relationships added after version since
+
+        The change log keeps at most change_log_limit entries per network.
+        Compaction drops the oldest versions, and log_start is the earliest
+        version the log can still answer from.
+
+        Returns:
+            None if the network does not exist, else a dict with created_at,
+            updated_at, version and log_start, plus 'entities' and
+            'relationships' lists when log_start <= since <= version
+        """
+        raise NotImplementedError
+
+    def page_network(self, network_id, query):
+        """
+        Return one page of filtered, projected entities and relationships
+
+        Items are ordered by a stable integer id. Ids only increase as data
+        is added, so a page boundary (the last id returned) stays valid
+        across writes. A store whose merges renumber ids reports the
+        version of the last renumbering as id_epoch; a boundary taken
+        under another id_epoch no longer points at the same item.
+
+        Args:
+            query: dict built by page_query
+
+        Returns:
+            None if the network does not exist, else a dict with created_at,
+            updated_at, version, id_epoch, entities, relationships and next_entity /
+            next_relationship: the id to continue after, or None when the
+            list is exhausted
+        """
+        raise NotImplementedError
+
+    def snapshot(self, network_id):
+        """
+        Context manager yielding a consistent read view of a network, or None
+
+        The view holds created_at, updated_at, version, entity_count and
+        relationship_count plus lazy 'entities' and 'relationships'
+        iterators, which are only valid inside the with block. Used to
+        stream large networks without materializing them.
+        """
+        raise NotImplementedError
+
+    def _writer(self, network_id):
+        """Context manager yielding a writer for a single transaction"""
+        raise NotImplementedError
+
+    def aliases(self, network_id):
+        """Return the network's alias table as [{'alias', 'canonical'}], or None"""
+        raise NotImplementedError
+
+    def add_data(self, network_id, entities=(), relationships=(), rejected=None, aliases=None):
+        """
+        Add entities and relationships to a network in one transaction
+
+        Creates the network if needed. Invalid items, duplicates and
+        relationships whose endpoints do not exist are skipped. Entities
+        named by an alias count as duplicates of their canonical entity,
+        and relationship endpoints naming an alias are rewritten to it.
+        The version and updated_at only change if something was added.
+
+        Args:
+            rejected: optional list; receives ('entity' | 'relationship',
+                input index, reason) for every skipped item that is not a
+                duplicate
+            aliases: optional {alias name: canonical entity name} to record
+                before adding, e.g. from entity resolution
+
+        Returns:
+            dict with 'added' and 'total' counts and the network 'version'
+        """
+        # Per-item logs are debug only, and warnings about invalid items are
+        # capped per call; formatting them dominates large inserts
+        debug = logger.isEnabledFor(logging.DEBUG)
+        warned = 0
+
+        def warn(message):
+            nonlocal warned
+            warned += 1
+            if warned <= MAX_ITEM_WARNINGS:
+                logger.warning(message)
+
+        with self._writer(network_id) as writer:
+            if aliases:
+                writer.add_aliases(self._flatten_aliases(writer, aliases))
+
+            # Entities
+            candidate_keys = {
+                name_key(e['name']) for e in entities
+                if isinstance(e, dict) and 'name' in e
+            }
+            endpoint_names = {
+                name_key(r[field]) for r in relationships
+                if isinstance(r, dict) and 'source' in r and 'target' in r
+                for field in ('source', 'target')
+            }
+            alias_targets = writer.alias_targets(candidate_keys | endpoint_names)
+            seen = writer.existing_entity_keys(candidate_keys)
+            new_entities = []
+
+            for position, entity in enumerate(entities):
+                if not isinstance(entity, dict) or 'name' not in entity:
+                    warn(f'Invalid entity: {entity}')
+                    if rejected is not None:
+                        rejected.append(('entity', position, 'invalid entity'))
+                    continue
+
+                key = name_key(entity['name'])
+                if key in seen:
+                    if debug:
+                        logger.debug(f'Entity already exists: {entity["name"]}')
+                    continue
+                if key in alias_targets:
+                    if debug:
+                        logger.debug(f'Entity {entity["name"]} is an alias of {alias_targets[key]}')
+                    continue
+
+                seen.add(key)
+                new_entities.append(normalize_entity(entity))
+                if debug:
+                    logger.debug(f'Added entity: {entity["name"]}')
+
+            writer.insert_entities(new_entities)
+
+            # Relationships
+            valid_rels = []
+            for position, rel in enumerate(relationships):
+                if not isinstance(rel, dict) or 'source' not in rel or 'target' not in rel:
+                    warn(f'Invalid relationship: {rel}')
+                    if rejected is not None:
+                        rejected.append(('relationship', position, 'invalid relationship'))
+                    continue
+                if alias_targets:
+                    source = alias_targets.get(name_key(rel['source']), rel['source'])
+                    target = alias_targets.get(name_key(rel['target']), rel['target'])
+                    rel = {**rel, 'source': source, 'target': target}
+                valid_rels.append((position, rel))
+
+            endpoint_keys = set()
+            for _, rel in valid_rels:
+                endpoint_keys.add(name_key(rel['source']))
+                endpoint_keys.add(name_key(rel['target']))
+            known_entities = writer.existing_entity_keys(endpoint_keys)
+            seen_edges = writer.existing_edge_keys(
+                {edge_key(r['source'], r['target']) for _, r in valid_rels}
+            )
+            new_relationships = []
+
+            for position, rel in valid_rels:
+                if name_key(rel['source']) not in known_entities:
+                    warn(f'Source entity not found: {rel["source"]}')
+                    if rejected is not None:
+                        rejected.append(('relationship', position, f'source entity not found: {rel["source"]}'))
+                    continue
+
+                if name_key(rel['target']) not in known_entities:
+                    warn(f'Target entity not found: {rel["target"]}')
+                    if rejected is not None:
+                        rejected.append(('relationship', position, f'target entity not found: {rel["target"]}'))
+                    continue
+
+                key = edge_key(rel['source'], rel['target'])
+                if key in seen_edges:
+                    if debug:
+                        logger.debug(f'Relationship already exists: {rel["source"]} -> {rel["target"]}')
+                    continue
+
+                seen_edges.add(key)
+                new_relationships.append(normalize_relationship(rel))
+                if debug:
+                    logger.debug(f'Added relationship: {rel["source"]} -> {rel["target"]}')
+
+            writer.insert_relationships(new_relationships)
+            if warned > MAX_ITEM_WARNINGS:
+                logger.warning(f'{warned - MAX_ITEM_WARNINGS} more invalid items for {network_id} not logged')
+            if new_entities or new_relationships:
+                writer.touch(datetime.utcnow().isoformat())
+
+            return {
+                'added': {
+                    'entities': len(new_entities),
+                    'relationships': len(new_relationships)
+                },
+                'total': writer.totals(),
+                'version': writer.version()
+            }
+
+    @staticmethod
+    def _flatten_aliases(writer, aliases):
+        """(alias, canonical) pairs with canonical names that are aliases themselves resolved"""
+        targets = writer.alias_targets({name_key(canonical) for canonical in aliases.values()})
+        pairs = []
+        for alias, canonical in aliases.items():
+            canonical = targets.get(name_key(canonical), canonical)
+            if name_key(alias) != name_key(canonical):
+                pairs.append((alias, canonical))
+        return pairs
+
+    def merge_entities(self, network_id, merges):
+        """
+        Merge entities into canonical ones and record the merged names as aliases
+
+        Relationships of a merged entity move to its canonical entity;
+        those that become duplicates or self-loops are dropped, and the
+        canonical entity keeps the highest importance. Rewritten items
+        cannot be expressed in the change log, so the log restarts at the
+        new version (clients syncing from an older one reload).
+
+        Args:
+            merges: {alias name: canonical entity name}; chains are
+                followed, and merges into an entity that does not exist
+                are ignored
+
+        Returns:
+            None if the network does not exist, else a dict with 'merged'
+            ({alias: canonical}), 'relationships_removed', 'total' and 'version'
+        """
+        if not self.exists(network_id):
+            return None
+
+        with self._writer(network_id) as writer:
+            by_key = {name_key(entity['name']): (item_id, entity) for item_id, entity in writer.entity_rows()}
+            names = {name_key(alias): alias for alias in merges}
+            requested = {name_key(alias): name_key(canonical) for alias, canonical in merges.items()}
+            stored = writer.alias_targets(set(requested.values()))
+
+            plan = {}
+            for alias_key, canonical_key in requested.items():
+                visited = {alias_key}
+                while canonical_key in requested and canonical_key not in visited:
+                    visited.add(canonical_key)
+                    canonical_key = requested[canonical_key]
+                if canonical_key in stored:
+                    canonical_key = name_key(stored[canonical_key])
+                if canonical_key not in visited and canonical_key in by_key:
+                    plan[alias_key] = canonical_key
+
+            removed_entities = []
+            importance = {}
+            for alias_key, canonical_key in plan.items():
+                if alias_key not in by_key:
+                    continue
+                alias_id, alias_entity = by_key[alias_key]
+                removed_entities.append(alias_id)
+                names[alias_key] = alias_entity['name']
+                canonical_id, canonical_entity = by_key[canonical_key]
+                best = max(importance.get(canonical_id, canonical_entity['importance']), alias_entity['importance'])
+                if best != canonical_entity['importance']:
+                    importance[canonical_id] = best
+
+            kept_edges = set()
+            moved = []
+            for item_id, rel in writer.relationship_rows():
+                if name_key(rel['source']) in plan or name_key(rel['target']) in plan:
+                    moved.append((item_id, rel))
+                else:
+                    kept_edges.add(edge_key(rel['source'], rel['target']))
+
+            rewritten = []
+            removed_relationships = []
+            for item_id, rel in moved:
+                endpoints = []
+                for name in (rel['source'], rel['target']):
+                    key = name_key(name)
+                    endpoints.append(by_key[plan[key]][1]['name'] if key in plan else name)
+                key = edge_key(*endpoints)
+                if key[0] == key[1] or key in kept_edges:
+                    removed_relationships.append(item_id)
+                    continue
+                kept_edges.add(key)
+                rewritten.append((item_id, {**rel, 'source': endpoints[0], 'target': endpoints[1]}))
+
+            writer.apply_merge(removed_entities, importance, rewritten, removed_relationships)
+            merged = {names[alias_key]: by_key[canonical_key][1]['name'] for alias_key, canonical_key in plan.items()}
+            writer.add_aliases(list(merged.items()))
+            if plan:
+                writer.touch(datetime.utcnow().isoformat(), reset_log=True)
+                logger.info(f'Merged {len(plan)} entities in {network_id}')
+
+            return {
+                'merged': merged,
+                'relationships_removed': len(removed_relationships),
+                'total': writer.totals(),
+                'version': writer.version()
+            }
+
+
+class _MemoryWriter:
+    """Writer over an in-memory network dict, its index, change log and aliases"""
+
+    def __init__(self, network, index, log, log_limit, aliases):
+        self.network = network
+        self.index = index
+        self.log = log
+        self.log_limit = log_limit
+        self.aliases = aliases
+        self._added = []
+
+    def existing_entity_keys(self, keys):
+        return {key for key in keys if key in self.index.entities_by_name}
+
+    def alias_targets(self, keys):
+        return {key: self.aliases[key][1] for key in keys if key in self.aliases}
+
+    def add_aliases(self, pairs):
+        if not pairs:
+            return
+        retargeted = {name_key(alias): canonical for alias, canonical in pairs}
+        for key, (alias, canonical) in self.aliases.items():
+            if name_key(canonical) in retargeted:
+                self.aliases[key] = (alias, retargeted[name_key(canonical)])
+        for alias, canonical in pairs:
+            self.aliases[name_key(alias)] = (alias, canonical)
+
+    def entity_rows(self):
+        return enumerate(self.network['entities'])
+
+    def relationship_rows(self):
+        return enumerate(self.network['relationships'])
+
+    def apply_merge(self, removed_entities, importance, rewritten, removed_relationships):
+        # Positions are list offsets, so removing items renumbers the rest;
+        # page boundaries taken before this version are now stale
+        self.log['renumbered_at'] = self.network['version'] + 1
+        removed_entities = set(removed_entities)
+        removed_relationships = set(removed_relationships)
+        rewritten = dict(rewritten)
+        entities = [
+            {**entity, 'importance': importance[position]} if position in importance else entity
+            for position, entity in enumerate(self.network['entities'])
+            if position not in removed_entities
+        ]
+        relationships = [
+            rewritten.get(position, rel)
+            for position, rel in enumerate(self.network['relationships'])
+            if position not in removed_relationships
+        ]
+        self.network['entities'] = entities
+        self.network['relationships'] = relationships
+        self.index.reset(entities, relationships)
+
+    def existing_edge_keys(self, keys):
+        return {key for key in keys if key in self.index.edges}
+
+    def insert_entities(self, entities):
+        for entity in entities:
+            position = len(self.network['entities'])
+            self.index.add_entity(entity, position)
+            self.network['entities'].append(entity)
+            self._added.append(('entity', position))
+
+    def insert_relationships(self, relationships):
+        for rel in relationships:
+            position = len(self.network['relationships'])
+            self.index.add_relationship(rel, position)
+            self.network['relationships'].append(rel)
+            self._added.append(('relationship', position))
+
+    def touch(self, timestamp, reset_log=False):
+        self.network['updated_at'] = timestamp
+        self.network['version'] += 1
+        version = self.network['version']
+        entries = self.log['entries']
+        added, self._added = self._added, []
+        if reset_log or len(added) > self.log_limit:
+            # A merge, or a bulk load larger than the log: nothing before it stays answerable
+            self.log['start'] = version
+            entries.clear()
+            return
+
+        entries.extend((version, kind, position) for kind, position in added)
+        if len(entries) > self.log_limit:
+            # Drop whole versions until at most half the limit remains
+            cut = bisect_right(entries, entries[-(self.log_limit // 2) - 1][0], key=lambda e: e[0])
+            self.log['start'] = entries[cut - 1][0]
+            del entries[:cut]
+            logger.info(f'Compacted change log up to version {self.log["start"]}')
+
+    def version(self):
+        return self.network['version']
+
+    def totals(self):
+        return {
+            'entities': len(self.network['entities']),
+            'relationships': len(self.network['relationships'])
+        }
+
+
+def _take_page(items, positions, limit, fields, predicate):
+    """Project up to limit items at positions passing predicate; return (page, next position)"""
+    page = []
+    last = None
+    for position in positions:
+        item = items[position]
+        if not predicate(item):
+            continue
+        if len(page) == limit:
+            return page, last
+        page.append({field: position if field == 'id' else item.get(field) for field in fields})
+        last = position
+    return page, None
+
+
+class MemoryNetworkStore(NetworkStore):
+    """Process-local store; data is lost on restart and not shared between workers"""
+
+    def __init__(self, change_log_limit=DEFAULT_CHANGE_LOG_LIMIT):
+        self.change_log_limit = change_log_limit
+        self._networks = {}
+        self._indexes = {}
+        self._change_logs = {}
+        self._aliases = {}
+        self._lock = threading.RLock()
+
+    def exists(self, network_id):
+        return network_id in self._networks
+
+    def get_network(self, network_id):
+        network = self._networks.get(network_id)
+        if network is None:
+            return None
+        return dict(network)
+
+    @contextmanager
+    def snapshot(self, network_id):
+        with self._lock:
+            network = self._networks.get(network_id)
+            if network is not None:
+                entities = list(network['entities'])
+                relationships = list(network['relationships'])
+                created_at, updated_at = network['created_at'], network['updated_at']
+                version = network['version']
+        if network is None:
+            yield None
+            return
+        yield {
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'version': version,
+            'entity_count': len(entities),
+            'relationship_count': len(relationships),
+            'entities': iter(entities),
+            'relationships': iter(relationships)
+        }
+
+    def changes_since(self, network_id, since):
+        with self._lock:
+            network = self._networks.get(network_id)
+            if network is None:
+                return None
+            log = self._change_logs[network_id]
+            result = {
+                'created_at': network['created_at'],
+                'updated_at': network['updated_at'],
+                'version': network['version'],
+                'log_start': log['start']
+            }
+            if not log['start'] <= since <= network['version']:
+                return result
+
+            entries = log['entries']
+            start = bisect_right(entries, since, key=lambda e: e[0])
+            result['entities'] = [
+                network['entities'][position] for _, kind, position in entries[start:] if kind == 'entity'
+            ]
+            result['relationships'] = [
+                network['relationships'][position] for _, kind, position in entries[start:] if kind == 'relationship'
+            ]
+            return result
+
+    def page_network(self, network_id, query):
+        with self._lock:
+            network = self._networks.get(network_id)
+            if network is None:
+                return None
+            index = self._indexes[network_id]
+            limit = query['limit']
+            page = {
+                'created_at': network['created_at'],
+                'updated_at': network['updated_at'],
+                'version': network['version'],
+                'id_epoch': self._change_logs[network_id]['renumbered_at'],
+                'next_entity': None,
+                'next_relationship': None
+            }
+
+            if 'entities' in query['include'] and query['after_entity'] is not None:
+                entities = network['entities']
+                after = query['after_entity']
+                if query['entity_types'] is not None:
+                    positions = _positions_after(
+                        [index.entities_by_type.get(t, []) for t in query['entity_types']], after
+                    )
+                elif query['min_importance'] is not None:
+                    positions = _positions_after(
+                        [p for importance, p in index.entities_by_importance.items()
+                         if importance >= query['min_importance']], after
+                    )
+                else:
+                    positions = range(after + 1, len(entities))
+
+                page['entities'], page['next_entity'] = _take_page(
+                    entities, positions, limit, query['entity_fields'],
+                    lambda e: query['min_importance'] is None or e['importance'] >= query['min_importance']
+                )
+
+            if 'relationships' in query['include'] and query['after_relationship'] is not None:
+                relationships = network['relationships']
+                after = query['after_relationship']
+                if query['statuses'] is not None:
+                    positions = _positions_after(
+                        [index.relationships_by_status.get(s, []) for s in query['statuses']], after
+                    )
+                elif query['relationship_types'] is not None:
+                    positions = _positions_after(
+                        [index.relationships_by_type.get(t, []) for t in query['relationship_types']], after
+                    )
+                else:
+                    positions = range(after + 1, len(relationships))
+
+                types = set(query['relationship_types'] or ())
+                page['relationships'], page['next_relationship'] = _take_page(
+                    relationships, positions, limit, query['relationship_fields'],
+                    lambda r: (not types or r['type'] in types)
+                    and _in_date_range(r.get('date'), query['date_from'], query['date_to'])
+                )
+
+            return page
+
+    def list_networks(self):
+        with self._lock:
+            items = list(self._networks.items())
+        return [
+            {
+                'network_id': network_id,
+                'entity_count': len(data['entities']),
+                'relationship_count': len(data['relationships']),
+                'created_at': data['created_at'],
+                'updated_at': data['updated_at'],
+                'version': data['version']
+            }
+            for network_id, data in items
+        ]
+
+    def network_version(self, network_id):
+        with self._lock:
+            network = self._networks.get(network_id)
+            if network is None:
+                return None
+            return {
+                'created_at': network['created_at'],
+                'updated_at': network['updated_at'],
+                'version': network['version']
+            }
+
+    def delete_network(self, network_id):
+        with self._lock:
+            if network_id not in self._networks:
+                return False
+            del self._networks[network_id]
+            self._indexes.pop(network_id, None)
+            self._change_logs.pop(network_id, None)
+            self._aliases.pop(network_id, None)
+            return True
+
+    def aliases(self, network_id):
+        with self._lock:
+            if network_id not in self._networks:
+                return None
+            return [
+                {'alias': alias, 'canonical': canonical}
+                for alias, canonical in self._aliases[network_id].values()
+            ]
+
+    @contextmanager
+    def _writer(self, network_id):
+        with self._lock:
+            if network_id not in self._networks:
+                now = datetime.utcnow().isoformat()
+                self._networks[network_id] = {
+                    'entities': [],
+                    'relationships': [],
+                    'created_at': now,
+                    'updated_at': now,
+                    'version': 0
+                }
+                self._indexes[network_id] = NetworkIndex()
+                self._change_logs[network_id] = {'start': 0, 'entries': [], 'renumbered_at': 0}
+                self._aliases[network_id] = {}
+            yield _MemoryWriter(
+                self._networks[network_id], self._indexes[network_id],
+                self._change_logs[network_id], self.change_log_limit, self._aliases[network_id]
+            )
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS networks (
+    network_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    entity_count INTEGER NOT NULL DEFAULT 0,
+    relationship_count INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    change_count INTEGER NOT NULL DEFAULT 0,
+    log_start INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    network_id TEXT NOT NULL REFERENCES networks(network_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    type TEXT,
+    importance INTEGER,
+    description TEXT,
+    UNIQUE (network_id, name_key)
+);
+
+CREATE TABLE IF NOT EXISTS relationships (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    network_id TEXT NOT NULL REFERENCES networks(network_id) ON DELETE CASCADE,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    key_a TEXT NOT NULL,
+    key_b TEXT NOT NULL,
+    type TEXT,
+    description TEXT,
+    status TEXT,
+    value TEXT,
+    date TEXT,
+    UNIQUE (network_id, key_a, key_b)
+);
+
+-- Append-only change log: the version that added each entity or relationship
+CREATE TABLE IF NOT EXISTS changes (
+    network_id TEXT NOT NULL REFERENCES networks(network_id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    item_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS changes_version ON changes (network_id, version);
+
+-- Names merged into another entity (entity resolution)
+CREATE TABLE IF NOT EXISTS aliases (
+    network_id TEXT NOT NULL REFERENCES networks(network_id) ON DELETE CASCADE,
+    alias_key TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    canonical_key TEXT NOT NULL,
+    PRIMARY KEY (network_id, alias_key)
+);
+
+CREATE INDEX IF NOT EXISTS aliases_canonical ON aliases (network_id, canonical_key);
+
+-- Secondary indexes for filtered, paginated reads (page_network)
+CREATE INDEX IF NOT EXISTS entities_type ON entities (network_id, type, id);
+CREATE INDEX IF NOT EXISTS entities_importance ON entities (network_id, importance, id);
+CREATE INDEX IF NOT EXISTS relationships_type ON relationships (network_id, type, id);
+CREATE INDEX IF NOT EXISTS relationships_status ON relationships (network_id, status, id);
+CREATE INDEX IF NOT EXISTS relationships_date ON relationships (network_id, date);
+"""
+
+ENTITY_COLUMNS = ('name', 'type', 'importance', 'description')
+RELATIONSHIP_COLUMNS = ('source', 'target', 'type', 'description', 'status', 'value', 'date')
+
+
+def _batches(items, size=SQLITE_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class _SQLiteWriter:
+    """Writer bound to an open SQLite transaction for one network"""
+
+    def __init__(self, conn, network_id, log_limit):
+        self.conn = conn
+        self.network_id = network_id
+        self.log_limit = log_limit
+        self._added = []
+
+    def _last_ids(self, count):
+        # Rows inserted in one statement under the write lock get consecutive ids
+        last = self.conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        return last - count + 1, last
+
+    def existing_entity_keys(self, keys):
+        found = set()
+        for batch in _batches(keys):
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f'SELECT name_key FROM entities WHERE network_id = ? AND name_key IN ({placeholders})',
+                [self.network_id, *batch]
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def alias_targets(self, keys):
+        targets = {}
+        for batch in _batches(keys):
+            rows = self.conn.execute(
+                f'SELECT alias_key, canonical FROM aliases WHERE network_id = ? '
+                f'AND alias_key IN ({",".join("?" * len(batch))})',
+                [self.network_id, *batch]
+            )
+            targets.update(rows)
+        return targets
+
+    def add_aliases(self, pairs):
+        for alias, canonical in pairs:
+            self.conn.execute(
+                'UPDATE aliases SET canonical = ?, canonical_key = ? WHERE network_id = ? AND canonical_key = ?',
+                (canonical, name_key(canonical), self.network_id, name_key(alias))
+            )
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO aliases (network_id, alias_key, alias, canonical, canonical_key) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(self.network_id, name_key(alias), alias, canonical, name_key(canonical)) for alias, canonical in pairs]
+        )
+
+    def entity_rows(self):
+        rows = self.conn.execute(
+            'SELECT id, name, type, importance, description FROM entities WHERE network_id = ? ORDER BY id',
+            (self.network_id,)
+        )
+        return ((row[0], dict(zip(ENTITY_COLUMNS, row[1:]))) for row in rows)
+
+    def relationship_rows(self):
+        rows = self.conn.execute(
+            'SELECT id, source, target, type, description, status, value, date FROM relationships '
+            'WHERE network_id = ? ORDER BY id',
+            (self.network_id,)
+        )
+        return ((row[0], dict(zip(RELATIONSHIP_COLUMNS, row[1:]))) for row in rows)
+
+    def apply_merge(self, removed_entities, importance, rewritten, removed_relationships):
+        for table, ids in (('entities', removed_entities), ('relationships', removed_relationships)):
+            for batch in _batches(ids):
+                self.conn.execute(f'DELETE FROM {table} WHERE id IN ({",".join("?" * len(batch))})', batch)
+        self.conn.executemany(
+            'UPDATE entities SET importance = ? WHERE id = ?',
+            [(value, item_id) for item_id, value in importance.items()]
+        )
+        self.conn.executemany(
+            'UPDATE relationships SET source = ?, target = ?, key_a = ?, key_b = ? WHERE id = ?',
+            [
+                (rel['source'], rel['target'], *edge_key(rel['source'], rel['target']), item_id)
+                for item_id, rel in rewritten
+            ]
+        )
+        self.conn.execute(
+            'UPDATE networks SET entity_count = entity_count - ?, relationship_count = relationship_count - ? '
+            'WHERE network_id = ?',
+            (len(removed_entities), len(removed_relationships), self.network_id)
+        )
+
+    def existing_edge_keys(self, keys):
+        found = set()
+        for batch in _batches(keys):
+            # Seek the (network_id, key_a, key_b) unique index by key_a and
+            # match pairs here; a row-value IN scans every edge of the network
+            keys_a = sorted({key_a for key_a, _ in batch})
+            rows = self.conn.execute(
+                f'SELECT key_a, key_b FROM relationships WHERE network_id = ? '
+                f'AND key_a IN ({",".join("?" * len(keys_a))})',
+                [self.network_id, *keys_a]
+            )
+            wanted = set(batch)
+            found.update(key for key in ((row[0], row[1]) for row in rows) if key in wanted)
+        return found
+
+    def insert_entities(self, entities):
+        if not entities:
+            return
+        self.conn.executemany(
+            'INSERT INTO entities (network_id, name_key, name, type, importance, description) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (self.network_id, name_key(e['name']), *(e[col] for col in ENTITY_COLUMNS))
+                for e in entities
+            ]
+        )
+        self._added.append(('entity', 'entities', *self._last_ids(len(entities))))
+        self.conn.execute(
+            'UPDATE networks SET entity_count = entity_count + ? WHERE network_id = ?',
+            (len(entities), self.network_id)
+        )
+
+    def insert_relationships(self, relationships):
+        if not relationships:
+            return
+        self.conn.executemany(
+            'INSERT INTO relationships '
+            '(network_id, key_a, key_b, source, target, type, description, status, value, date) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (self.network_id, *edge_key(r['source'], r['target']),
+                 *(r[col] for col in RELATIONSHIP_COLUMNS))
+                for r in relationships
+            ]
+        )
+        self._added.append(('relationship', 'relationships', *self._last_ids(len(relationships))))
+        self.conn.execute(
+            'UPDATE networks SET relationship_count = relationship_count + ? WHERE network_id = ?',
+            (len(relationships), self.network_id)
+        )
+
+    def touch(self, timestamp, reset_log=False):
+        self.conn.execute(
+            'UPDATE networks SET updated_at = ?, version = version + 1 WHERE network_id = ?',
+            (timestamp, self.network_id)
+        )
+        version = self.version()
+        added, self._added = self._added, []
+        if reset_log or sum(last - first + 1 for _, _, first, last in added) > self.log_limit:
+            # A merge, or a bulk load larger than the log: nothing before it stays answerable
+            self.conn.execute('DELETE FROM changes WHERE network_id = ?', (self.network_id,))
+            self.conn.execute(
+                'UPDATE networks SET log_start = ?, change_count = 0 WHERE network_id = ?',
+                (version, self.network_id)
+            )
+            return
+
+        logged = 0
+        for kind, table, first, last in added:
+            self.conn.execute(
+                f'INSERT INTO changes (network_id, version, kind, item_id) '
+                f'SELECT network_id, ?, ?, id FROM {table} WHERE id BETWEEN ? AND ?',
+                (version, kind, first, last)
+            )
+            logged += last - first + 1
+
+        self.conn.execute(
+            'UPDATE networks SET change_count = change_count + ? WHERE network_id = ?',
+            (logged, self.network_id)
+        )
+        change_count = self.conn.execute(
+            'SELECT change_count FROM networks WHERE network_id = ?', (self.network_id,)
+        ).fetchone()[0]
+        if change_count > self.log_limit:
+            self._compact()
+
+    def _compact(self):
+        """Drop whole versions from the log until at most half the limit remains"""
+        start = self.conn.execute(
+            'SELECT version FROM changes WHERE network_id = ? ORDER BY version DESC LIMIT 1 OFFSET ?',
+            (self.network_id, self.log_limit // 2)
+        ).fetchone()[0]
+        self.conn.execute('DELETE FROM changes WHERE network_id = ? AND version <= ?', (self.network_id, start))
+        self.conn.execute(
+            'UPDATE networks SET log_start = ?, '
+            'change_count = (SELECT COUNT(*) FROM changes WHERE network_id = ?) WHERE network_id = ?',
+            (start, self.network_id, self.network_id)
+        )
+        logger.info(f'Compacted change log of {self.network_id} up to version {start}')
+
+    def version(self):
+        return self.conn.execute(
+            'SELECT version FROM networks WHERE network_id = ?', (self.network_id,)
+        ).fetchone()[0]
+
+    def totals(self):
+        row = self.conn.execute(
+            'SELECT entity_count, relationship_count FROM networks WHERE network_id = ?',
+            (self.network_id,)
+        ).fetchone()
+        return {'entities': row[0], 'relationships': row[1]}
+
+
+class SQLiteNetworkStore(NetworkStore):
+    """
+    SQLite-backed store shared by all worker processes on a host
+
+    Each thread gets its own connection; the database runs in WAL mode
+    so readers never block the single writer.
+    """
+
+    def __init__(self, path, change_log_limit=DEFAULT_CHANGE_LOG_LIMIT):
+        self.path = path
+        self.change_log_limit = change_log_limit
+        self._local = threading.local()
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(networks)')}
+        if columns:
+            # Databases created before networks were versioned and logged
+            for column in ('version', 'change_count', 'log_start'):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE networks ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+        conn.executescript(SCHEMA)
+
+    def _connection(self):
+        # Connections must not be shared across a fork (gunicorn --preload)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+
+    def exists(self, network_id):
+        row = self._connection().execute(
+            'SELECT 1 FROM networks WHERE network_id = ?', (network_id,)
+        ).fetchone()
+        return row is not None
+
+    def get_network(self, network_id):
+        conn = self._connection()
+        # Read entities and relationships from one consistent snapshot
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT created_at, updated_at, version FROM networks WHERE network_id = ?',
+                (network_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            entities = [
+                dict(zip(ENTITY_COLUMNS, r)) for r in conn.execute(
+                    'SELECT name, type, importance, description FROM entities '
+                    'WHERE network_id = ? ORDER BY id',
+                    (network_id,)
+                )
+            ]
+            relationships = [
+                dict(zip(RELATIONSHIP_COLUMNS, r)) for r in conn.execute(
+                    'SELECT source, target, type, description, status, value, date '
+                    'FROM relationships WHERE network_id = ? ORDER BY id',
+                    (network_id,)
+                )
+            ]
+        finally:
+            conn.execute('COMMIT')
+
+        return {
+            'entities': entities,
+            'relationships': relationships,
+            'created_at': row[0],
+            'updated_at': row[1],
+            'version': row[2]
+        }
+
+    def _page_rows(self, conn, table, fields, conditions, params, after, limit):
+        """Select up to limit rows after id, returning (projected rows, next id)"""
+        columns = ', '.join(['id'] + [field for field in fields if field != 'id'])
+        where = ' AND '.join(['network_id = ?', 'id > ?'] + conditions)
+        rows = conn.execute(
+            f'SELECT {columns} FROM {table} WHERE {where} ORDER BY id LIMIT ?',
+            [params[0], after, *params[1:], limit + 1]
+        ).fetchall()
+
+        names = ['id'] + [field for field in fields if field != 'id']
+        page = []
+        for row in rows[:limit]:
+            values = dict(zip(names, row))
+            page.append({field: values[field] for field in fields})
+        next_id = rows[limit - 1][0] if len(rows) > limit else None
+        return page, next_id
+
+    def changes_since(self, network_id, since):
+        conn = self._connection()
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT created_at, updated_at, version, log_start FROM networks WHERE network_id = ?',
+                (network_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            result = {'created_at': row[0], 'updated_at': row[1], 'version': row[2], 'log_start': row[3]}
+            if not row[3] <= since <= row[2]:
+                return result
+
+            result['entities'] = [
+                dict(zip(ENTITY_COLUMNS, r)) for r in conn.execute(
+                    'SELECT e.name, e.type, e.importance, e.description '
+                    'FROM changes c JOIN entities e ON e.id = c.item_id '
+                    "WHERE c.network_id = ? AND c.version > ? AND c.kind = 'entity' ORDER BY e.id",
+                    (network_id, since)
+                )
+            ]
+            result['relationships'] = [
+                dict(zip(RELATIONSHIP_COLUMNS, r)) for r in conn.execute(
+                    'SELECT r.source, r.target, r.type, r.description, r.status, r.value, r.date '
+                    'FROM changes c JOIN relationships r ON r.id = c.item_id '
+                    "WHERE c.network_id = ? AND c.version > ? AND c.kind = 'relationship' ORDER BY r.id",
+                    (network_id, since)
+                )
+            ]
+        finally:
+            conn.execute('COMMIT')
+        return result
+
+    def page_network(self, network_id, query):
+        conn = self._connection()
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT created_at, updated_at, version FROM networks WHERE network_id = ?',
+                (network_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            page = {
+                'created_at': row[0],
+                'updated_at': row[1],
+                'version': row[2],
+                'id_epoch': 0,
+                'next_entity': None,
+                'next_relationship': None
+            }
+
+            if 'entities' in query['include'] and query['after_entity'] is not None:
+                conditions, params = [], [network_id]
+                if query['entity_types'] is not None:
+                    conditions.append(f'type IN ({", ".join("?" * len(query["entity_types"]))})')
+                    params.extend(query['entity_types'])
+                if query['min_importance'] is not None:
+                    conditions.append('importance >= ?')
+                    params.append(query['min_importance'])
+                page['entities'], page['next_entity'] = self._page_rows(
+                    conn, 'entities', query['entity_fields'], conditions, params,
+                    query['after_entity'], query['limit']
+                )
+
+            if 'relationships' in query['include'] and query['after_relationship'] is not None:
+                conditions, params = [], [network_id]
+                if query['relationship_types'] is not None:
+                    conditions.append(f'type IN ({", ".join("?" * len(query["relationship_types"]))})')
+                    params.extend(query['relationship_types'])
+                if query['statuses'] is not None:
+                    conditions.append(f'status IN ({", ".join("?" * len(query["statuses"]))})')
+                    params.extend(query['statuses'])
+                if query['date_from'] is not None or query['date_to'] is not None:
+                    conditions.append("date != ''")
+                if query['date_from'] is not None:
+                    conditions.append('date >= ?')
+                    params.append(query['date_from'])
+                if query['date_to'] is not None:
+                    conditions.append('date <= ?')
+                    params.append(query['date_to'])
+                page['relationships'], page['next_relationship'] = self._page_rows(
+                    conn, 'relationships', query['relationship_fields'], conditions, params,
+                    query['after_relationship'], query['limit']
+                )
+        finally:
+            conn.execute('COMMIT')
+
+        return page
+
+    @contextmanager
+    def snapshot(self, network_id):
+        conn = self._connection()
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT created_at, updated_at, entity_count, relationship_count, version '
+                'FROM networks WHERE network_id = ?',
+                (network_id,)
+            ).fetchone()
+            if row is None:
+                yield None
+                return
+
+            def entities():
+                for r in conn.execute(
+                    'SELECT name, type, importance, description FROM entities '
+                    'WHERE network_id = ? ORDER BY id',
+                    (network_id,)
+                ):
+                    yield dict(zip(ENTITY_COLUMNS, r))
+
+            def relationships():
+                for r in conn.execute(
+                    'SELECT source, target, type, description, status, value, date '
+                    'FROM relationships WHERE network_id = ? ORDER BY id',
+                    (network_id,)
+                ):
+                    yield dict(zip(RELATIONSHIP_COLUMNS, r))
+
+            yield {
+                'created_at': row[0],
+                'updated_at': row[1],
+                'version': row[4],
+                'entity_count': row[2],
+                'relationship_count': row[3],
+                'entities': entities(),
+                'relationships': relationships()
+            }
+        finally:
+            conn.execute('COMMIT')
+
+    def list_networks(self):
+        rows = self._connection().execute(
+            'SELECT network_id, entity_count, relationship_count, created_at, updated_at, version '
+            'FROM networks ORDER BY created_at'
+        )
+        return [
+            {
+                'network_id': r[0],
+                'entity_count': r[1],
+                'relationship_count': r[2],
+                'created_at': r[3],
+                'updated_at': r[4],
+                'version': r[5]
+            }
+            for r in rows
+        ]
+
+    def network_version(self, network_id):
+        row = self._connection().execute(
+            'SELECT created_at, updated_at, version FROM networks WHERE network_id = ?',
+            (network_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'created_at': row[0], 'updated_at': row[1], 'version': row[2]}
+
+    def delete_network(self, network_id):
+        with self._transaction() as conn:
+            cursor = conn.execute('DELETE FROM networks WHERE network_id = ?', (network_id,))
+            return cursor.rowcount > 0
+
+    def aliases(self, network_id):
+        if not self.exists(network_id):
+            return None
+        rows = self._connection().execute(
+            'SELECT alias, canonical FROM aliases WHERE network_id = ? ORDER BY alias_key', (network_id,)
+        )
+        return [{'alias': alias, 'canonical': canonical} for alias, canonical in rows]
+
+    @contextmanager
+    def _writer(self, network_id):
+        with self._transaction() as conn:
+            now = datetime.utcnow().isoformat()
+            conn.execute(
+                'INSERT OR IGNORE INTO networks (network_id, created_at, updated_at) VALUES (?, ?, ?)',
+                (network_id, now, now)
+            )
+            yield _SQLiteWriter(conn, network_id, self.change_log_limit)
+
+
+def _gunicorn_workers():
+    """Worker count when running under gunicorn, from its command line or WEB_CONCURRENCY; 0 otherwise"""
+    if 'gunicorn' not in os.path.basename(sys.argv[0]):
+        return 0
+    args = sys.argv[1:] + os.getenv('GUNICORN_CMD_ARGS', '').split()
+    for position, arg in enumerate(args):
+        if arg in ('-w', '--workers') and position + 1 < len(args):
+            return int(args[position + 1])
+        if arg.startswith('--workers='):
+            return int(arg.split('=', 1)[1])
+        if arg.startswith('-w') and arg[2:].isdigit():
+            return int(arg[2:])
+    return int(os.getenv('WEB_CONCURRENCY', '1'))
+
+
+def create_store():
+    """Create the network store configured by the environment"""
+    backend = os.getenv('NETWORK_STORE', 'memory').lower()
+    change_log_limit = int(os.getenv('CHANGE_LOG_MAX_ENTRIES', str(DEFAULT_CHANGE_LOG_LIMIT)))
+
+    if backend == 'sqlite':
+        path = os.getenv('NETWORK_DB_PATH', 'silent_partners.db')
+        logger.info(f'Using SQLite network store at {path}')
+        return SQLiteNetworkStore(path, change_log_limit)
+
+    if backend != 'memory':
+        raise ValueError(f'Unknown NETWORK_STORE backend: {backend}')
+
+    workers = _gunicorn_workers()
+    if workers > 1:
+        logger.warning(
+            f'Using the in-memory network store under {workers} gunicorn workers: each worker holds its '
+            f'own networks, so requests served by another worker answer 404 and nothing survives a '
+            f'restart. Set NETWORK_STORE=sqlite'
+        )
+    else:
+        logger.info('Using in-memory network store')
+    return MemoryNetworkStore(change_log_limit)
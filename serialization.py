@@ -0,0 +1,174 @@
+"""
+Serialization
+Fast JSON encoding and streamed JSON responses
+
+Uses orjson when it is installed and the standard library otherwise.
+Large networks are written as a stream: the top-level object is emitted
+piece by piece and array items are encoded one at a time from an
+iterator, so a response never holds the full entity and relationship
+lists, or their encoded form, in memory at once.
+
+Encoded bodies of versioned resources can be kept in a BodyCache, so
+serving an unchanged network again costs no encoding.
+"""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Networks with more entities + relationships than this are streamed
+DEFAULT_STREAM_THRESHOLD = 20000
+
+# Target size of each chunk written to the socket
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+if orjson is not None:
+    def dumps(obj):
+        """Encode obj as compact UTF-8 JSON bytes"""
+        return orjson.dumps(obj)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(obj):
+        """Encode obj as compact UTF-8 JSON bytes"""
+        return _encoder.encode(obj).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    """Flask response with obj encoded by the fastest available backend"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (dict, str, bytes, int, float, bool))
+
+
+def materialize(fields):
+    """Build a dict from (key, value) pairs, turning iterator values into lists"""
+    return {key: value if _is_scalar(value) else list(value) for key, value in fields}
+
+
+def iter_json_object(fields):
+    """
+    Encode a JSON object whose values may be iterators, yielding bytes chunks
+
+    Args:
+        fields: list of (key, value) pairs; a value that is a list, tuple
+            or generator/iterator is written as a JSON array item by item,
+            anything else is encoded whole
+    """
+    buffer = bytearray(b'{')
+    for position, (key, value) in enumerate(fields):
+        if position:
+            buffer += b','
+        buffer += dumps(key)
+        buffer += b':'
+
+        if _is_scalar(value):
+            buffer += dumps(value)
+            continue
+
+        buffer += b'['
+        first = True
+        for item in value:
+            if not first:
+                buffer += b','
+            first = False
+            buffer += dumps(item)
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += b']'
+
+    buffer += b'}'
+    yield bytes(buffer)
+
+
+class BodyCache:
+    """
+    Byte-bounded LRU of encoded response bodies
+
+    Keys must identify the content exactly (e.g. include a version), so
+    entries never need invalidating; stale versions simply age out.
+
+    Args:
+        max_bytes: Total size of cached bodies (0 disables caching)
+        max_entry_bytes: Largest body worth caching; defaults to a quarter
+            of max_bytes
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached body for key, or None"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def discard(self, predicate):
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._size -= len(self._entries.pop(key))
+
+    def tee(self, key, chunks):
+        """
+        Yield chunks unchanged, caching their concatenation once complete
+
+        Collection stops as soon as the body outgrows max_entry_bytes, so
+        streaming a body too large to cache costs no extra memory.
+        """
+        collected = [] if self.max_entry_bytes else None
+        size = 0
+        for chunk in chunks:
+            if collected is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    collected = None
+                else:
+                    collected.append(chunk)
+            yield chunk
+        if collected is not None:
+            self.put(key, b''.join(collected))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'hits': self.hits, 'misses': self.misses}
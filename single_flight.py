@@ -0,0 +1,253 @@
+"""
+Single Flight
+Coalesce identical in-flight requests onto one upstream call
+
+Concurrent calls with the same key share one execution:
+    - inside a worker, followers wait on the leader thread's result
+    - across gunicorn workers, the leading process holds an flock on
+      <dir>/<key>.lock and publishes its result to <dir>/<key>.json;
+      another process asking for the same key blocks on the lock and
+      then reads the result instead of calling the model again
+
+Every published result starts with a line holding a fresh version. A
+process notes the version present when it arrives and only reuses a
+result with another version, so clock and mtime resolution play no
+part.
+
+Only results produced while a follower was waiting are shared, so
+this never serves stale data; longer-lived reuse is the job of the
+extraction cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Slot and unlocked lock files older than this are removed by the periodic sweep
+STALE_FILE_SECONDS = 600
+SWEEP_INTERVAL_SECONDS = 60
+
+
+def make_request_key(kind, payload):
+    """Stable hash of a request kind and its JSON-serializable payload"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{kind}\0{encoded}'.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Run fn once per key among concurrent callers
+
+    Args:
+        lock_dir: Directory for cross-process lock and result files
+            (None keeps coalescing inside the process)
+        wait_timeout: Longest a follower waits before running fn itself
+    """
+
+    def __init__(self, lock_dir=None, wait_timeout=120.0):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._stats = {'leaders': 0, 'local_followers': 0, 'remote_followers': 0}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
+
+    def do(self, key, fn):
+        """
+        Return fn() for the first caller of key; concurrent callers share it
+
+        Returns:
+            (result, shared) where shared is True if another caller's result was reused
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.followers += 1
+                self._stats['local_followers'] += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                logger.warning(f'Single-flight wait for {key[:12]} timed out, running directly')
+                return fn(), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run_across_processes(key, fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        if call.followers:
+            logger.info(f'Single-flight {key[:12]}: {call.followers} concurrent requests shared one call')
+        return call.result, shared
+
+    def _paths(self, key):
+        return os.path.join(self.lock_dir, f'{key}.lock'), os.path.join(self.lock_dir, f'{key}.json')
+
+    def _run_across_processes(self, key, fn):
+        if not self.lock_dir:
+            with self._lock:
+                self._stats['leaders'] += 1
+            return fn(), False
+
+        lock_path, result_path = self._paths(key)
+        arrived_version = self._read_version(result_path)
+        lock_file, acquired = self._acquire(lock_path)
+        with lock_file:
+            try:
+                if acquired:
+                    shared = self._read_result(result_path, arrived_version)
+                    if shared is not None:
+                        with self._lock:
+                            self._stats['remote_followers'] += 1
+                        return shared, True
+                else:
+                    logger.warning(f'Single-flight lock for {key[:12]} timed out, running directly')
+
+                with self._lock:
+                    self._stats['leaders'] += 1
+                result = fn()
+                if acquired:
+                    self._write_result(result_path, result)
+                return result, False
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self._sweep()
+
+    def _acquire(self, lock_path):
+        """
+        Open and lock the key's lock file, waiting up to wait_timeout
+
+        A lock file the sweep unlinked between our open and flock no
+        longer guards the key, so it is reopened until the locked file is
+        the one at lock_path.
+
+        Returns:
+            (open lock file, True if locked)
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            lock_file = open(lock_path, 'a')
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        return lock_file, False
+                    time.sleep(0.05)
+            try:
+                if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    return lock_file, True
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+    def _read_version(self, path):
+        """Version of the result currently published at path, or None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.readline().strip() or None
+        except OSError:
+            return None
+
+    def _read_result(self, path, arrived_version):
+        """Result published by another process after this request arrived, if any"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                if f.readline().strip() in ('', arrived_version):
+                    return None
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, path, result):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.lock_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(uuid.uuid4().hex + '\n')
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f'Could not publish single-flight result: {e}')
+
+    def _sweep(self):
+        """
+        Occasionally delete slot and lock files nobody can still be waiting on
+
+        A lock file is only deleted while the sweep itself holds its lock,
+        so a running leader's lock is never removed.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if now - os.path.getmtime(path) <= STALE_FILE_SECONDS:
+                    continue
+                if not name.endswith('.lock'):
+                    os.unlink(path)
+                    continue
+                with open(path, 'a') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue
+                    os.unlink(path)
+            except OSError:
+                pass
+
+
+def create_single_flight():
+    """Create the request coalescer configured by the environment"""
+    lock_dir = os.getenv('COALESCE_DIR', '.cache/inflight') or None
+    wait_timeout = float(os.getenv('COALESCE_WAIT_SECONDS', '120'))
+    if lock_dir and fcntl is None:
+        logger.warning('fcntl unavailable; request coalescing limited to one process')
+    logger.info(f'Request coalescing: {"across workers via " + lock_dir if lock_dir else "per process"}')
+    return SingleFlight(lock_dir, wait_timeout)
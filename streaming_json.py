@@ -0,0 +1,109 @@
+"""
+Streaming JSON
+Incremental parsing of model output and NDJSON/SSE event formatting
+
+The model returns a single JSON object such as
+{"entities": [...], "relationships": [...]}. When the response is
+streamed, ArrayItemParser picks complete objects out of the named
+top-level arrays as soon as their closing brace arrives, so each
+entity can be sent to the client without waiting for the full body.
+"""
+
+import json
+
+
+class ArrayItemParser:
+    """
+    Incremental parser yielding objects from top-level arrays of a JSON object
+
+    Usage:
+        parser = ArrayItemParser({'entities', 'relationships'})
+        for delta in stream:
+            for key, item in parser.feed(delta):
+                ...
+    """
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self._buffer = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._last_key = None
+        self._array_key = None
+        self._item_start = None
+
+    def feed(self, text):
+        """Consume a chunk of text and return a list of (key, item) pairs completed by it"""
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_string = buffer[self._string_start:self._pos + 1]
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char == ':':
+                if len(self._stack) == 1 and self._last_string is not None:
+                    self._last_key = json.loads(self._last_string)
+                    self._last_string = None
+            elif char in '{[':
+                self._stack.append(char)
+                depth = len(self._stack)
+                if depth == 2:
+                    self._array_key = self._last_key if char == '[' else None
+                elif depth == 3 and char == '{' and self._array_key in self.keys:
+                    self._item_start = self._pos
+            elif char in '}]':
+                if len(self._stack) == 3 and self._item_start is not None:
+                    item = json.loads(buffer[self._item_start:self._pos + 1])
+                    completed.append((self._array_key, item))
+                    self._item_start = None
+                if self._stack:
+                    self._stack.pop()
+                if len(self._stack) == 1:
+                    self._array_key = None
+
+            self._pos += 1
+
+        self._compact()
+        return completed
+
+    def _compact(self):
+        """Drop consumed input that no pending item or key still refers to"""
+        keep_from = self._pos
+        if self._item_start is not None:
+            keep_from = min(keep_from, self._item_start)
+        if self._in_string and self._string_start is not None:
+            keep_from = min(keep_from, self._string_start)
+
+        if keep_from == 0:
+            return
+
+        self._buffer = self._buffer[keep_from:]
+        self._pos -= keep_from
+        if self._item_start is not None:
+            self._item_start -= keep_from
+        if self._string_start is not None:
+            self._string_start -= keep_from
+
+
+def format_event(event, data, stream_format='ndjson'):
+    """Serialize a single stream event as an NDJSON line or an SSE message"""
+    if stream_format == 'sse':
+        return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+    return json.dumps({'event': event, 'data': data}) + '\n'
@@ -8,6 +8,10 @@ import requests
 import json
 import time
 
+import pytest
+
+from network_store import MemoryNetworkStore, SQLiteNetworkStore, page_query
+
 # API base URL
 API_URL = "http://localhost:5000/api"
 
@@ -211,6 +215,122 @@ def test_incremental_add():
     
     return response.status_code == 200
 
+
+# Store parity: the same operations against MemoryNetworkStore and
+# SQLiteNetworkStore must give the same results. Timestamps, page
+# boundaries and id_epoch are store-specific and left out.
+
+PARITY_ENTITIES = [
+    {"name": "Jho Low", "type": "person", "importance": 5},
+    {"name": "1MDB", "type": "organization", "importance": 5},
+    {"name": "Tim Leissner", "type": "person", "importance": 3},
+    {"name": "Tim Leisner", "type": "person"},
+    {"name": "jho low", "type": "person"},
+    {"type": "person"}
+]
+PARITY_RELATIONSHIPS = [
+    {"source": "Jho Low", "target": "1MDB", "type": "financial", "status": "confirmed", "date": "2009-09-01"},
+    {"source": "Tim Leisner", "target": "1MDB", "type": "financial", "status": "alleged"},
+    {"source": "Tim Leissner", "target": "Jho Low", "type": "personal"},
+    {"source": "Jho Low", "target": "1MDB", "type": "financial"},
+    {"source": "Nobody", "target": "1MDB"}
+]
+STORE_SPECIFIC_KEYS = ("created_at", "updated_at", "next_entity", "next_relationship", "id_epoch")
+
+
+def without_store_specific(value):
+    """Drop the keys that legitimately differ between stores"""
+    if isinstance(value, dict):
+        return {key: without_store_specific(item) for key, item in value.items() if key not in STORE_SPECIFIC_KEYS}
+    if isinstance(value, list):
+        return [without_store_specific(item) for item in value]
+    return value
+
+
+def all_pages(store, network_id, **filters):
+    """Every item of page_network, following the page boundaries to the end"""
+    entities, relationships = [], []
+    after_entity = after_relationship = -1
+    while after_entity is not None or after_relationship is not None:
+        page = store.page_network(network_id, page_query(
+            after_entity=after_entity, after_relationship=after_relationship, limit=2, **filters
+        ))
+        entities.extend(page.get("entities", []))
+        relationships.extend(page.get("relationships", []))
+        after_entity, after_relationship = page.get("next_entity"), page.get("next_relationship")
+    return {"version": page["version"], "entities": entities, "relationships": relationships}
+
+
+def add_and_read(store):
+    rejected = []
+    added = store.add_data("parity", PARITY_ENTITIES, PARITY_RELATIONSHIPS, rejected=rejected)
+    return [
+        added, rejected,
+        store.get_network("parity"),
+        store.list_networks(),
+        store.network_version("parity"),
+        all_pages(store, "parity"),
+        all_pages(store, "parity", entity_types=["person"], min_importance=3, statuses=["confirmed"]),
+        all_pages(store, "parity", include=["relationships"], date_from="2009-01-01",
+                  relationship_fields=["source", "target"])
+    ]
+
+
+def incremental_changes(store):
+    store.add_data("parity", PARITY_ENTITIES[:2], PARITY_RELATIONSHIPS[:1])
+    return [
+        store.add_data("parity", PARITY_ENTITIES, PARITY_RELATIONSHIPS),
+        store.add_data("parity", PARITY_ENTITIES, PARITY_RELATIONSHIPS),
+        store.changes_since("parity", 0),
+        store.changes_since("parity", 1),
+        store.changes_since("parity", 2),
+        store.changes_since("parity", 5),
+        store.changes_since("missing", 0)
+    ]
+
+
+def merge_and_alias(store):
+    store.add_data("parity", PARITY_ENTITIES, PARITY_RELATIONSHIPS)
+    return [
+        store.merge_entities("parity", {"Tim Leisner": "Tim Leissner", "Unknown": "Jho Low"}),
+        store.aliases("parity"),
+        store.changes_since("parity", 1),
+        store.add_data(
+            "parity", [{"name": "Tim Leisner"}, {"name": "Roger Ng"}],
+            [{"source": "Roger Ng", "target": "Tim Leisner", "type": "employment"}]
+        ),
+        store.changes_since("parity", 2),
+        store.get_network("parity"),
+        all_pages(store, "parity"),
+        store.merge_entities("missing", {"a": "b"})
+    ]
+
+
+def delete_network(store):
+    store.add_data("parity", PARITY_ENTITIES, PARITY_RELATIONSHIPS)
+    store.add_data("other", PARITY_ENTITIES[:1])
+    return [
+        store.delete_network("parity"),
+        store.delete_network("parity"),
+        store.get_network("parity"),
+        store.network_version("parity"),
+        store.changes_since("parity", 0),
+        store.page_network("parity", page_query()),
+        store.aliases("parity"),
+        store.list_networks(),
+        store.add_data("parity", PARITY_ENTITIES[:1]),
+        store.get_network("parity")
+    ]
+
+
+@pytest.mark.parametrize("scenario", [add_and_read, incremental_changes, merge_and_alias, delete_network])
+def test_store_parity(scenario, tmp_path):
+    """MemoryNetworkStore and SQLiteNetworkStore give the same results"""
+    memory = scenario(MemoryNetworkStore())
+    sqlite = scenario(SQLiteNetworkStore(str(tmp_path / "networks.db")))
+    assert without_store_specific(memory) == without_store_specific(sqlite)
+
+
 def main():
     """Run all tests"""
     print("=" * 60)